@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Benchmarks of QOpenVPN.
+
+Runs headless (Qt offscreen platform) against stand-in systemctl, journalctl and
+openvpn scripts from benchmarks/fakebin (put first on PATH) and local UDP STUN
+responders, with settings, cache and data directories in temporary directory.
+Results are written to JSON file, compare them with results of older release by
+--compare to see regressions::
+
+    python3 benchmarks/run.py --output results.json
+    python3 benchmarks/run.py --output new.json --compare results.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import socket
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import traceback
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from stunstandin import StunStandIn, build_response  # noqa: E402
+
+# Slowdown (in percent) of timing metric reported as regression by --compare
+REGRESSION_THRESHOLD = 10
+
+
+def setup_environment(tmpdir):
+    """Isolate benchmarks from user settings and real system tools"""
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    os.environ["PATH"] = os.pathsep.join([os.path.join(BENCH_DIR, "fakebin"), os.environ.get("PATH", "")])
+    for name in ("XDG_CONFIG_HOME", "XDG_CACHE_HOME", "XDG_DATA_HOME", "XDG_RUNTIME_DIR"):
+        path = os.path.join(tmpdir, name.lower())
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        os.environ[name] = path
+
+
+def summarize(samples):
+    """Return statistics of timing samples (in seconds) in milliseconds"""
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "min_ms": samples[0] * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def create_app():
+    from PySide2 import QtCore, QtWidgets
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([sys.argv[0]])
+    app.setOrganizationName("QOpenVPN-benchmarks")
+    app.setApplicationName("QOpenVPN-benchmarks")
+    app.setQuitOnLastWindowClosed(False)
+    settings = QtCore.QSettings()
+    settings.setValue("vpn_name", "bench")
+    settings.setValue("sudo_command", "sudo")
+    settings.setValue("status_poll_interval", 0)
+    settings.setValue("auto_connect", False)
+    # Don't send STUN requests to public servers from benchmarks
+    settings.setValue("leak_monitor", False)
+    settings.sync()
+    return app
+
+
+def process_events_until(app, condition, timeout=60):
+    """Run Qt event loop until condition() is true"""
+    from PySide2 import QtCore
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise RuntimeError("Timed out waiting for event loop")
+        app.processEvents(QtCore.QEventLoop.AllEvents | QtCore.QEventLoop.WaitForMoreEvents, 50)
+
+
+def bench_status_poll(repeat):
+    """Latency of QOpenVPNWidget.vpn_status (D-Bus query if system bus is available, systemctl otherwise)"""
+    app = create_app()
+    from qopenvpn.__main__ import QOpenVPNWidget
+    widget = QOpenVPNWidget()
+    widget.timer.stop()
+
+    finished = []
+    on_vpn_status = widget.on_vpn_status
+
+    def on_vpn_status_wrapper(*args):
+        on_vpn_status(*args)
+        finished.append(True)
+
+    widget.on_vpn_status = on_vpn_status_wrapper
+    results = {}
+    backends = [("systemctl", lambda: False)]
+    if widget.status_monitor.is_running():
+        backends.insert(0, ("dbus", widget.status_monitor.is_running))
+    for backend, is_running in backends:
+        widget.status_monitor.is_running = is_running
+        process_events_until(app, lambda: not widget.executor.is_busy())
+        samples = []
+        for i in range(repeat):
+            del finished[:]
+            start = time.perf_counter()
+            widget.vpn_status(disable_warning=True)
+            process_events_until(app, lambda: finished)
+            samples.append(time.perf_counter() - start)
+        results[backend] = summarize(samples)
+    widget.trayIcon.hide()
+    widget.deleteLater()
+    app.processEvents()
+    return results
+
+
+def write_journal(path, lines):
+    """Write journal of OpenVPN unit with given number of lines in `journalctl -o json` format"""
+    with open(path, "w") as f:
+        boot_id = "0" * 32
+        timestamp = int(time.time() * 1e6) - lines * 1000
+        pid = 1000
+        for i in range(lines):
+            if i % 5000 == 0:
+                pid += 1
+            priority = 3 if i % 97 == 0 else 4 if i % 31 == 0 else 5 if i % 7 == 0 else 6
+            entry = {
+                "__CURSOR": "s=bench;i={:x};b={};m={:x};t={:x};x=0".format(i, boot_id, i, timestamp),
+                "__REALTIME_TIMESTAMP": str(timestamp),
+                "PRIORITY": str(priority),
+                "_PID": str(pid),
+                "SYSLOG_IDENTIFIER": "openvpn",
+                "MESSAGE": "bench/203.0.113.1:1194 Data Channel: cipher 'AES-256-GCM', line {}".format(i),
+            }
+            f.write(json.dumps(entry) + "\n")
+            timestamp += 1000
+
+
+def bench_log_viewer(line_counts, tmpdir):
+    """Time to load journal into log viewer and to render it"""
+    app = create_app()
+    from qopenvpn import extip
+    from qopenvpn.logviewer import QOpenVPNLogViewer
+
+    # Don't look up external IP address over network
+    extip.cache.configure(ttl=3600)
+    extip.cache.put("192.0.2.1", "bench.invalid")
+
+    results = {}
+    for lines in line_counts:
+        path = os.path.join(tmpdir, "journal-{}.json".format(lines))
+        write_journal(path, lines)
+        os.environ["BENCH_JOURNAL"] = path
+
+        start = time.perf_counter()
+        viewer = QOpenVPNLogViewer()
+        process_events_until(app, lambda: viewer.proc is None, timeout=600)
+        loaded = time.perf_counter()
+        viewer.show()
+        app.processEvents()
+        viewer.logViewerList.viewport().repaint()
+        rendered = time.perf_counter()
+        viewer.logViewerList.scrollToTop()
+        app.processEvents()
+        viewer.logViewerList.viewport().repaint()
+        scrolled = time.perf_counter()
+
+        results[str(lines)] = {
+            "lines": lines,
+            "rows": viewer.log_model.rowCount(),
+            "load_ms": (loaded - start) * 1000,
+            "render_ms": (rendered - loaded) * 1000,
+            "scroll_to_top_ms": (scrolled - rendered) * 1000,
+        }
+        viewer.done(0)
+        viewer.deleteLater()
+        app.processEvents()
+        os.remove(path)
+    return results
+
+
+def bench_stun_dead_servers(timeout, repeat):
+    """Latency of StunClient.get_ip when first two servers don't respond"""
+    from qopenvpn.stun import StunClient
+    results = {}
+    with StunStandIn(respond=False) as dead1, StunStandIn(respond=False) as dead2, StunStandIn() as alive:
+        servers = [dead1.address, dead2.address, alive.address]
+        for mode, race in (("sequential", False), ("race", True)):
+            samples = []
+            for i in range(repeat):
+                client = StunClient(timeout=timeout, attempts=len(servers), race=race, servers=servers)
+                start = time.perf_counter()
+                client.get_ip(source_port=0)
+                samples.append(time.perf_counter() - start)
+            results[mode] = summarize(samples)
+    results["timeout_s"] = timeout
+    return results
+
+
+def bench_stun_lossy_server(loss, repeat):
+    """Latency of StunClient.get_ip against server which drops `loss` fraction of requests
+    (lost requests are retransmitted after 0.5, 1, 2, ... s)"""
+    from qopenvpn.stun import StunClient
+    results = {"loss": loss}
+    with StunStandIn(loss=loss, seed=1) as lossy:
+        samples = []
+        failures = 0
+        for i in range(repeat):
+            client = StunClient(timeout=5, servers=[lossy.address])
+            start = time.perf_counter()
+            try:
+                client.get_ip()
+            except RuntimeError:
+                failures += 1
+                continue
+            samples.append(time.perf_counter() - start)
+        results["requests_per_lookup"] = lossy.requests / repeat
+        results["failures"] = failures
+        if samples:
+            results["latency"] = summarize(samples)
+    return results
+
+
+def bench_leak_detection(repeat):
+    """Time from VPN start to leak warning and from tunnel change to its resolution
+    (LeakMonitor against stand-in STUN server returning scripted addresses)"""
+    app = create_app()
+    from qopenvpn.leakmonitor import LeakMonitor
+    home, tunnel = ("198.51.100.1", 50000), ("203.0.113.1", 50000)
+    min_interval = 0.05
+
+    detected, resolved = [], []
+    detect_samples, resolve_samples = [], []
+    with StunStandIn(addresses=[home]) as server:
+        monitor = LeakMonitor(min_interval, max_interval=1, grace_period=0, servers=[server.address], timeout=1)
+        monitor.leakDetected.connect(lambda ip: detected.append(time.perf_counter()))
+        monitor.leakResolved.connect(lambda: resolved.append(time.perf_counter()))
+        monitor.start(vpn_active=False)
+        process_events_until(app, lambda: monitor.baseline_ip == home[0])
+        for i in range(repeat):
+            # VPN unit is active, but traffic still leaves with address without VPN
+            start = time.perf_counter()
+            monitor.set_vpn_active(True)
+            process_events_until(app, lambda: detected)
+            detect_samples.append(detected.pop() - start)
+
+            # Traffic is routed through the tunnel
+            server.set_addresses([tunnel])
+            start = time.perf_counter()
+            monitor.tunnel_ready()
+            process_events_until(app, lambda: resolved)
+            resolve_samples.append(resolved.pop() - start)
+
+            server.set_addresses([home])
+            monitor.set_vpn_active(False)
+            process_events_until(app, lambda: monitor.last_ip == home[0])
+        monitor.stop()
+        stun_requests = server.requests
+    return {
+        "min_interval_s": min_interval,
+        "detect": summarize(detect_samples),
+        "resolve": summarize(resolve_samples),
+        "stun_requests": stun_requests,
+    }
+
+
+def legacy_parse_response(data, transaction_id):
+    """RFC 3489 parser of QOpenVPN 1.x (MAPPED-ADDRESS and IPv4 only), baseline for codec comparison"""
+    packet_type, length = struct.unpack(">2H", data[:4])
+    if packet_type != 0x0101:
+        raise ValueError("Invalid response type!")
+    if data[4:20] != transaction_id:
+        raise ValueError("Invalid response transaction ID!")
+    attributes = data[20:length + 20]
+    ptr = 0
+    while ptr < len(attributes):
+        attr_type, attr_length = struct.unpack(">2H", attributes[ptr:ptr + 4])
+        value = attributes[ptr + 4:ptr + 4 + attr_length]
+        if attr_type == 0x0001:
+            family, port = struct.unpack(">xBH", value[:4])
+            if family != 0x01:
+                raise ValueError("IPv6 is not supported!")
+            return socket.inet_ntoa(value[4:]), port
+        ptr += 4 + 4 * int(math.ceil(attr_length / 4.0))
+    return "", ""
+
+
+def bench_parse_response(count):
+    """Throughput of StunClient._parse_response (RFC 5389 codec) by response type,
+    compared with old RFC 3489 parser"""
+    from qopenvpn.stun import StunClient
+    client = StunClient()
+    transaction_id = client._generate_id()
+    cases = [
+        ("legacy_parser", legacy_parse_response, "legacy", "203.0.113.7"),
+        ("legacy_parser_both", legacy_parse_response, "both", "203.0.113.7"),
+        ("legacy", client._parse_response, "legacy", "203.0.113.7"),
+        ("xor", client._parse_response, "xor", "203.0.113.7"),
+        ("both", client._parse_response, "both", "203.0.113.7"),
+    ]
+    results = {"count": count}
+    for name, parse, mode, address in cases:
+        data = build_response(transaction_id, address, 40000, mode)
+        if parse(data, transaction_id) != (address, 40000):
+            raise RuntimeError("{} parsed response incorrectly".format(name))
+        start = time.perf_counter()
+        for i in range(count):
+            parse(data, transaction_id)
+        elapsed = time.perf_counter() - start
+        results[name] = {"us_per_parse": elapsed / count * 1e6, "parses_per_s": count / elapsed}
+    return results
+
+
+def run_benchmark(name, func, *args):
+    """Run benchmark, return its results (or error)"""
+    print("Running {}...".format(name), file=sys.stderr)
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+    except Exception as e:
+        traceback.print_exc()
+        result = {"error": "{}: {}".format(type(e).__name__, e)}
+    print("  done in {:.1f} s".format(time.perf_counter() - start), file=sys.stderr)
+    return result
+
+
+def flatten(data, prefix=""):
+    """Flatten nested results to {"a/b/c": value} dict"""
+    items = {}
+    for key, value in data.items():
+        path = "{}/{}".format(prefix, key) if prefix else key
+        if isinstance(value, dict):
+            items.update(flatten(value, path))
+        else:
+            items[path] = value
+    return items
+
+
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    """Print timing metrics which are more than `threshold` percent slower than in baseline,
+    return number of regressions"""
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f)["benchmarks"])
+    regressions = 0
+    for path, value in sorted(flatten(results["benchmarks"]).items()):
+        old = baseline.get(path)
+        if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+            continue
+        if path.endswith("_ms") or path.endswith("us_per_parse"):
+            change = (value - old) / old * 100
+        elif path.endswith("_per_s"):
+            change = (old - value) / old * 100
+        else:
+            continue
+        if change > threshold:
+            regressions += 1
+            print("REGRESSION {}: {:.3f} -> {:.3f} ({:+.0f} %)".format(path, old, value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of QOpenVPN")
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON file with results")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON file with results to compare with")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads (no 1M-line journal)")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="run only given benchmarks")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="qopenvpn-bench-")
+    setup_environment(tmpdir)
+
+    from qopenvpn.version import __version__
+    benchmarks = {
+        "status_poll": (bench_status_poll, 20 if args.quick else 100),
+        "log_viewer": (bench_log_viewer, [10000, 100000] if args.quick else [10000, 100000, 1000000], tmpdir),
+        "stun_dead_servers": (bench_stun_dead_servers, 0.5, 1 if args.quick else 3),
+        "stun_lossy_server": (bench_stun_lossy_server, 0.3, 10 if args.quick else 50),
+        "leak_detection": (bench_leak_detection, 5 if args.quick else 20),
+        "stun_parse_response": (bench_parse_response, 20000 if args.quick else 200000),
+    }
+    results = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "benchmarks": {},
+    }
+    for name, (func, *func_args) in benchmarks.items():
+        if not args.only or name in args.only:
+            results["benchmarks"][name] = run_benchmark(name, func, *func_args)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Results written to {}".format(args.output), file=sys.stderr)
+
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Local UDP STUN responder used by benchmarks.
+
+Responds to Binding Requests with scripted addresses (cycled through in order),
+optionally drops requests or delays responses, or doesn't respond at all
+(dead server).
+"""
+
+import itertools
+import random
+import socket
+import struct
+import threading
+import time
+
+BINDING_REQUEST = 0x0001
+BINDING_RESPONSE = 0x0101
+MAPPED_ADDRESS = 0x0001
+XOR_MAPPED_ADDRESS = 0x0020
+MAGIC_COOKIE = 0x2112A442
+
+
+def address_attribute(attr_type, address, port, header_tail):
+    """Encode (XOR-)MAPPED-ADDRESS attribute (`header_tail` is magic cookie + transaction ID)"""
+    if ":" in address:
+        family, packed = 0x02, socket.inet_pton(socket.AF_INET6, address)
+    else:
+        family, packed = 0x01, socket.inet_pton(socket.AF_INET, address)
+    if attr_type == XOR_MAPPED_ADDRESS:
+        port ^= MAGIC_COOKIE >> 16
+        packed = bytes(a ^ b for a, b in zip(packed, header_tail[:len(packed)]))
+    value = struct.pack(">xBH", family, port) + packed
+    return struct.pack(">2H", attr_type, len(value)) + value
+
+
+def build_response(header_tail, address, port, mode="legacy"):
+    """Build Binding Response to request with given header bytes 4-20
+
+    `mode` is "legacy" (MAPPED-ADDRESS only, RFC 3489), "xor" (XOR-MAPPED-ADDRESS only)
+    or "both".
+    """
+    attributes = b""
+    if mode in ("legacy", "both"):
+        attributes += address_attribute(MAPPED_ADDRESS, address, port, header_tail)
+    if mode in ("xor", "both"):
+        attributes += address_attribute(XOR_MAPPED_ADDRESS, address, port, struct.pack(">I", MAGIC_COOKIE) +
+                                         header_tail[4:16])
+    return struct.pack(">2H", BINDING_RESPONSE, len(attributes)) + header_tail + attributes
+
+
+class StunStandIn(object):
+    """STUN server running in background thread on localhost"""
+
+    def __init__(self, addresses=(("203.0.113.1", 50000),), mode="legacy", loss=0.0, delay=0.0, respond=True,
+                 seed=None):
+        """Respond with `addresses` in turn, drop `loss` fraction of requests, delay responses
+        by `delay` seconds, don't respond at all if `respond` is False"""
+        self.mode = mode
+        self.loss = loss
+        self.delay = delay
+        self.respond = respond
+        self.requests = 0
+        self.responses = 0
+        self._lock = threading.Lock()
+        self._addresses = itertools.cycle(addresses)
+        self._random = random.Random(seed)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.settimeout(0.1)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    @property
+    def address(self):
+        """(host, port) of the server"""
+        return self._sock.getsockname()
+
+    def set_addresses(self, addresses):
+        """Respond with `addresses` in turn from now on"""
+        with self._lock:
+            self._addresses = itertools.cycle(addresses)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _serve(self):
+        while self._running:
+            try:
+                data, addr = self._sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if len(data) < 20 or struct.unpack(">H", data[:2])[0] != BINDING_REQUEST:
+                continue
+            self.requests += 1
+            if not self.respond or self._random.random() < self.loss:
+                continue
+            with self._lock:
+                address, port = next(self._addresses)
+            if self.delay:
+                time.sleep(self.delay)
+            self._sock.sendto(build_response(data[4:20], address, port, self.mode), addr)
+            self.responses += 1
@@ -4,13 +4,30 @@
 import os
 import signal
 import sys
+import time
 from functools import partial
 
-from PySide2 import QtCore, QtGui, QtWidgets
+# Checkpoints of application startup (printed with --startup-profile)
+startup_marks = [("start", time.perf_counter())]
 
-from qopenvpn import notify
-from qopenvpn.logviewer import QOpenVPNLogViewer
-from qopenvpn.settings import QOpenVPNSettings
+
+def startup_mark(name):
+    """Record startup checkpoint"""
+    startup_marks.append((name, time.perf_counter()))
+
+
+from PySide2 import QtCore, QtWidgets  # noqa: E402
+
+startup_mark("import PySide2")
+
+# Only modules needed to show tray icon and first status are imported here,
+# dialogs, helper client, leak monitor, STUN client, journal parser and
+# notification backend (D-Bus) are imported on first use
+from qopenvpn import (connecttime, executor, extip,  # noqa: E402
+                      iconcache, management, notifications, profiles,
+                      statistics, status)
+
+startup_mark("import qopenvpn modules")
 
 # Allow CTRL+C and/or SIGTERM to kill us (PyQt blocks it otherwise)
 signal.signal(signal.SIGINT, signal.SIG_DFL)
@@ -24,27 +41,73 @@ class QOpenVPNWidget(QtWidgets.QDialog):
         self.vpn_changed = False
         self.first_run = True
         self.connected = None
+        self.vpn_state = ""
+        self.management = None
+        self.profile_states = {}
+        self.profile_actions = {}
+        self.stopping = set()  # profiles stopped by user (no warning for them)
+        self.statistics = statistics.StatisticsCollector(parent=self)
+        self.statistics.sampleAdded.connect(self.update_tray)
+        self.statistics_dialog = None
+        self.helper = None
+        self.connect_times = connecttime.ConnectTimeTracker(parent=self)
 
         self.settings = QtCore.QSettings()
 
-        # intialize D-Bus notification daemon
-        notify.init(QtWidgets.qApp.applicationName())
+        # External IP address lookups are cached until VPN state changes
+        extip.cache.configure(
+            self.settings.value("ip_cache_ttl", 300, type=int),
+            self.settings.value("ip_cache_negative_ttl", 30, type=int))
+
+        # Detect OpenVPN version (cached) and keep list of available profiles
+        self.profile_index = profiles.ProfileIndex(self)
+        self.profile_index.profilesChanged.connect(self.on_profiles_changed)
 
         self.imgpath = os.path.join(
             os.path.dirname(os.path.abspath(__file__)), 'images')
 
+        # External commands are queued per unit and killed on timeout
+        self.executor = executor.CommandExecutor(
+            self.settings.value("command_timeout", 120, type=int),
+            self.settings.value("slow_command_threshold", 5, type=int),
+            parent=self)
+        QtWidgets.qApp.aboutToQuit.connect(self.executor.kill_all)
+
+        # Desktop notifications are coalesced per VPN profile
+        self.notifications = notifications.NotificationManager(
+            QtWidgets.qApp.applicationName(),
+            self.settings.value("notification_debounce", 2, type=int),
+            self.settings.value("notification_flap_window", 120, type=int),
+            self.settings.value("notification_flap_threshold", 3, type=int),
+            parent=self)
+
+        # External IP address is checked in background for traffic leaking
+        # outside of VPN (if enabled, created after first status check)
+        self.leak_monitor = None
+
+        # Icons rasterized from SVG are cached in user cache directory
+        self.icon_cache = iconcache.IconCache()
+
         self.trayIcon = QtWidgets.QSystemTrayIcon(self)
         self.trayIconMenu = QtWidgets.QMenu(self)
 
+        startup_mark("settings and profiles")
         self.create_icon()
         self.create_actions()
         self.create_menu()
-        self.vpn_status()
+        startup_mark("tray icon and menu")
+
+        # Get status changes immediately from systemd over D-Bus
+        self.status_monitor = status.SystemdUnitMonitor(parent=self)
+        self.status_monitor.stateChanged.connect(self.on_unit_state_changed)
+        self.status_monitor.start()
 
-        # Update status every 10 seconds
+        # Poll status periodically (only as a rare fallback if D-Bus works)
         self.timer = QtCore.QTimer(self)
         self.timer.timeout.connect(self.vpn_status)
-        self.timer.start(10000)
+        self.watch_unit()
+        self.vpn_status()
+        startup_mark("status monitor")
 
         # Setup system tray icon doubleclick timer
         self.icon_doubleclick_timer = QtCore.QTimer(self)
@@ -55,172 +118,526 @@ class QOpenVPNWidget(QtWidgets.QDialog):
         self.setMouseTracking(True)
         self.installEventFilter(self)
 
+        # Render menu icons after tray icon is shown
+        QtCore.QTimer.singleShot(0, self.create_menu_icons)
+
     def create_actions(self):
         """Create actions and connect relevant pyqtSignals"""
-        self.startAction = QtWidgets.QAction(self.iconActive,
-                                             self.tr("&Start"), self)
-        self.startAction.triggered.connect(self.vpn_start)
-        self.stopAction = QtWidgets.QAction(self.iconDisabled,
-                                            self.tr("S&top"), self)
-        self.stopAction.triggered.connect(self.vpn_stop)
-        self.settingsAction = QtWidgets.QAction(self.iconSettings,
-                                                self.tr("S&ettings..."), self)
+        self.settingsAction = QtWidgets.QAction(self.tr("S&ettings..."),
+                                                self)
         self.settingsAction.triggered.connect(self.show_settings)
-        self.logsAction = QtWidgets.QAction(self.iconLogs,
-                                            self.tr("View &logs"), self)
+        self.logsAction = QtWidgets.QAction(self.tr("View &logs"), self)
         self.logsAction.triggered.connect(self.logs)
-        self.quitAction = QtWidgets.QAction(self.iconQuit, self.tr("&Quit"),
-                                            self)
+        self.statisticsAction = QtWidgets.QAction(
+            self.style().standardIcon(
+                QtWidgets.QStyle.SP_FileDialogInfoView),
+            self.tr("S&tatistics..."), self)
+        self.statisticsAction.triggered.connect(self.show_statistics)
+        self.quitAction = QtWidgets.QAction(self.tr("&Quit"), self)
         self.quitAction.triggered.connect(self.quit)
 
     def create_menu(self):
         """Create menu and add items to it"""
-        self.trayIconMenu.addAction(self.startAction)
-        self.trayIconMenu.addAction(self.stopAction)
-        self.trayIconMenu.addSeparator()
+        self.profilesSeparator = self.trayIconMenu.addSeparator()
+        self.create_profile_actions()
         self.trayIconMenu.addAction(self.settingsAction)
         self.trayIconMenu.addAction(self.logsAction)
+        self.trayIconMenu.addAction(self.statisticsAction)
         self.trayIconMenu.addSeparator()
         self.trayIconMenu.addAction(self.quitAction)
 
+    def create_profile_actions(self):
+        """Create Start/Stop menu actions for every VPN profile"""
+        for start_action, stop_action in self.profile_actions.values():
+            for action in (start_action, stop_action):
+                self.trayIconMenu.removeAction(action)
+                action.deleteLater()
+        self.profile_actions = {}
+
+        profiles = self.profiles()
+        for name in profiles:
+            if len(profiles) == 1:
+                start_label, stop_label = self.tr("&Start"), self.tr("S&top")
+            else:
+                start_label = self.tr("Start {}").format(name)
+                stop_label = self.tr("Stop {}").format(name)
+            start_action = QtWidgets.QAction(self.iconActive, start_label,
+                                             self)
+            start_action.triggered.connect(
+                lambda checked=False, name=name: self.vpn_start(name))
+            stop_action = QtWidgets.QAction(self.iconDisabled, stop_label,
+                                            self)
+            stop_action.triggered.connect(
+                lambda checked=False, name=name: self.vpn_stop(name))
+            self.trayIconMenu.insertAction(self.profilesSeparator,
+                                           start_action)
+            self.trayIconMenu.insertAction(self.profilesSeparator,
+                                           stop_action)
+            self.profile_actions[name] = (start_action, stop_action)
+        self.startAction, self.stopAction = self.profile_actions[profiles[0]]
+        self.update_actions()
+
     def create_icon(self):
         """Create system tray icon"""
-        # Workaround for Plasma 5 not showing SVG icons
-        self.iconActive = QtGui.QIcon("{}/openvpn.svg".format(self.imgpath))
-        self.iconActive = QtGui.QIcon(self.iconActive.pixmap(128, 128))
-        self.iconDisabled = QtGui.QIcon("{}/openvpn_disabled.svg".format(
-            self.imgpath))
-        self.iconDisabled = QtGui.QIcon(self.iconDisabled.pixmap(128, 128))
-        self.iconSettings = QtGui.QIcon("{}/settings.svg".format(self.imgpath))
-        self.iconSettings = QtGui.QIcon(self.iconSettings.pixmap(32, 32))
-        self.iconLogs = QtGui.QIcon("{}/logs.svg".format(self.imgpath))
-        self.iconLogs = QtGui.QIcon(self.iconLogs.pixmap(32, 32))
-        self.iconQuit = QtGui.QIcon("{}/exit.svg".format(self.imgpath))
-        self.iconQuit = QtGui.QIcon(self.iconQuit.pixmap(32, 32))
+        # Workaround for Plasma 5 not showing SVG icons (icons are rasterized)
+        self.iconActive = self.icon_cache.state_icon("connected")
+        self.iconDisabled = self.icon_cache.state_icon("disconnected")
+        self.iconError = self.icon_cache.state_icon("error")
         self.trayIcon.activated.connect(self.icon_activated)
         self.trayIcon.setContextMenu(self.trayIconMenu)
         self.trayIcon.setIcon(self.iconDisabled)
         self.trayIcon.setToolTip("QOpenVPN")
         self.trayIcon.show()
 
-    def cmdexec(self, command, callback, disable_warning=False):
-        self.proc = QtCore.QProcess(self)
-        self.proc.setProcessEnvironment(
-            QtCore.QProcessEnvironment.systemEnvironment())
-        self.proc.setProcessChannelMode(QtCore.QProcess.MergedChannels)
-        if self.proc.state() == QtCore.QProcess.NotRunning:
-            self.proc.finished.connect(
-                lambda code, status: callback(code, status, disable_warning))
-            self.proc.start(' '.join(command))
+    @QtCore.Slot()
+    def create_menu_icons(self):
+        """Create icons of menu actions (not needed to show tray icon)"""
+        self.iconSettings = self.icon_cache.icon("settings.svg", 32)
+        self.iconLogs = self.icon_cache.icon("logs.svg", 32)
+        self.iconQuit = self.icon_cache.icon("exit.svg", 32)
+        self.settingsAction.setIcon(self.iconSettings)
+        self.logsAction.setIcon(self.iconLogs)
+        self.quitAction.setIcon(self.iconQuit)
+
+    def cmdexec(self, command, callback, disable_warning=False,
+                with_output=False, queue=None, timeout=None):
+        """Run command (list of arguments) by executor,
+        pass its output to callback too if `with_output`"""
+        if with_output:
+            self.executor.run(
+                command,
+                lambda code, status, output: callback(
+                    code, status, disable_warning, output),
+                queue=queue, timeout=timeout)
+        else:
+            self.executor.run(
+                command,
+                lambda code, status, output: callback(
+                    code, status, disable_warning),
+                queue=queue, timeout=timeout)
 
     def systemctl(self,
                   command,
                   callback,
                   disable_sudo=False,
-                  disable_warning=False):
-        """Run systemctl command"""
+                  disable_warning=False,
+                  vpn_names=None,
+                  with_output=False):
+        """Run systemctl command (for selected VPN by default)
+
+        Commands changing state of unit are queued per unit, read-only
+        commands (run without sudo) have their own queue and shorter timeout,
+        so they never wait behind password prompt.
+        """
+        units = [self.unit_name(name) for name in vpn_names or [None]]
+        if not disable_sudo and len(units) == 1 and \
+                self.settings.value("use_helper", False) == 'true':
+            from qopenvpn import helperclient
+            if helperclient.HelperClient.is_allowed(command):
+                self.helper_request(command, units[0], callback,
+                                    disable_warning, with_output)
+                return
         cmdline = []
         if not disable_sudo:
             cmdline.append(self.settings.value("sudo_command"))
-        cmdline.extend([
-            "systemctl", command, "{}@{}".format(
-                self.settings.value("service_name"),
-                self.settings.value("vpn_name"))
-        ])
-        self.cmdexec(cmdline, callback, disable_warning)
-
-    def vpn_start(self):
-        """Start OpenVPN service"""
-        self.systemctl("start", self.on_vpn_start)
+        cmdline.extend(["systemctl", command])
+        cmdline.extend(units)
+        if disable_sudo:
+            queue = "status"
+            timeout = self.settings.value("status_timeout", 10, type=int)
+        else:
+            queue = " ".join(units)
+            timeout = None
+        self.cmdexec(cmdline, callback, disable_warning, with_output, queue,
+                     timeout)
+
+    def helper_request(self, command, unit, callback, disable_warning=False,
+                       with_output=False):
+        """Run systemctl command by privileged helper (started on first use),
+        fall back to sudo command if helper is not available"""
+        from qopenvpn import helperclient
+        if self.helper is None:
+            self.helper = helperclient.HelperClient(
+                self.settings.value("sudo_command"), parent=self)
+        self.helper.sudo_command = self.settings.value("sudo_command")
+
+        def on_reply(exitcode, output):
+            if exitcode == -1:
+                print("Helper failed: {}".format(output), file=sys.stderr)
+                cmdline = [self.settings.value("sudo_command"), "systemctl",
+                           command, unit]
+                self.cmdexec(cmdline, callback, disable_warning, with_output,
+                             unit)
+            elif with_output:
+                callback(exitcode, QtCore.QProcess.NormalExit,
+                         disable_warning, output)
+            else:
+                callback(exitcode, QtCore.QProcess.NormalExit,
+                         disable_warning)
+
+        self.helper.request(command, unit, on_reply)
+
+    def unit_name(self, vpn_name=None):
+        """Return name of systemd unit of VPN (selected VPN by default)"""
+        return "{}@{}".format(
+            self.settings.value("service_name"),
+            vpn_name or self.settings.value("vpn_name"))
+
+    def profiles(self):
+        """Return names of all managed VPN profiles (selected VPN first,
+        additional profiles only while their configuration exists)"""
+        profiles = [self.settings.value("vpn_name")]
+        available = self.profile_index.profiles()
+        for name in self.settings.value("vpn_profiles", [], type=list) or []:
+            if name and name not in profiles and \
+                    (not available or name in available):
+                profiles.append(name)
+        return profiles
+
+    @QtCore.Slot()
+    def on_profiles_changed(self):
+        """Refresh tray menu when VPN profiles are added or removed"""
+        if self.profile_actions:
+            self.create_profile_actions()
+            self.watch_unit()
+
+    def watch_unit(self):
+        """Watch units of all profiles over D-Bus and set status polling
+        interval (in seconds, configurable by status_poll_interval and
+        status_fallback_interval settings, 0 disables polling)"""
+        self.watch_management()
+        units = [self.unit_name(name) for name in self.profiles()]
+        if self.status_monitor.watch(units):
+            interval = self.settings.value(
+                "status_fallback_interval", 60, type=int)
+        else:
+            interval = self.settings.value(
+                "status_poll_interval", 10, type=int)
+        if interval > 0:
+            self.timer.start(interval * 1000)
+        else:
+            self.timer.stop()
+
+    def watch_management(self):
+        """Connect to OpenVPN management interface of selected VPN
+        (if it is enabled in its profile or management_address setting)"""
+        if self.management is not None:
+            self.management.close()
+            self.management.deleteLater()
+            self.management = None
+        self.vpn_state = ""
+        self.statistics.stop()
+
+        address = management.management_address(
+            self.settings, self.settings.value("vpn_name"))
+        if address is None:
+            return
+        self.management = management.ManagementClient(
+            address,
+            password=self.settings.value("management_password", ""),
+            parent=self)
+        self.management.stateChanged.connect(self.on_management_state)
+        self.management.bytecountChanged.connect(self.statistics.set_bytecount)
+        self.management.connectedChanged.connect(
+            self.on_management_connected)
+        self.management.connect_to_server()
+
+    @QtCore.Slot(bool)
+    def on_management_connected(self, connected):
+        """Collect statistics only while OpenVPN reports byte counters"""
+        if connected:
+            self.statistics.start()
+        else:
+            self.statistics.stop()
+
+    @QtCore.Slot(str, str)
+    def on_management_state(self, state, description):
+        """Update status from real connection state reported by OpenVPN"""
+        vpn_name = self.settings.value("vpn_name")
+        if state == management.STATE_RECONNECTING:
+            if self.leak_monitor is not None:
+                self.leak_monitor.state_changed()
+            self.notifications.notify(
+                vpn_name, "reconnecting", 'QOpenVPN',
+                'Reconnecting to %s (%s)' % (vpn_name, description),
+                "{}/openvpn_disabled.svg".format(self.imgpath))
+        elif state == management.STATE_CONNECTED:
+            self.connect_times.tunnel_ready(vpn_name)
+            if self.leak_monitor is not None:
+                self.leak_monitor.tunnel_ready()
+            if self.vpn_state and self.vpn_state != state:
+                self.notifications.notify(
+                    vpn_name, "connected", 'QOpenVPN',
+                    'Connected to %s' % vpn_name,
+                    "{}/openvpn.svg".format(self.imgpath))
+        self.vpn_state = state
+        if self.vpn_enabled:
+            self.update_tray()
+
+    def update_tray(self):
+        """Update tray icon and tooltip according to status of all profiles"""
+        profiles = self.profiles()
+        active = [name for name in profiles if self.profile_states.get(name)]
+        if not active:
+            self.trayIcon.setIcon(self.iconDisabled)
+            self.trayIcon.setToolTip('DISCONNECTED')
+            return
+
+        if self.is_leaking():
+            self.trayIcon.setIcon(self.iconError)
+        elif self.vpn_enabled and self.vpn_state not in (
+                "", management.STATE_CONNECTED):
+            self.trayIcon.setIcon(self.iconDisabled)
+        else:
+            self.trayIcon.setIcon(self.iconActive)
+        if len(profiles) == 1:
+            tooltip = self.vpn_state or 'CONNECTED'
+            tooltip += '<br/><font size="-1">to <b>{}</b></font>'.format(
+                profiles[0])
+            if self.connected is not None:
+                tooltip += '<br/><font size="-1">since {}</font>'.format(
+                    self.connected)
+            connect_times = self.connect_times.summary(profiles[0])
+            if connect_times is not None:
+                tooltip += ('<br/><font size="-1">connects in {:.1f} s '
+                            '(p95 {:.1f} s)</font>').format(*connect_times[1:])
+        else:
+            tooltip = 'CONNECTED ({}/{})'.format(len(active), len(profiles))
+            for name in profiles:
+                if not self.profile_states.get(name):
+                    state = 'DISCONNECTED'
+                elif name == profiles[0]:
+                    state = self.vpn_state or 'CONNECTED'
+                    if self.connected is not None:
+                        state += ' since {}'.format(self.connected)
+                else:
+                    state = 'CONNECTED'
+                tooltip += '<br/><font size="-1"><b>{}</b>: {}</font>'.format(
+                    name, state)
+        if self.is_leaking():
+            tooltip += ('<br/><font size="-1" color="red">Traffic leaks '
+                        'outside of VPN ({})</font>').format(
+                            self.leak_monitor.last_ip)
+        rates = self.statistics.current_rates()
+        if rates is not None and self.statistics.is_running():
+            tooltip += '<br/><font size="-1">↓ {} ↑ {}</font>'.format(
+                statistics.format_rate(rates[0]),
+                statistics.format_rate(rates[1]))
+        self.trayIcon.setToolTip(tooltip)
+
+    def update_actions(self):
+        """Show Start or Stop action of every profile according to its state"""
+        for name, (start_action, stop_action) in self.profile_actions.items():
+            active = bool(self.profile_states.get(name))
+            start_action.setVisible(not active)
+            stop_action.setVisible(active)
+
+    @QtCore.Slot(str, str, str)
+    def on_unit_state_changed(self, unit, active_state, sub_state):
+        """Update status from systemd unit state change"""
+        for name in self.profiles():
+            if self.unit_name(name) == unit:
+                if active_state == "activating":
+                    self.connect_times.unit_activating(name)
+                self.notifications.unit_state_changed(name, active_state)
+                self.set_profile_active(
+                    name, active_state in status.ACTIVE_STATES)
+                self.update_tray()
+                self.update_actions()
+
+    def vpn_start(self, vpn_name=None):
+        """Start OpenVPN service (of selected VPN by default)"""
+        vpn_name = vpn_name or self.settings.value("vpn_name")
+        self.connect_times.start_requested(vpn_name, self.unit_name(vpn_name))
+        self.systemctl("start", partial(self.on_vpn_start, vpn_name=vpn_name),
+                       vpn_names=[vpn_name])
 
     @QtCore.Slot(int, QtCore.QProcess.ExitStatus, bool)
-    def on_vpn_start(self, exitcode, exitstatus, disable_warning=False):
+    def on_vpn_start(self, exitcode, exitstatus, disable_warning=False,
+                     vpn_name=None):
+        extip.cache.invalidate()
         if exitstatus == QtCore.QProcess.NormalExit:
-            self.notify('QOpenVPN',
-                        'Connecting to %s' % self.settings.value("vpn_name"),
-                        "{}/openvpn.svg".format(self.imgpath))
+            self.notifications.notify(vpn_name, "connecting", 'QOpenVPN',
+                                      'Connecting to %s' % vpn_name,
+                                      "{}/openvpn.svg".format(self.imgpath))
             if self.settings.value("show_log", False) == 'true':
                 self.logs()
             if exitcode == 0:
-                self.connected = QtCore.QTime().currentTime().toString(
-                    'HH:mm:ss')
+                if vpn_name == self.settings.value("vpn_name"):
+                    self.connected = QtCore.QTime().currentTime().toString(
+                        'HH:mm:ss')
+                # Start timing now if activating state was not reported
+                self.connect_times.unit_activating(vpn_name)
                 self.vpn_status()
-
-    def vpn_stop(self):
-        """Stop OpenVPN service"""
-        self.systemctl("stop", self.on_vpn_stop)
+                return
+        self.connect_times.cancel(vpn_name)
+
+    def vpn_stop(self, vpn_name=None):
+        """Stop OpenVPN service (of selected VPN by default)"""
+        vpn_name = vpn_name or self.settings.value("vpn_name")
+        self.connect_times.cancel(vpn_name)
+        # Unit state change (over D-Bus) usually arrives before stop finishes
+        self.stopping.add(vpn_name)
+        self.systemctl("stop", partial(self.on_vpn_stop, vpn_name=vpn_name),
+                       vpn_names=[vpn_name])
 
     @QtCore.Slot(int, QtCore.QProcess.ExitStatus, bool)
-    def on_vpn_stop(self, exitcode, exitstatus, disable_warning=False):
+    def on_vpn_stop(self, exitcode, exitstatus, disable_warning=False,
+                    vpn_name=None):
+        extip.cache.invalidate()
+        self.stopping.discard(vpn_name)
         if exitstatus == QtCore.QProcess.NormalExit:
-            self.notify(
-                'QOpenVPN',
-                'Disconnected from %s' % self.settings.value("vpn_name"),
+            self.notifications.notify(
+                vpn_name, "disconnected", 'QOpenVPN',
+                'Disconnected from %s' % vpn_name,
                 "{}/openvpn_disabled.svg".format(self.imgpath))
             if exitcode == 0:
-                self.connected = None
+                if vpn_name == self.settings.value("vpn_name"):
+                    self.connected = None
                 self.vpn_status(disable_warning=True)
 
     def vpn_status(self, disable_warning=False):
-        """Check if OpenVPN service is running"""
+        """Check which OpenVPN services are running
+        (all profiles by one D-Bus call or one systemctl process)"""
+        profiles = self.profiles()
+        if self.status_monitor.is_running():
+            states = self.status_monitor.query_states(
+                [self.unit_name(name) for name in profiles])
+            if states is not None:
+                output = "\n".join(state[1] for state in states)
+                exitcode = 0 if any(state[1] in status.ACTIVE_STATES
+                                    for state in states) else 3
+                self.on_vpn_status(exitcode, QtCore.QProcess.NormalExit,
+                                   disable_warning, output)
+                return
         self.systemctl(
             "is-active",
             self.on_vpn_status,
             disable_sudo=True,
-            disable_warning=disable_warning)
+            disable_warning=disable_warning,
+            vpn_names=profiles,
+            with_output=True)
 
-    @QtCore.Slot(int, QtCore.QProcess.ExitStatus, bool)
-    def on_vpn_status(self, exitcode, exitstatus, disable_warning=False):
+    @QtCore.Slot(int, QtCore.QProcess.ExitStatus, bool, str)
+    def on_vpn_status(self, exitcode, exitstatus, disable_warning=False,
+                      output=""):
         if exitstatus == QtCore.QProcess.NormalExit:
-            if exitcode == 0:
-                self.vpn_enabled = True
-                self.trayIcon.setIcon(self.iconActive)
-                tooltip = 'CONNECTED'
-                tooltip += '<br/><font size="-1">to <b>{}</b></font>'.format(
-                    self.settings.value("vpn_name"))
-                if self.connected is not None:
-                    tooltip += '<br/><font size="-1">since {}</font>'.format(
-                        self.connected)
-                self.trayIcon.setToolTip(tooltip)
-                self.startAction.setVisible(False)
-                self.stopAction.setVisible(True)
+            # `systemctl is-active` prints state of every unit on its own line
+            profiles = self.profiles()
+            states = output.split()
+            if len(states) == len(profiles):
+                for name, state in zip(profiles, states):
+                    self.set_profile_active(
+                        name, state in status.ACTIVE_STATES, disable_warning)
             else:
-                self.vpn_enabled = False
-                self.trayIcon.setIcon(self.iconDisabled)
-                self.trayIcon.setToolTip('DISCONNECTED')
-                self.startAction.setVisible(True)
-                self.stopAction.setVisible(False)
-                if not disable_warning and bool(
-                        self.settings.value(
-                            "show_warning")) and self.vpn_enabled:
-                    self.center()
-                    QtWidgets.QMessageBox.warning(
-                        self, self.tr("Warning"),
-                        self.tr("OpenVPN was disconnected!"))
+                self.set_profile_active(profiles[0], exitcode == 0,
+                                        disable_warning)
+            self.update_tray()
+            self.update_actions()
         if self.first_run and not self.vpn_enabled and self.settings.value(
                 "auto_connect", False) == 'true':
             self.startAction.trigger()
+        if self.first_run:
+            self.update_leak_monitor()
         self.first_run = False
 
+    def update_leak_monitor(self):
+        """Start or stop leak monitor (it is opt-in, split tunnels leak)"""
+        enabled = self.settings.value("leak_monitor", False) == 'true'
+        if enabled and self.leak_monitor is None:
+            from qopenvpn import leakmonitor
+            self.leak_monitor = leakmonitor.LeakMonitor(
+                self.settings.value("leak_check_min_interval", 5, type=int),
+                self.settings.value("leak_check_max_interval", 600, type=int),
+                grace_period=self.settings.value("leak_check_grace_period",
+                                                 30, type=int),
+                parent=self)
+            self.leak_monitor.leakDetected.connect(self.on_leak_detected)
+            self.leak_monitor.leakResolved.connect(self.update_tray)
+        if self.leak_monitor is None:
+            return
+        if enabled and not self.leak_monitor.is_running():
+            self.leak_monitor.start(any(self.profile_states.values()))
+        elif not enabled and self.leak_monitor.is_running():
+            self.leak_monitor.stop()
+
+    def is_leaking(self):
+        """Did leak monitor detect traffic outside of VPN?"""
+        return self.leak_monitor is not None and self.leak_monitor.leaking
+
+    def set_profile_active(self, vpn_name, active, disable_warning=False):
+        """Update state of VPN profile (and warn if it was disconnected)"""
+        was_active = bool(self.profile_states.get(vpn_name))
+        self.profile_states[vpn_name] = active
+        if active != was_active:
+            extip.cache.invalidate()
+            if self.leak_monitor is not None:
+                self.leak_monitor.set_vpn_active(
+                    any(self.profile_states.values()))
+            if active:
+                self.connect_times.unit_active(vpn_name)
+            else:
+                self.connect_times.cancel(vpn_name)
+        if vpn_name == self.settings.value("vpn_name"):
+            self.vpn_enabled = active
+            if not active:
+                self.vpn_state = ""
+        if was_active and not active and not disable_warning and \
+                vpn_name not in self.stopping and \
+                self.settings.value("show_warning", False) == 'true':
+            self.center()
+            QtWidgets.QMessageBox.warning(
+                self, self.tr("Warning"),
+                self.tr("OpenVPN was disconnected from {}!").format(vpn_name))
+
+    @QtCore.Slot(str)
+    def on_leak_detected(self, ip):
+        """Warn that external IP address is the same as without VPN"""
+        vpn_name = self.settings.value("vpn_name")
+        self.notifications.notify(
+            vpn_name, "leak", 'QOpenVPN',
+            'Traffic leaks outside of VPN (external IP address {} is the '
+            'same as without VPN)'.format(ip),
+            "{}/openvpn_disabled.svg".format(self.imgpath), urgency=2)
+        self.update_tray()
+
     def show_settings(self):
         """Show show_settings dialog"""
-        dialog = QOpenVPNSettings(self)
+        from qopenvpn.settings import QOpenVPNSettings
+        dialog = QOpenVPNSettings(self, profile_index=self.profile_index)
         if dialog.exec_():
+            if self.helper is not None and \
+                    self.settings.value("use_helper", False) != 'true':
+                self.helper.close()
+            self.create_profile_actions()
+            self.watch_unit()
+            self.update_leak_monitor()
+            self.vpn_status(disable_warning=True)
             if self.vpn_changed and self.vpn_enabled:
                 self.vpn_stop()
                 self.vpn_start()
                 self.vpn_changed = False
 
-    @staticmethod
-    def notify(title, msg, icon='', urgency=1):
-        notification = notify.Notification(title, msg, icon)
-        notification.set_urgency(urgency)
-        return notification.show()
-
     def logs(self):
+        from qopenvpn.logviewer import QOpenVPNLogViewer
         logviewer = QOpenVPNLogViewer(self)
         logviewer.exec_()
 
+    def show_statistics(self):
+        """Show (non-modal) statistics window"""
+        if self.statistics_dialog is None:
+            self.statistics_dialog = statistics.QOpenVPNStatistics(
+                self.statistics, self, connect_times=self.connect_times)
+            self.statistics_dialog.finished.connect(
+                self.on_statistics_closed)
+        self.statistics_dialog.show()
+        self.statistics_dialog.raise_()
+
+    @QtCore.Slot(int)
+    def on_statistics_closed(self, result):
+        self.statistics_dialog.deleteLater()
+        self.statistics_dialog = None
+
     def icon_activated(self, reason):
         """Start or stop OpenVPN by double-click on tray icon"""
         if reason == QtWidgets.QSystemTrayIcon.Trigger or reason == QtWidgets.QSystemTrayIcon.DoubleClick:
@@ -248,7 +665,7 @@ class QOpenVPNWidget(QtWidgets.QDialog):
     def quit(self):
         """Quit QOpenVPN GUI (and ask before quitting if OpenVPN is still running)"""
         # noinspection PyCallByClass
-        if self.vpn_enabled:
+        if any(self.profile_states.values()):
             self.center()
             reply = QtWidgets.QMessageBox.warning(
                 self, self.tr("QOpenVPN - Quit"),
@@ -263,14 +680,34 @@ class QOpenVPNWidget(QtWidgets.QDialog):
             QtWidgets.QApplication.quit()
 
 
+def print_startup_profile():
+    """Print timing of startup checkpoints to stderr"""
+    startup_mark("event loop started")
+    previous = startup_marks[0][1]
+    for name, timestamp in startup_marks[1:]:
+        print("{:>8.1f} ms {:>8.1f} ms  {}".format(
+            (timestamp - previous) * 1000,
+            (timestamp - startup_marks[0][1]) * 1000, name),
+            file=sys.stderr)
+        previous = timestamp
+
+
 def main():
-    app = QtWidgets.QApplication(sys.argv)
+    argv = list(sys.argv)
+    startup_profile = "--startup-profile" in argv
+    if startup_profile:
+        argv.remove("--startup-profile")
+
+    app = QtWidgets.QApplication(argv)
     app.setOrganizationName("QOpenVPN")
     app.setOrganizationDomain("qopenvpn.eutopia.cz")
     app.setApplicationName("QOpenVPN")
     app.setQuitOnLastWindowClosed(False)
+    startup_mark("QApplication")
     # noinspection PyUnusedLocal
     w = QOpenVPNWidget()
+    if startup_profile:
+        QtCore.QTimer.singleShot(0, print_startup_profile)
     sys.exit(app.exec_())
 
 
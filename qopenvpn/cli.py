@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Command line interface of QOpenVPN for scripts and monitoring agents.
+
+Uses the same settings, systemd units, journal parser and STUN client as the
+GUI, but doesn't import PySide2 or dbus (settings are read directly from
+QSettings INI file), so it starts fast and doesn't need display. Results are
+printed as JSON (logs as one JSON object per line), errors as {"error": message}
+with exit code 2.
+"""
+
+import argparse
+import configparser
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Same as qopenvpn.status.ACTIVE_STATES (that module needs dbus)
+ACTIVE_STATES = ("active", "reloading")
+PRIORITY_NAMES = ("emerg", "alert", "crit", "err", "warning", "notice", "info", "debug")
+ERROR_EXITCODE = 2
+
+
+class CliError(Exception):
+    """Error printed as JSON object {"error": message}"""
+
+
+def settings_path():
+    """Return path of QSettings INI file of QOpenVPN"""
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(config_home, "QOpenVPN", "QOpenVPN.conf")
+
+
+def read_settings(path=None):
+    """Read [General] section of QSettings INI file to dict (values are strings or lists of strings)"""
+    parser = configparser.RawConfigParser(strict=False)
+    parser.optionxform = str
+    try:
+        parser.read(path or settings_path(), encoding="utf-8")
+    except (configparser.Error, UnicodeDecodeError):
+        return {}
+    if not parser.has_section("General"):
+        return {}
+    return {key: parse_qsettings_value(value) for key, value in parser.items("General")}
+
+
+def parse_qsettings_value(value):
+    """Decode QSettings INI value (comma-separated values are lists, quoted strings may contain commas)"""
+    if value.startswith("@Invalid("):
+        return None
+    items = []
+    item = []
+    quoted = escaped = False
+    for char in value:
+        if escaped:
+            item.append({"n": "\n", "t": "\t", "r": "\r"}.get(char, char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == "," and not quoted:
+            items.append("".join(item).strip())
+            item = []
+        else:
+            item.append(char)
+    items.append("".join(item).strip())
+    return items if len(items) > 1 else items[0]
+
+
+def settings_list(value):
+    """Return setting value as list (one-item lists are stored as plain strings)"""
+    if not value:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def profiles(settings):
+    """Return names of all managed VPN profiles (selected VPN first)"""
+    names = [settings.get("vpn_name")] if settings.get("vpn_name") else []
+    for name in settings_list(settings.get("vpn_profiles")):
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def unit_name(settings, vpn_name):
+    """Return name of systemd unit of VPN profile"""
+    return "{}@{}".format(settings.get("service_name") or "openvpn-client", vpn_name)
+
+
+def run(cmdline, timeout=None):
+    """Run command, return (exitcode, output)"""
+    try:
+        proc = subprocess.run(cmdline, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return -1, "Command timed out after {} s".format(timeout)
+    except OSError as e:
+        return -1, str(e)
+    return proc.returncode, proc.stdout.decode(errors="replace")
+
+
+def helper_request(command, unit, timeout=120):
+    """Run systemctl command by privileged helper if GUI started it, return (exitcode, output)
+    or None if helper is not running or refused request"""
+    import socket
+    from qopenvpn.helper import HELPER_COMMANDS, default_socket_path, peer_uid
+    if command not in HELPER_COMMANDS:
+        return None
+    try:
+        path = default_socket_path()
+        if not os.path.exists(path):
+            return None
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            # Only helper running as root is trusted (socket path could be bound by anyone else)
+            if peer_uid(sock) != 0:
+                return None
+            sock.sendall(json.dumps({"id": 1, "command": command, "unit": unit}).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                response = json.loads(f.readline().decode(errors="replace"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(response, dict) or response.get("exitcode", -1) == -1:
+        return None
+    return response["exitcode"], response.get("output", "")
+
+
+def selected_profiles(args, settings):
+    names = args.profiles or profiles(settings)
+    if not names:
+        raise CliError("No VPN profile is configured (set it in QOpenVPN settings)")
+    return names
+
+
+def cmd_status(args, settings):
+    """Print state of VPN profiles, exit code is 0 if any of them is active"""
+    names = selected_profiles(args, settings)
+    units = [unit_name(settings, name) for name in names]
+    exitcode, output = run(["systemctl", "is-active"] + units, timeout=args.timeout)
+    states = output.split()
+    if len(states) != len(units):
+        states = ["unknown"] * len(units)
+    result = {
+        "profiles": [{"name": name, "unit": unit, "state": state, "active": state in ACTIVE_STATES}
+                     for name, unit, state in zip(names, units, states)],
+    }
+    result["active"] = any(profile["active"] for profile in result["profiles"])
+    return result, 0 if result["active"] else 3
+
+
+def cmd_systemctl(args, settings):
+    """Start or stop VPN profile (by privileged helper if it is running, by sudo command otherwise)"""
+    name = args.profile or (profiles(settings) or [None])[0]
+    if not name:
+        raise CliError("No VPN profile is configured (set it in QOpenVPN settings)")
+    unit = unit_name(settings, name)
+    reply = None
+    if settings.get("use_helper") == "true":
+        reply = helper_request(args.command, unit, args.timeout)
+    if reply is None:
+        sudo_command = args.sudo_command or settings.get("sudo_command") or "sudo"
+        reply = run([sudo_command, "systemctl", args.command, unit], timeout=args.timeout)
+    exitcode, output = reply
+    return {"profile": name, "unit": unit, "command": args.command, "exitcode": exitcode,
+            "output": output.strip()}, 0 if exitcode == 0 else 1
+
+
+def cmd_ip(args, settings):
+    """Print external IP address and hostname (looked up over STUN)"""
+    from qopenvpn import extip
+    ip, hostname = extip.lookup()
+    return {"ip": ip or None, "hostname": hostname or None}, 0 if ip else 1
+
+
+def record_dict(record):
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(record.timestamp / 1e6)),
+        "timestamp": record.timestamp,
+        "priority": PRIORITY_NAMES[record.priority] if 0 <= record.priority < len(PRIORITY_NAMES) else
+        record.priority,
+        "pid": record.pid,
+        "identifier": record.identifier,
+        "message": record.message,
+    }
+
+
+def cmd_logs(args, settings):
+    """Print OpenVPN logs of current boot as JSON lines (continuously with --follow)"""
+    from qopenvpn.logstore import JournalParser
+    name = args.profile or (profiles(settings) or [None])[0]
+    if not name:
+        raise CliError("No VPN profile is configured (set it in QOpenVPN settings)")
+    cmdline = []
+    if settings.get("use_sudo") == "true":
+        cmdline.append(args.sudo_command or settings.get("sudo_command") or "sudo")
+    cmdline.extend(["journalctl", "-b", "-u", unit_name(settings, name), "--output=json"])
+    if args.lines is not None:
+        cmdline.append("--lines={}".format(args.lines))
+    if args.follow:
+        cmdline.append("--follow")
+
+    parser = JournalParser()
+    try:
+        proc = subprocess.Popen(cmdline, stdout=subprocess.PIPE)
+    except OSError as e:
+        raise CliError(str(e))
+    interrupted = False
+    try:
+        for chunk in iter(lambda: proc.stdout.read1(65536), b""):
+            for record in parser.feed(chunk):
+                print(json.dumps(record_dict(record)), flush=args.follow)
+    except KeyboardInterrupt:
+        interrupted = True
+    except BrokenPipeError:
+        # Reader of output (e.g. head) exited, don't fail again when stdout is flushed at exit
+        interrupted = True
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.terminate()
+        proc.wait()
+    return None, 0 if interrupted or proc.returncode == 0 else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="qopenvpn-cli", description="Control OpenVPN systemd units of QOpenVPN "
+                                                                      "profiles and print results as JSON")
+    parser.add_argument("--settings", help="QOpenVPN settings file (default: {})".format(settings_path()))
+    parser.add_argument("--sudo-command", help="override sudo command from settings")
+    parser.add_argument("--timeout", type=int, default=120, help="timeout of systemctl commands in seconds "
+                                                                 "(default: %(default)s)")
+    parser.add_argument("--pretty", action="store_true", help="indent JSON output")
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    subparsers.required = True
+
+    status_parser = subparsers.add_parser("status", help="state of VPN profiles (exit code 3 if none is active)")
+    status_parser.add_argument("profiles", nargs="*", metavar="PROFILE", help="profiles (default: all)")
+    status_parser.set_defaults(func=cmd_status)
+    for command in ("start", "stop"):
+        command_parser = subparsers.add_parser(command, help="{} VPN profile".format(command))
+        command_parser.add_argument("profile", nargs="?", help="profile (default: selected VPN)")
+        command_parser.set_defaults(func=cmd_systemctl)
+    ip_parser = subparsers.add_parser("ip", help="external IP address")
+    ip_parser.set_defaults(func=cmd_ip)
+    logs_parser = subparsers.add_parser("logs", help="OpenVPN logs of current boot (one JSON object per line)")
+    logs_parser.add_argument("profile", nargs="?", help="profile (default: selected VPN)")
+    logs_parser.add_argument("-f", "--follow", action="store_true", help="keep printing new log entries")
+    logs_parser.add_argument("-n", "--lines", type=int, help="number of last entries to print")
+    logs_parser.set_defaults(func=cmd_logs)
+
+    args = parser.parse_args(argv)
+    settings = read_settings(args.settings)
+    try:
+        result, exitcode = args.func(args, settings)
+    except CliError as e:
+        result, exitcode = {"error": str(e)}, ERROR_EXITCODE
+    if result is not None:
+        print(json.dumps(result, indent=2 if args.pretty else None))
+    return exitcode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
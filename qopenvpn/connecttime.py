@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Measurement of connect time of VPN profiles.
+
+Every connection attempt is timestamped in four phases: start was requested
+(Connect was clicked), systemd unit started activating (i.e. after password
+prompt of sudo command, if any), unit became active and OpenVPN reported that
+tunnel is ready ("Initialization Sequence Completed" in the journal or
+CONNECTED state on management interface). Connect times (from start of
+activation, so they don't include time spent typing password) are kept in
+per-profile histograms, which are saved between sessions and can be exported
+to JSON together with phases of last attempts.
+"""
+
+import bisect
+import collections
+import json
+import os
+import time
+
+from PySide2 import QtCore
+
+READY_MESSAGE = "Initialization Sequence Completed"
+
+# Upper bounds (in seconds) of histogram buckets, last bucket is unbounded
+BUCKETS = (0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 45, 60, 90, 120)
+
+
+def default_path():
+    """Return path of file with saved connect times"""
+    data_location = QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.AppDataLocation)
+    return os.path.join(data_location, "connect_times.json")
+
+
+class ConnectAttempt(object):
+    """Timestamps (time.monotonic) of phases of one connection attempt"""
+    __slots__ = ("started", "requested", "activating", "unit_active", "ready")
+
+    def __init__(self):
+        self.started = time.time()  # wall clock time of start request
+        self.requested = time.monotonic()
+        self.activating = None  # None until unit starts activating
+        self.unit_active = None
+        self.ready = None
+
+    def connect_time(self):
+        """Return seconds from start of activation to tunnel ready"""
+        return self.ready - self.activating
+
+    def as_dict(self):
+        """Return phases in seconds since start request"""
+        def phase(timestamp):
+            return None if timestamp is None else round(timestamp - self.requested, 3)
+
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "activating": phase(self.activating),
+            "unit_active": phase(self.unit_active),
+            "ready": phase(self.ready),
+        }
+
+
+class ConnectTimeHistogram(object):
+    """Histogram of connect times of one profile (with last `max_samples` samples for percentiles)"""
+
+    def __init__(self, max_samples=1000, max_attempts=100):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.samples = collections.deque(maxlen=max_samples)
+        self.attempts = collections.deque(maxlen=max_attempts)  # dicts of last attempts
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def add(self, seconds, attempt=None):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.samples.append(seconds)
+        if attempt is not None:
+            self.attempts.append(attempt.as_dict())
+
+    def percentile(self, p):
+        """Return p-th percentile (0-100) of recent connect times (None if there are no samples)"""
+        if not self.samples:
+            return None
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+    def as_dict(self):
+        labels = ["<={:g}".format(bound) for bound in BUCKETS] + [">{:g}".format(BUCKETS[-1])]
+        return {
+            "count": len(self),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "mean": round(sum(self.samples) / len(self.samples), 3) if self.samples else None,
+            "buckets": collections.OrderedDict(zip(labels, self.counts)),
+            "samples": [round(sample, 3) for sample in self.samples],
+            "attempts": list(self.attempts),
+        }
+
+    def load_dict(self, data):
+        counts = list(data.get("buckets", {}).values())
+        if len(counts) == len(self.counts):
+            self.counts = [int(count) for count in counts]
+        self.samples.extend(float(sample) for sample in data.get("samples", []))
+        self.attempts.extend(data.get("attempts", []))
+
+
+class ConnectTimeTracker(QtCore.QObject):
+    """Track phases of connection attempts of VPN profiles"""
+    connectTimeMeasured = QtCore.Signal(str, float)  # profile, seconds from start of activation to tunnel ready
+
+    def __init__(self, path=None, watch_journal=True, timeout=180, parent=None):
+        """Save histograms to `path`, watch journal for READY_MESSAGE if `watch_journal`,
+        forget attempts not finished in `timeout` seconds"""
+        super(ConnectTimeTracker, self).__init__(parent)
+        self.path = path or default_path()
+        self.watch_journal = watch_journal
+        self.timeout = timeout
+        self.attempts = {}  # profile -> ConnectAttempt
+        self.histograms = {}  # profile -> ConnectTimeHistogram
+        self._journals = {}  # profile -> (QProcess, JournalParser)
+        self.load()
+
+    def start_requested(self, profile, unit):
+        """Start of profile (systemd `unit`) was requested (call before running start command)"""
+        self.cancel(profile)
+        self.attempts[profile] = ConnectAttempt()
+        if self.watch_journal:
+            self._watch_journal(profile, unit)
+
+    def unit_activating(self, profile):
+        """Unit of profile started activating (or `systemctl start` finished, if state change was missed)"""
+        attempt = self.attempts.get(profile)
+        if attempt is not None and attempt.activating is None:
+            attempt.activating = time.monotonic()
+            QtCore.QTimer.singleShot(self.timeout * 1000, lambda: self._expire(profile, attempt))
+
+    def unit_active(self, profile):
+        """Unit of profile became active"""
+        attempt = self.attempts.get(profile)
+        if attempt is not None and attempt.activating is not None and attempt.unit_active is None:
+            attempt.unit_active = time.monotonic()
+
+    def tunnel_ready(self, profile):
+        """OpenVPN of profile reported that tunnel is ready"""
+        attempt = self.attempts.pop(profile, None)
+        self._stop_journal(profile)
+        if attempt is None or attempt.activating is None:
+            # Start of activation was not seen, connect time is unknown
+            return
+        attempt.ready = time.monotonic()
+        if attempt.unit_active is None:
+            attempt.unit_active = attempt.ready
+        seconds = attempt.connect_time()
+        self.histogram(profile).add(seconds, attempt)
+        self.save()
+        self.connectTimeMeasured.emit(profile, seconds)
+
+    def cancel(self, profile):
+        """Forget unfinished connection attempt (e.g. profile was stopped)"""
+        self.attempts.pop(profile, None)
+        self._stop_journal(profile)
+
+    def histogram(self, profile):
+        if profile not in self.histograms:
+            self.histograms[profile] = ConnectTimeHistogram()
+        return self.histograms[profile]
+
+    def summary(self, profile):
+        """Return (count, p50, p95) of connect times of profile"""
+        histogram = self.histograms.get(profile)
+        if histogram is None or not histogram.samples:
+            return None
+        return len(histogram), histogram.percentile(50), histogram.percentile(95)
+
+    def as_dict(self):
+        return {
+            "generated": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "buckets": list(BUCKETS),
+            "profiles": {profile: histogram.as_dict() for profile, histogram in sorted(self.histograms.items())},
+        }
+
+    def export(self, path):
+        """Export connect times of all profiles to JSON file"""
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for profile, histogram in data.get("profiles", {}).items():
+            self.histogram(profile).load_dict(histogram)
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = "{}.tmp".format(self.path)
+            self.export(tmp_path)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def _expire(self, profile, attempt):
+        if self.attempts.get(profile) is attempt:
+            self.cancel(profile)
+
+    def _watch_journal(self, profile, unit):
+        """Follow journal of unit until READY_MESSAGE is logged"""
+        # Journal parser is imported only when it is needed (it is not needed at startup)
+        from qopenvpn.logstore import JournalParser
+        proc = QtCore.QProcess(self)
+        parser = JournalParser()
+        proc.readyReadStandardOutput.connect(lambda: self._on_journal_output(profile, proc, parser))
+        proc.start("journalctl", ["--follow", "--output=json", "--lines=0", "--unit={}".format(unit)])
+        self._journals[profile] = proc
+
+    def _on_journal_output(self, profile, proc, parser):
+        for record in parser.feed(proc.readAllStandardOutput().data()):
+            if READY_MESSAGE in record.message:
+                self.tunnel_ready(profile)
+                return
+
+    def _stop_journal(self, profile):
+        proc = self._journals.pop(profile, None)
+        if proc is not None:
+            # Don't block GUI waiting for journalctl to exit, delete it when it does
+            proc.readyReadStandardOutput.disconnect()
+            if proc.state() == QtCore.QProcess.NotRunning:
+                proc.deleteLater()
+            else:
+                proc.finished.connect(proc.deleteLater)
+                proc.kill()
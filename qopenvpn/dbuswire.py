@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Minimal D-Bus client speaking the wire protocol directly.
+
+Implements just enough of the D-Bus specification (marshalling of all types
+except Unix file descriptors, message framing, EXTERNAL authentication) to call
+methods and receive signals on session bus without dbus-python and GLib. Socket
+is blocking for calls waiting for reply, messages can also be read without
+blocking (e.g. when event loop reports that socket is readable).
+
+See https://dbus.freedesktop.org/doc/dbus-specification.html
+"""
+
+import collections
+import os
+import socket
+import struct
+
+# Message types
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+SIGNAL = 4
+
+# Message flags
+NO_REPLY_EXPECTED = 0x1
+
+BUS_NAME = "org.freedesktop.DBus"
+BUS_PATH = "/org/freedesktop/DBus"
+BUS_INTERFACE = "org.freedesktop.DBus"
+
+# Header field codes, their types and names of Message attributes
+HEADER_FIELDS = {
+    1: ("o", "path"),
+    2: ("s", "interface"),
+    3: ("s", "member"),
+    4: ("s", "error_name"),
+    5: ("u", "reply_serial"),
+    6: ("s", "destination"),
+    7: ("s", "sender"),
+    8: ("g", "signature"),
+}
+
+# Fixed-size types: struct format (without byte order)
+_FIXED_TYPES = {"y": "B", "b": "I", "n": "h", "q": "H", "i": "i", "u": "I", "x": "q", "t": "Q", "d": "d"}
+_ALIGNMENTS = {"y": 1, "b": 4, "n": 2, "q": 2, "i": 4, "u": 4, "x": 8, "t": 8, "d": 8, "s": 4, "o": 4, "g": 1,
+               "v": 1, "a": 4, "(": 8, "{": 8}
+_FIXED_HEADER = struct.Struct("<4B2I")  # byte order, type, flags, version, body length, serial
+_BYTE_ORDERS = {b"l": "<", b"B": ">"}
+
+
+class Variant(object):
+    """Value with explicit D-Bus signature (plain values in variants get signature from their Python type)"""
+    __slots__ = ("signature", "value")
+
+    def __init__(self, signature, value):
+        self.signature = signature
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, Variant) and (self.signature, self.value) == (other.signature, other.value)
+
+    def __repr__(self):
+        return "Variant({!r}, {!r})".format(self.signature, self.value)
+
+
+class DBusError(RuntimeError):
+    """Error reply to method call"""
+
+    def __init__(self, name, message=""):
+        super(DBusError, self).__init__("{}: {}".format(name, message))
+        self.name = name
+        self.message = message
+
+
+def split_signature(signature):
+    """Split signature to list of single complete types, raise ValueError if it is invalid"""
+    types = []
+    i = 0
+    while i < len(signature):
+        end = _type_end(signature, i)
+        types.append(signature[i:end])
+        i = end
+    return types
+
+
+def _type_end(signature, i):
+    try:
+        code = signature[i]
+        if code == "a":
+            return _type_end(signature, i + 1)
+        if code in "({":
+            close = ")" if code == "(" else "}"
+            i += 1
+            while signature[i] != close:
+                i = _type_end(signature, i)
+            return i + 1
+    except IndexError:
+        raise ValueError("Incomplete signature: {}".format(signature))
+    if code in _FIXED_TYPES or code in "sogv":
+        return i + 1
+    raise ValueError("Unsupported type {!r} in signature {}".format(code, signature))
+
+
+def guess_signature(value):
+    """Return signature of plain Python value (used for variants)"""
+    if isinstance(value, Variant):
+        return "v"
+    if isinstance(value, bool):
+        return "b"
+    if isinstance(value, int):
+        return "i"
+    if isinstance(value, float):
+        return "d"
+    if isinstance(value, str):
+        return "s"
+    if isinstance(value, (bytes, bytearray)):
+        return "ay"
+    if isinstance(value, dict):
+        return "a{sv}"
+    if isinstance(value, (list, tuple)) and all(isinstance(item, str) for item in value):
+        return "as"
+    raise TypeError("Can't guess D-Bus type of {!r}".format(value))
+
+
+class _Writer(object):
+    """Marshaller of values to little-endian wire format"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def align(self, alignment):
+        self.buffer.extend(b"\0" * (-len(self.buffer) % alignment))
+
+    def write(self, signature, value):
+        code = signature[0]
+        if code in _FIXED_TYPES:
+            fmt = "<" + _FIXED_TYPES[code]
+            self.align(struct.calcsize(fmt))
+            self.buffer.extend(struct.pack(fmt, value))
+        elif code in "so":
+            data = value.encode()
+            self.align(4)
+            self.buffer.extend(struct.pack("<I", len(data)) + data + b"\0")
+        elif code == "g":
+            data = value.encode()
+            self.buffer.extend(struct.pack("<B", len(data)) + data + b"\0")
+        elif code == "v":
+            if not isinstance(value, Variant):
+                value = Variant(guess_signature(value), value)
+            self.write("g", value.signature)
+            self.write(value.signature, value.value)
+        elif code == "a":
+            self.align(4)
+            length_offset = len(self.buffer)
+            self.buffer.extend(b"\0\0\0\0")
+            element = signature[1:]
+            self.align(_ALIGNMENTS[element[0]])
+            start = len(self.buffer)
+            for item in (value.items() if element[0] == "{" else value):
+                self.write(element, item)
+            # Array length doesn't include padding before first element
+            struct.pack_into("<I", self.buffer, length_offset, len(self.buffer) - start)
+        else:
+            self.align(8)
+            for item_signature, item in zip(split_signature(signature[1:-1]), value):
+                self.write(item_signature, item)
+
+
+class _Reader(object):
+    """Unmarshaller of values in wire format"""
+
+    def __init__(self, data, byte_order="<", offset=0):
+        self.data = data
+        self.byte_order = byte_order
+        self.offset = offset
+
+    def align(self, alignment):
+        self.offset += -self.offset % alignment
+
+    def read(self, signature):
+        code = signature[0]
+        if code in _FIXED_TYPES:
+            fmt = self.byte_order + _FIXED_TYPES[code]
+            self.align(struct.calcsize(fmt))
+            value, = struct.unpack_from(fmt, self.data, self.offset)
+            self.offset += struct.calcsize(fmt)
+            return bool(value) if code == "b" else value
+        if code in "sog":
+            if code == "g":
+                length = self.read("y")
+            else:
+                length = self.read("u")
+            end = self.offset + length
+            if end >= len(self.data):
+                raise ValueError("String exceeds message")
+            value = bytes(self.data[self.offset:end]).decode(errors="replace")
+            self.offset = end + 1
+            return value
+        if code == "v":
+            return self.read(self.read("g"))
+        if code == "a":
+            length = self.read("u")
+            element = signature[1:]
+            self.align(_ALIGNMENTS[element[0]])
+            end = self.offset + length
+            if end > len(self.data):
+                raise ValueError("Array exceeds message")
+            items = []
+            while self.offset < end:
+                items.append(self.read(element))
+            return dict(items) if element[0] == "{" else items
+        self.align(8)
+        return tuple(self.read(item_signature) for item_signature in split_signature(signature[1:-1]))
+
+
+def marshal(signature, values):
+    """Marshal tuple of values of signature to bytes (little-endian, starting at aligned offset)"""
+    writer = _Writer()
+    for item_signature, value in zip(split_signature(signature), values):
+        writer.write(item_signature, value)
+    return bytes(writer.buffer)
+
+
+def unmarshal(signature, data, byte_order="<"):
+    """Unmarshal bytes to tuple of values of signature, raise ValueError if data are truncated"""
+    reader = _Reader(data, byte_order)
+    try:
+        return tuple(reader.read(item_signature) for item_signature in split_signature(signature))
+    except struct.error as e:
+        raise ValueError(str(e))
+
+
+class Message(object):
+    """D-Bus message"""
+    __slots__ = ("type", "flags", "serial", "path", "interface", "member", "error_name", "reply_serial",
+                 "destination", "sender", "signature", "body")
+
+    def __init__(self, message_type, path=None, interface=None, member=None, signature="", body=(), flags=0,
+                 **fields):
+        self.type = message_type
+        self.flags = flags
+        self.serial = 0
+        self.path = path
+        self.interface = interface
+        self.member = member
+        self.error_name = fields.get("error_name")
+        self.reply_serial = fields.get("reply_serial")
+        self.destination = fields.get("destination")
+        self.sender = fields.get("sender")
+        self.signature = signature
+        self.body = tuple(body)
+
+    def __repr__(self):
+        return "<Message type={} serial={} {}.{} reply_serial={} body={!r}>".format(
+            self.type, self.serial, self.interface, self.member or self.error_name, self.reply_serial, self.body)
+
+    def encode(self, serial):
+        """Encode message with given serial number"""
+        body = marshal(self.signature, self.body)
+        fields = []
+        for code, (signature, name) in sorted(HEADER_FIELDS.items()):
+            value = getattr(self, name)
+            if value:
+                fields.append((code, Variant(signature, value)))
+        writer = _Writer()
+        writer.buffer.extend(_FIXED_HEADER.pack(ord("l"), self.type, self.flags, 1, len(body), serial))
+        writer.write("a(yv)", fields)
+        writer.align(8)
+        return bytes(writer.buffer) + body
+
+    @classmethod
+    def decode(cls, data):
+        """Decode one complete message (see message_size)"""
+        byte_order = _BYTE_ORDERS.get(bytes(data[:1]))
+        if byte_order is None:
+            raise ValueError("Invalid byte order in message")
+        reader = _Reader(data, byte_order, 4)
+        try:
+            body_length = reader.read("u")
+            serial = reader.read("u")
+            fields = reader.read("a(yv)")
+            reader.align(8)
+            message = cls(data[1], flags=data[2])
+            message.serial = serial
+            for code, value in fields:
+                if code in HEADER_FIELDS:
+                    setattr(message, HEADER_FIELDS[code][1], value)
+            message.signature = message.signature or ""
+            body = data[reader.offset:reader.offset + body_length]
+            message.body = unmarshal(message.signature, body, byte_order)
+        except struct.error as e:
+            raise ValueError(str(e))
+        return message
+
+
+def message_size(data):
+    """Return size of first message in buffer or None if its header is not complete yet"""
+    if len(data) < 16:
+        return None
+    byte_order = _BYTE_ORDERS.get(bytes(data[:1]))
+    if byte_order is None:
+        raise ValueError("Invalid byte order in message")
+    body_length, serial, fields_length = struct.unpack_from(byte_order + "3I", data, 4)
+    header_length = 16 + fields_length
+    return header_length + (-header_length % 8) + body_length
+
+
+def method_call(destination, path, interface, member, signature="", args=(), flags=0):
+    return Message(METHOD_CALL, path, interface, member, signature, args, flags, destination=destination)
+
+
+def session_bus_addresses():
+    """Return socket addresses of session bus (abstract addresses start with NUL byte)"""
+    addresses = []
+    for address in os.environ.get("DBUS_SESSION_BUS_ADDRESS", "").split(";"):
+        transport, sep, params = address.partition(":")
+        if transport != "unix":
+            continue
+        params = dict(param.partition("=")[::2] for param in params.split(","))
+        if "path" in params:
+            addresses.append(_unescape(params["path"]))
+        elif "abstract" in params:
+            addresses.append("\0" + _unescape(params["abstract"]))
+    if not addresses and os.environ.get("XDG_RUNTIME_DIR"):
+        # Default address of systemd user session
+        path = os.path.join(os.environ["XDG_RUNTIME_DIR"], "bus")
+        if os.path.exists(path):
+            addresses.append(path)
+    return addresses
+
+
+def _unescape(value):
+    """Decode %-escaped bytes in D-Bus address value"""
+    parts = value.split("%")
+    data = bytearray(parts[0].encode())
+    for part in parts[1:]:
+        data.append(int(part[:2], 16))
+        data.extend(part[2:].encode())
+    return data.decode()
+
+
+class Connection(object):
+    """Connection to message bus"""
+
+    def __init__(self, address=None, timeout=5):
+        """Connect to bus at socket `address` (session bus by default) and register on it,
+        raise OSError if it fails"""
+        self.timeout = timeout
+        self.serial = 0
+        self.unique_name = None
+        self.received = collections.deque()  # messages received while waiting for reply
+        self._buffer = bytearray()
+        addresses = [address] if address else session_bus_addresses()
+        if not addresses:
+            raise OSError("Address of D-Bus session bus is not known")
+        error = None
+        for address in addresses:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.settimeout(timeout)
+            try:
+                self.socket.connect(address)
+                break
+            except OSError as e:
+                self.socket.close()
+                error = e
+        else:
+            raise error
+        try:
+            self._authenticate()
+            self.unique_name = self.call(BUS_NAME, BUS_PATH, BUS_INTERFACE, "Hello")[0]
+        except (OSError, ValueError, DBusError) as e:
+            self.close()
+            raise OSError("D-Bus handshake failed: {}".format(e))
+
+    def _authenticate(self):
+        uid = str(os.getuid()).encode().hex()
+        self.socket.sendall(b"\0AUTH EXTERNAL " + uid.encode() + b"\r\n")
+        line = b""
+        while not line.endswith(b"\r\n"):
+            chunk = self.socket.recv(256)
+            if not chunk:
+                raise OSError("Connection closed during authentication")
+            line += chunk
+        if not line.startswith(b"OK "):
+            raise OSError("Authentication rejected: {}".format(line.strip().decode(errors="replace")))
+        self.socket.sendall(b"BEGIN\r\n")
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def close(self):
+        self.socket.close()
+
+    def send(self, message):
+        """Send message, return its serial number"""
+        self.serial += 1
+        self.socket.sendall(message.encode(self.serial))
+        return self.serial
+
+    def call(self, destination, path, interface, member, signature="", args=(), timeout=None):
+        """Call method and wait for reply, return its body (raise DBusError on error reply,
+        OSError if connection fails or reply doesn't arrive in time)"""
+        serial = self.send(method_call(destination, path, interface, member, signature, args))
+        self.socket.settimeout(self.timeout if timeout is None else timeout)
+        reply = None
+        while reply is None:
+            for message in self._read(block=True):
+                if message.reply_serial == serial and message.type in (METHOD_RETURN, ERROR):
+                    reply = message
+                else:
+                    self.received.append(message)
+        if reply.type == ERROR:
+            raise DBusError(reply.error_name, reply.body[0] if reply.body else "")
+        return reply.body
+
+    def read_messages(self, block=False):
+        """Return messages which can be read without blocking (including those received while
+        waiting for reply) or wait for at least one if `block`, raise OSError if connection
+        was closed or nothing arrived in time"""
+        messages = list(self.received)
+        self.received.clear()
+        messages.extend(self._read(block=False))
+        while block and not messages:
+            messages.extend(self._read(block=True))
+        return messages
+
+    def _read(self, block):
+        if not block:
+            self.socket.setblocking(False)
+        try:
+            data = self.socket.recv(65536)
+        except BlockingIOError:
+            return []
+        except socket.timeout:
+            raise OSError("Timed out waiting for D-Bus reply")
+        finally:
+            if not block:
+                self.socket.settimeout(self.timeout)
+        if not data:
+            raise OSError("D-Bus connection closed")
+        self._buffer.extend(data)
+        messages = []
+        while True:
+            size = message_size(self._buffer)
+            if size is None or len(self._buffer) < size:
+                return messages
+            messages.append(Message.decode(bytes(self._buffer[:size])))
+            del self._buffer[:size]
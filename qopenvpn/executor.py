@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Executor of external commands (systemctl, sudo, ...).
+
+Commands in the same queue (e.g. commands for one systemd unit) run one after
+another, commands in different queues run concurrently. Command identical to the
+last command in its queue (running or waiting) is not run again, its callback
+just gets the result of that one, so e.g. repeated `systemctl is-active` polls
+share one process. Commands are never merged across other commands, so e.g.
+start, stop, start runs all three in order. Every command has a timeout after
+which it is killed and latency of every command is recorded.
+"""
+
+import sys
+import time
+
+from PySide2 import QtCore
+
+
+class CommandStats(object):
+    """Latency statistics of one kind of command"""
+    __slots__ = ("count", "failures", "timeouts", "merged", "total", "last", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.merged = 0  # requests merged with identical waiting command
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def add(self, latency, exitcode, timed_out=False):
+        self.count += 1
+        self.total += latency
+        self.last = latency
+        self.max = max(self.max, latency)
+        if exitcode != 0:
+            self.failures += 1
+        if timed_out:
+            self.timeouts += 1
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ + ("avg",)}
+
+
+class Command(object):
+    """Queued or running command"""
+    __slots__ = ("argv", "name", "queue", "timeout", "callbacks", "process", "started", "timer", "timed_out")
+
+    def __init__(self, argv, name, queue, timeout, callback):
+        self.argv = argv
+        self.name = name
+        self.queue = queue
+        self.timeout = timeout
+        self.callbacks = [callback]
+        self.process = None
+        self.started = None
+        self.timer = None
+        self.timed_out = False
+
+
+class CommandExecutor(QtCore.QObject):
+    """Run commands in per-queue order with deduplication of identical commands and timeouts"""
+    def __init__(self, default_timeout=30, slow_threshold=5, parent=None):
+        """Kill commands running longer than `default_timeout` seconds,
+        report commands slower than `slow_threshold` seconds to stderr"""
+        super(CommandExecutor, self).__init__(parent)
+        self.default_timeout = default_timeout
+        self.slow_threshold = slow_threshold
+        self.queues = {}  # queue name -> list of Commands (first one is running)
+        self.stats = {}  # command name -> CommandStats
+
+    def run(self, argv, callback, queue=None, timeout=None, name=None):
+        """Run command (list of arguments) and call callback(exitcode, exitstatus, output) when it finishes
+
+        Command waits until all previous commands in the same `queue` finish (every
+        command has its own queue by default). Name of command (for statistics) is
+        first two arguments by default.
+        """
+        argv = [str(arg) for arg in argv]
+        name = name or " ".join(argv[:2])
+        queue = queue or " ".join(argv)
+        commands = self.queues.setdefault(queue, [])
+        # Merge only with last command in queue, so order of different commands is kept
+        if commands and commands[-1].argv == argv:
+            commands[-1].callbacks.append(callback)
+            self.stats.setdefault(name, CommandStats()).merged += 1
+            return
+        commands.append(Command(argv, name, queue, self.default_timeout if timeout is None else timeout, callback))
+        if len(commands) == 1:
+            self._start(commands[0])
+
+    def is_busy(self, queue=None):
+        """Is any command (in given queue) queued or running?"""
+        if queue is not None:
+            return bool(self.queues.get(queue))
+        return any(self.queues.values())
+
+    @QtCore.Slot()
+    def kill_all(self):
+        """Kill all running commands and drop queued ones (e.g. when application quits)"""
+        queues, self.queues = self.queues, {}
+        for commands in queues.values():
+            if commands and commands[0].timer is not None:
+                commands[0].timer.stop()
+            if commands and commands[0].process is not None:
+                commands[0].process.finished.disconnect()
+                commands[0].process.kill()
+                commands[0].process.waitForFinished(1000)
+
+    def _start(self, command):
+        process = QtCore.QProcess(self)
+        process.setProcessEnvironment(QtCore.QProcessEnvironment.systemEnvironment())
+        process.setProcessChannelMode(QtCore.QProcess.MergedChannels)
+        process.finished.connect(lambda code, status: self._finished(command, code, status))
+        process.errorOccurred.connect(lambda error: self._error(command, error))
+        command.process = process
+        if command.timeout:
+            command.timer = QtCore.QTimer(self)
+            command.timer.setSingleShot(True)
+            command.timer.timeout.connect(lambda: self._timeout(command))
+            command.timer.start(int(command.timeout * 1000))
+        command.started = time.monotonic()
+        process.start(command.argv[0], command.argv[1:])
+
+    def _timeout(self, command):
+        """Kill command which runs too long (finished signal follows)"""
+        if command.process is not None and command.process.state() != QtCore.QProcess.NotRunning:
+            print("Command `{}` timed out after {} s, killing it".format(" ".join(command.argv), command.timeout),
+                  file=sys.stderr)
+            command.timed_out = True
+            command.process.kill()
+
+    def _error(self, command, error):
+        """Finish command which couldn't be started (finished signal is not emitted then)"""
+        if error == QtCore.QProcess.FailedToStart:
+            self._done(command, -1, QtCore.QProcess.CrashExit, command.process.errorString())
+
+    def _finished(self, command, exitcode, exitstatus):
+        output = command.process.readAllStandardOutput().data().decode(errors="replace")
+        self._done(command, exitcode, exitstatus, output)
+
+    def _done(self, command, exitcode, exitstatus, output):
+        if command.timer is not None:
+            command.timer.stop()
+            command.timer.deleteLater()
+        command.process.deleteLater()
+        command.process = None
+
+        latency = time.monotonic() - command.started
+        self.stats.setdefault(command.name, CommandStats()).add(latency, exitcode, command.timed_out)
+        if self.slow_threshold and latency >= self.slow_threshold:
+            print("Command `{}` took {:.1f} s".format(" ".join(command.argv), latency), file=sys.stderr)
+
+        # Start next command in queue before running callbacks (they can queue new commands)
+        commands = self.queues.get(command.queue, [])
+        if commands and commands[0] is command:
+            commands.pop(0)
+        if commands:
+            self._start(commands[0])
+        else:
+            self.queues.pop(command.queue, None)
+
+        for callback in command.callbacks:
+            callback(exitcode, exitstatus, output)
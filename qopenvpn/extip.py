@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""External IP address and hostname lookup with result cache.
+
+Results (including failures) are cached for a configurable time, so repeated
+lookups don't repeat STUN round-trip and reverse DNS lookup. Cache must be
+invalidated whenever VPN connection state changes.
+"""
+
+import socket
+import threading
+import time
+
+
+class ExternalIPCache(object):
+    """Thread-safe cache of last external IP address lookup"""
+
+    def __init__(self, ttl=300, negative_ttl=30):
+        """Keep successful results for `ttl` seconds and failures for `negative_ttl` seconds"""
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entry = None  # (expiration time, ip, hostname)
+        self._generation = 0
+
+    def configure(self, ttl=None, negative_ttl=None):
+        """Change TTLs (already cached entry keeps its original expiration time)"""
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if negative_ttl is not None:
+                self.negative_ttl = negative_ttl
+
+    @property
+    def generation(self):
+        """Counter incremented by every invalidation"""
+        with self._lock:
+            return self._generation
+
+    def get(self):
+        """Return cached (ip, hostname) tuple or None if there is no valid entry"""
+        with self._lock:
+            if self._entry is None:
+                return None
+            expiration, ip, hostname = self._entry
+            if time.monotonic() >= expiration:
+                self._entry = None
+                return None
+            return ip, hostname
+
+    def put(self, ip, hostname, generation=None):
+        """Store lookup result (empty `ip` means failed lookup), results of lookups
+        started before last invalidation (older `generation`) are ignored"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            ttl = self.ttl if ip else self.negative_ttl
+            if ttl > 0:
+                self._entry = (time.monotonic() + ttl, ip, hostname)
+
+    def invalidate(self):
+        """Drop cached entry (e.g. when VPN connection state changes)"""
+        with self._lock:
+            self._entry = None
+            self._generation += 1
+
+
+# Cache shared by whole application
+cache = ExternalIPCache()
+
+
+# noinspection PyBroadException
+def lookup(is_cancelled=None):
+    """Get external IP address and hostname without using cache (blocking)"""
+    # STUN client is imported only when it is needed (it is not needed at startup)
+    from qopenvpn import stun
+    try:
+        stunclient = stun.StunClient(race=True)
+        ip, port = stunclient.get_ip()
+    except:
+        ip = ""
+    if not ip or (is_cancelled is not None and is_cancelled()):
+        return ip, ""
+    try:
+        hostname = socket.gethostbyaddr(ip)[0]
+    except:
+        hostname = ""
+    return ip, hostname
+
+
+def getip(is_cancelled=None, use_cache=True):
+    """Get external IP address and hostname, use cached result if it is still valid (blocking)"""
+    if use_cache:
+        cached = cache.get()
+        if cached is not None:
+            return cached
+
+    generation = cache.generation
+    ip, hostname = lookup(is_cancelled)
+    if is_cancelled is None or not is_cancelled():
+        cache.put(ip, hostname, generation)
+    return ip, hostname
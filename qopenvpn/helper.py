@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Privileged helper for starting and stopping OpenVPN units.
+
+Helper is started once per session by sudo command (kdesu, gksu, sudo) and then
+listens on Unix socket, so Start/Stop don't need new privilege escalation (and
+password prompt) every time. It accepts only start/stop/restart of OpenVPN units
+and only from user who started it (checked by SO_PEERCRED). Socket lives in
+directory private to the user and clients check (by SO_PEERCRED too) that the
+helper runs as root. Helper exits when the GUI disconnects.
+
+Protocol is one JSON object per line, request::
+
+    {"id": 1, "command": "start", "unit": "openvpn-client@vpn"}
+
+and response::
+
+    {"id": 1, "exitcode": 0, "output": ""}
+
+Run with --systemctl pointing to stand-in script to test it without root.
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import socketserver
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+
+HELPER_COMMANDS = ("start", "stop", "restart")
+UNIT_RE = re.compile(r"^(openvpn-client|openvpn)@[A-Za-z0-9_.:-]+$")
+
+
+def default_socket_path():
+    """Return path of helper socket in user runtime directory (or in private per-user directory
+    in temporary directory if there is no runtime directory), raise OSError if it isn't private"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        runtime_dir = os.path.join(tempfile.gettempdir(), "qopenvpn-{}".format(os.getuid()))
+        try:
+            os.mkdir(runtime_dir, 0o700)
+        except FileExistsError:
+            pass
+    check_private_dir(runtime_dir, os.getuid())
+    return os.path.join(runtime_dir, "qopenvpn-helper.sock")
+
+
+def check_private_dir(path, uid):
+    """Raise OSError if directory is not owned by `uid` or is accessible by other users"""
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != uid or st.st_mode & 0o077:
+        raise OSError("Directory {} is not private to uid {}".format(path, uid))
+
+
+def peer_uid(sock):
+    """Return uid of process connected to Unix socket"""
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    pid, uid, gid = struct.unpack("3i", creds)
+    return uid
+
+
+def validate_request(request):
+    """Return error message if request is not allowed, None otherwise"""
+    if not isinstance(request, dict):
+        return "Invalid request"
+    if request.get("command") not in HELPER_COMMANDS:
+        return "Command not allowed: {}".format(request.get("command"))
+    unit = request.get("unit")
+    if not isinstance(unit, str) or not UNIT_RE.match(unit):
+        return "Unit not allowed: {}".format(unit)
+    return None
+
+
+def handle_request(request, systemctl="systemctl", timeout=60):
+    """Run allowed systemctl command, return response"""
+    error = validate_request(request)
+    response = {"id": request.get("id") if isinstance(request, dict) else None}
+    if error:
+        response.update(exitcode=-1, output=error)
+        return response
+    try:
+        proc = subprocess.run([systemctl, request["command"], request["unit"]], stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, timeout=timeout)
+        response.update(exitcode=proc.returncode, output=proc.stdout.decode(errors="replace"))
+    except subprocess.TimeoutExpired:
+        response.update(exitcode=-1, output="Command timed out after {} s".format(timeout))
+    except OSError as e:
+        response.update(exitcode=-1, output=str(e))
+    return response
+
+
+class HelperHandler(socketserver.StreamRequestHandler):
+    """Serve requests of one client"""
+
+    def setup(self):
+        super(HelperHandler, self).setup()
+        self.server.client_connected()
+
+    def handle(self):
+        if peer_uid(self.connection) not in (self.server.allowed_uid, 0):
+            self.wfile.write(json.dumps({"id": None, "exitcode": -1, "output": "Permission denied"}).encode() + b"\n")
+            return
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode(errors="replace"))
+            except ValueError:
+                request = None
+            response = handle_request(request, self.server.systemctl, self.server.command_timeout)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+    def finish(self):
+        try:
+            super(HelperHandler, self).finish()
+        finally:
+            self.server.client_disconnected()
+
+
+class HelperServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server of helper"""
+    daemon_threads = True
+
+    def __init__(self, socket_path, allowed_uid, systemctl="systemctl", command_timeout=60, persist=False):
+        """Accept clients of user `allowed_uid`, exit when last client disconnects (unless `persist`)"""
+        self.allowed_uid = allowed_uid
+        self.systemctl = systemctl
+        self.command_timeout = command_timeout
+        self.persist = persist
+        self.clients = 0
+        self._lock = threading.Lock()
+
+        # Access to socket is limited by its directory (private to the user) and by checking
+        # peer credentials of every client, so socket itself doesn't need to be chowned
+        check_private_dir(os.path.dirname(os.path.abspath(socket_path)), allowed_uid)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        old_umask = os.umask(0o111)
+        try:
+            socketserver.UnixStreamServer.__init__(self, socket_path, HelperHandler)
+        finally:
+            os.umask(old_umask)
+
+    def client_connected(self):
+        with self._lock:
+            self.clients += 1
+
+    def client_disconnected(self):
+        with self._lock:
+            self.clients -= 1
+            if self.clients == 0 and not self.persist:
+                threading.Thread(target=self.shutdown).start()
+
+    def shutdown_if_unused(self):
+        """Exit if nobody connected since start"""
+        with self._lock:
+            if self.clients == 0:
+                threading.Thread(target=self.shutdown).start()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="qopenvpn-helper",
+                                     description="Privileged helper for starting and stopping OpenVPN units")
+    parser.add_argument("--socket", default=None, help="path of Unix socket (default: %(default)s)")
+    parser.add_argument("--uid", type=int, default=None,
+                        help="uid of user allowed to connect (default: user who ran sudo or pkexec)")
+    parser.add_argument("--systemctl", default="systemctl", help="systemctl executable (default: %(default)s)")
+    parser.add_argument("--timeout", type=int, default=60, help="timeout of systemctl commands in seconds")
+    parser.add_argument("--idle-timeout", type=int, default=60,
+                        help="exit if no client connects in this number of seconds")
+    parser.add_argument("--persist", action="store_true", help="don't exit when last client disconnects")
+    args = parser.parse_args(argv)
+
+    uid = args.uid
+    if uid is None:
+        uid = int(os.environ.get("SUDO_UID") or os.environ.get("PKEXEC_UID") or os.getuid())
+    server = HelperServer(args.socket or default_socket_path(), uid, args.systemctl, args.timeout, args.persist)
+    if args.idle_timeout:
+        idle_timer = threading.Timer(args.idle_timeout, server.shutdown_if_unused)
+        idle_timer.daemon = True
+        idle_timer.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
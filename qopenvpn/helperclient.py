@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Client of privileged helper (see qopenvpn.helper).
+
+Helper is started by sudo command on first request and the client then keeps
+one connection to it for the whole session. Helper script is run by path in
+isolated mode (python -I), so root never imports modules from current
+directory, PYTHONPATH or user site-packages, and plain sudo is run with -n, so
+it fails right away instead of waiting for password on terminal nobody sees.
+"""
+
+import json
+import os
+import socket
+import sys
+
+from PySide2 import QtCore, QtNetwork
+
+from qopenvpn.helper import HELPER_COMMANDS, default_socket_path, peer_uid
+
+HELPER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "helper.py")
+
+
+class HelperClient(QtCore.QObject):
+    """Send start/stop/restart requests to privileged helper over Unix socket"""
+    connectedChanged = QtCore.Signal(bool)
+
+    def __init__(self, sudo_command, socket_path=None, start_timeout=60, helper_uid=0, parent=None):
+        """Start helper by `sudo_command`, give up if it doesn't listen in `start_timeout` seconds,
+        accept only helper running as `helper_uid`"""
+        super(HelperClient, self).__init__(parent)
+        self.sudo_command = sudo_command
+        self.socket_path = socket_path
+        self.start_timeout = start_timeout
+        self.helper_uid = helper_uid
+        self._next_id = 1
+        self._callbacks = {}  # request id -> callback
+        self._queued = []  # requests waiting for connection
+        self._partial = b""
+        self._starting = False
+        self._start_failed = False
+        self._launched = False  # new helper was launched by current start_helper()
+        self.process = None  # QProcess of sudo command running helper
+
+        self.socket = QtNetwork.QLocalSocket(self)
+        self.socket.connected.connect(self.on_connected)
+        self.socket.disconnected.connect(self.on_disconnected)
+        self.socket.readyRead.connect(self.on_ready_read)
+        self.socket.stateChanged.connect(self.on_socket_state_changed)
+        self.socket.errorOccurred.connect(self.on_socket_error)
+
+        self.retry_timer = QtCore.QTimer(self)
+        self.retry_timer.setSingleShot(True)
+        self.retry_timer.setInterval(250)
+        self.retry_timer.timeout.connect(self.connect_to_helper)
+
+        self.start_timer = QtCore.QTimer(self)
+        self.start_timer.setSingleShot(True)
+        self.start_timer.timeout.connect(self.on_start_timeout)
+
+    @staticmethod
+    def is_allowed(command):
+        return command in HELPER_COMMANDS
+
+    def is_connected(self):
+        return self.socket.state() == QtNetwork.QLocalSocket.ConnectedState
+
+    def request(self, command, unit, callback):
+        """Run `systemctl command unit` by helper, call callback(exitcode, output) with result
+        (exitcode is -1 if helper is not available)"""
+        request = {"id": self._next_id, "command": command, "unit": unit}
+        self._next_id += 1
+        self._callbacks[request["id"]] = callback
+        if self.is_connected():
+            self._send(request)
+            return
+        self._queued.append(request)
+        if not self._starting:
+            self.start_helper()
+
+    def start_helper(self):
+        """Connect to running helper or start new one (by sudo command)"""
+        if self.socket_path is None:
+            try:
+                self.socket_path = default_socket_path()
+            except OSError as e:
+                self.fail_all(str(e))
+                return
+        self._starting = True
+        self._launched = False
+        if not os.path.exists(self.socket_path) or self._start_failed:
+            if not self.launch_helper():
+                return
+        self.start_timer.start(self.start_timeout * 1000)
+        self.connect_to_helper()
+
+    def launch_helper(self):
+        """Launch new helper (it replaces socket left by crashed helper)"""
+        self._launched = True
+        argv = [self.sudo_command]
+        if os.path.basename(self.sudo_command) == "sudo":
+            argv.append("-n")
+        argv.extend([sys.executable, "-I", HELPER_SCRIPT, "--socket", self.socket_path, "--uid", str(os.getuid())])
+        process = QtCore.QProcess(self)
+        process.setProcessChannelMode(QtCore.QProcess.MergedChannels)
+        process.finished.connect(lambda code, status: self.on_helper_finished(process, code))
+        process.errorOccurred.connect(lambda error: self.on_helper_error(process, error))
+        self.process = process
+        process.start(argv[0], argv[1:])
+        return self.process is process
+
+    def on_helper_finished(self, process, exitcode):
+        """Fail right away if helper (or sudo command) exits before client connects"""
+        output = process.readAll().data().decode(errors="replace").strip()
+        process.deleteLater()
+        if process is not self.process:
+            return
+        self.process = None
+        if self._starting:
+            self._start_failed = True
+            self.socket.abort()
+            self.fail_all(output or "Helper exited with code {}".format(exitcode))
+
+    def on_helper_error(self, process, error):
+        if error == QtCore.QProcess.FailedToStart and process is self.process:
+            self.process = None
+            process.deleteLater()
+            self._start_failed = True
+            self.fail_all("Couldn't start helper: {}".format(process.errorString()))
+
+    @QtCore.Slot()
+    def connect_to_helper(self):
+        if self.socket.state() == QtNetwork.QLocalSocket.UnconnectedState:
+            self._partial = b""
+            self.socket.connectToServer(self.socket_path)
+
+    def close(self):
+        """Disconnect from helper (it exits then)"""
+        self._starting = False
+        self.start_timer.stop()
+        self.retry_timer.stop()
+        self.socket.abort()
+
+    def fail_all(self, message):
+        """Fail all pending requests"""
+        self._starting = False
+        self.start_timer.stop()
+        self.retry_timer.stop()
+        self._queued = []
+        callbacks, self._callbacks = self._callbacks, {}
+        for callback in callbacks.values():
+            callback(-1, message)
+
+    def _send(self, request):
+        self.socket.write(json.dumps(request).encode() + b"\n")
+
+    def helper_is_trusted(self):
+        """Is connected helper running as `helper_uid`? (socket path could be bound by anyone else)"""
+        try:
+            sock = socket.fromfd(int(self.socket.socketDescriptor()), socket.AF_UNIX, socket.SOCK_STREAM)
+        except (OSError, ValueError):
+            return False
+        try:
+            return peer_uid(sock) == self.helper_uid
+        except OSError:
+            return False
+        finally:
+            sock.close()
+
+    @QtCore.Slot()
+    def on_connected(self):
+        if not self.helper_is_trusted():
+            self._start_failed = True
+            self.fail_all("Helper socket {} is not owned by root".format(self.socket_path))
+            self.socket.abort()
+            return
+        self._starting = False
+        self._start_failed = False
+        self.start_timer.stop()
+        queued, self._queued = self._queued, []
+        for request in queued:
+            self._send(request)
+        self.connectedChanged.emit(True)
+
+    @QtCore.Slot()
+    def on_disconnected(self):
+        self.connectedChanged.emit(False)
+        self.fail_all("Helper disconnected")
+
+    def on_socket_state_changed(self, state):
+        """Retry connecting while helper is starting (socket may not exist yet)"""
+        if state == QtNetwork.QLocalSocket.UnconnectedState and self._starting:
+            self.retry_timer.start()
+
+    def on_socket_error(self, error):
+        """Launch new helper right away if nobody listens on socket (helper crashed)"""
+        if error == QtNetwork.QLocalSocket.ConnectionRefusedError and self._starting and not self._launched:
+            self.launch_helper()
+
+    @QtCore.Slot()
+    def on_start_timeout(self):
+        self._start_failed = True
+        self.socket.abort()
+        if self.process is not None:
+            self.process.kill()
+        self.fail_all("Helper didn't start in {} s".format(self.start_timeout))
+
+    @QtCore.Slot()
+    def on_ready_read(self):
+        data, sep, self._partial = (self._partial + self.socket.readAll().data()).rpartition(b"\n")
+        if not sep:
+            return
+        for line in data.split(b"\n"):
+            try:
+                response = json.loads(line.decode(errors="replace"))
+            except ValueError:
+                continue
+            callback = self._callbacks.pop(response.get("id"), None)
+            if callback is not None:
+                callback(response.get("exitcode", -1), response.get("output", ""))
+            elif response.get("id") is None:
+                # Helper refused connection
+                self.fail_all(response.get("output", ""))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""On-disk cache of icons pre-rendered from SVG images.
+
+Rendered pixmaps are stored as PNG files in user cache directory, keyed by hash
+of SVG content, size and device pixel ratio, so SVG renderer is needed only
+when image is changed (or first used in given size).
+"""
+
+import hashlib
+import os
+
+from PySide2 import QtCore, QtGui
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+
+# Images of connection states (images/openvpn_<state>.svg is used if it exists),
+# states without own image use image of fallback state
+STATE_IMAGES = {
+    "connected": "openvpn.svg",
+    "disconnected": "openvpn_disabled.svg",
+    "error": "openvpn_error.svg",  # disabled icon with red warning badge
+}
+STATE_FALLBACKS = {
+    "connecting": "disconnected",
+    "reconnecting": "connecting",
+}
+
+
+def default_cache_dir():
+    """Return path of icon cache in user cache directory"""
+    cache_location = QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.CacheLocation)
+    return os.path.join(cache_location, "icons")
+
+
+class IconCache(object):
+    """Cache of rasterized SVG icons (in memory and on disk)"""
+
+    def __init__(self, cache_dir=None, images_dir=IMAGES_DIR):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.images_dir = images_dir
+        self._hashes = {}  # SVG path -> hash of its content
+        self._icons = {}  # (SVG path, size, device pixel ratio) -> QIcon
+
+    def icon(self, image, size, device_pixel_ratio=None):
+        """Return icon rendered from SVG image (file name in images directory or full path)"""
+        path = os.path.join(self.images_dir, image)
+        if device_pixel_ratio is None:
+            device_pixel_ratio = QtGui.QGuiApplication.instance().devicePixelRatio()
+        key = (path, size, device_pixel_ratio)
+        if key not in self._icons:
+            self._icons[key] = QtGui.QIcon(self.pixmap(path, size, device_pixel_ratio))
+        return self._icons[key]
+
+    def state_icon(self, state, size=128, device_pixel_ratio=None):
+        """Return icon of connection state"""
+        return self.icon(self.state_image(state), size, device_pixel_ratio)
+
+    def state_image(self, state):
+        """Return file name of image of connection state"""
+        while True:
+            if state in STATE_IMAGES:
+                return STATE_IMAGES[state]
+            image = "openvpn_{}.svg".format(state)
+            if os.path.exists(os.path.join(self.images_dir, image)):
+                return image
+            if state not in STATE_FALLBACKS:
+                return STATE_IMAGES["disconnected"]
+            state = STATE_FALLBACKS[state]
+
+    def pixmap(self, path, size, device_pixel_ratio=1.0):
+        """Return pixmap rendered from SVG file (loaded from disk cache if possible)"""
+        pixels = int(round(size * device_pixel_ratio))
+        cache_path = self.cache_path(path, size, device_pixel_ratio)
+        pixmap = QtGui.QPixmap()
+        if cache_path is None or not pixmap.load(cache_path, "PNG"):
+            # Workaround for Plasma 5 not showing SVG icons (use rasterized pixmap)
+            pixmap = QtGui.QIcon(path).pixmap(pixels, pixels)
+            if cache_path is not None and not pixmap.isNull():
+                self._save(pixmap, cache_path)
+        pixmap.setDevicePixelRatio(device_pixel_ratio)
+        return pixmap
+
+    def cache_path(self, path, size, device_pixel_ratio=1.0):
+        """Return path of cached PNG file (None if SVG file can't be read)"""
+        if path not in self._hashes:
+            try:
+                with open(path, "rb") as f:
+                    self._hashes[path] = hashlib.sha1(f.read()).hexdigest()
+            except OSError:
+                return None
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache_dir, "{}-{}-{}@{:g}x.png".format(name, self._hashes[path], size,
+                                                                    device_pixel_ratio))
+
+    def _save(self, pixmap, cache_path):
+        """Atomically store pixmap to disk cache (errors are ignored, cache is optional)"""
+        tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if pixmap.save(tmp_path, "PNG"):
+                os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Detection of traffic leaking outside of VPN tunnel.
+
+External IP address is periodically checked over STUN in worker threads, often
+right after VPN state changes and less often (with exponential backoff) while
+it stays the same. Address seen while VPN is disconnected is remembered and if
+the same address is reported while VPN unit is active, traffic doesn't go
+through the tunnel. Unit is active before the tunnel is ready, so matches are
+ignored for a grace period after start (ended early when OpenVPN reports that
+tunnel is ready).
+"""
+
+import time
+
+from PySide2 import QtCore
+
+
+class LeakCheckSignals(QtCore.QObject):
+    """Signals of LeakCheckTask"""
+    finished = QtCore.Signal(int, str)  # check ID, external IP address (empty on failure)
+
+
+class LeakCheckTask(QtCore.QRunnable):
+    """Get external IP address (bypassing cache) in worker thread"""
+    def __init__(self, signals, check_id, servers=None, timeout=5):
+        super(LeakCheckTask, self).__init__()
+        self.signals = signals
+        self.check_id = check_id
+        self.servers = servers
+        self.timeout = timeout
+
+    # noinspection PyBroadException
+    def run(self):
+        # STUN client is imported only when it is needed (it is not needed at startup)
+        from qopenvpn import stun
+        try:
+            ip, port = stun.StunClient(timeout=self.timeout, race=True, servers=self.servers).get_ip()
+        except Exception:
+            ip = ""
+        try:
+            self.signals.finished.emit(self.check_id, ip)
+        except RuntimeError:
+            pass
+
+
+class LeakMonitor(QtCore.QObject):
+    """Periodically compare external IP address with address seen without VPN"""
+    leakDetected = QtCore.Signal(str)  # external IP address
+    leakResolved = QtCore.Signal()
+    checked = QtCore.Signal(str, bool)  # external IP address (empty on failure), VPN active
+
+    def __init__(self, min_interval=5, max_interval=600, backoff=2, grace_period=30, servers=None, timeout=5,
+                 thread_pool=None, parent=None):
+        """Check `min_interval` seconds after state change, then multiply interval by `backoff`
+        (up to `max_interval` seconds) while external IP address doesn't change. Leaks are not
+        reported in `grace_period` seconds after VPN start. STUN servers are `servers`
+        (STUN_SERVERS by default)."""
+        super(LeakMonitor, self).__init__(parent)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.grace_period = grace_period
+        self.servers = servers
+        self.timeout = timeout
+        self.thread_pool = thread_pool or QtCore.QThreadPool.globalInstance()
+        self.interval = min_interval
+        self.vpn_active = False
+        self.baseline_ip = ""  # external IP address without VPN
+        self.last_ip = ""
+        self.leaking = False
+        self._grace_end = 0  # time.monotonic() when grace period after VPN start ends
+        self._running = False
+        self._check_id = 0  # results of checks started before last state change are ignored
+
+        self._signals = LeakCheckSignals(self)
+        self._signals.finished.connect(self.on_check_finished)
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.check)
+
+    def is_running(self):
+        return self._running
+
+    def start(self, vpn_active=False):
+        """Start monitoring (check external IP address right away)"""
+        self._running = True
+        self.vpn_active = vpn_active
+        self._check_id += 1
+        self.interval = self.min_interval
+        self.check()
+
+    def stop(self):
+        """Stop monitoring (reported leak is resolved)"""
+        self._running = False
+        self._check_id += 1
+        self.timer.stop()
+        self._set_leaking(False, "")
+
+    def set_vpn_active(self, active):
+        """VPN unit was started or stopped"""
+        if active == self.vpn_active:
+            return
+        self.vpn_active = active
+        if active:
+            self._grace_end = time.monotonic() + self.grace_period
+        else:
+            self._set_leaking(False, "")
+        self.state_changed()
+
+    def tunnel_ready(self):
+        """OpenVPN reported that tunnel is ready (ends grace period)"""
+        self._grace_end = 0
+        self.state_changed()
+
+    def state_changed(self):
+        """Connection state changed (e.g. OpenVPN reconnected), check again soon"""
+        self._check_id += 1
+        self.last_ip = ""
+        self.interval = self.min_interval
+        if self._running:
+            self.timer.start(int(self.min_interval * 1000))
+
+    @QtCore.Slot()
+    def check(self):
+        """Start check of external IP address in worker thread"""
+        self.thread_pool.start(LeakCheckTask(self._signals, self._check_id, self.servers, self.timeout))
+
+    @QtCore.Slot(int, str)
+    def on_check_finished(self, check_id, ip):
+        if check_id != self._check_id or not self._running:
+            return
+        if not ip:
+            pass
+        elif self.vpn_active and ip == self.baseline_ip and time.monotonic() < self._grace_end:
+            # Tunnel is probably not ready yet, check again soon
+            self.interval = self.min_interval
+        else:
+            if not self.vpn_active:
+                self.baseline_ip = ip
+            elif self.baseline_ip:
+                self._set_leaking(ip == self.baseline_ip, ip)
+            # Back off while nothing changes
+            if ip == self.last_ip:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+            else:
+                self.interval = self.min_interval
+            self.last_ip = ip
+        self.checked.emit(ip, self.vpn_active)
+        self.timer.start(int(self.interval * 1000))
+
+    def _set_leaking(self, leaking, ip):
+        if leaking == self.leaking:
+            return
+        self.leaking = leaking
+        if leaking:
+            self.leakDetected.emit(ip)
+        else:
+            self.leakResolved.emit()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Bounded storage and index of log lines.
+
+Only last `max_lines` lines are kept in memory (ring buffer), older lines are
+spilled to anonymous temporary file and read back in chunks on demand, so memory
+usage stays constant no matter how many lines were ingested.
+"""
+
+import collections
+import heapq
+import json
+import tempfile
+import time
+from array import array
+
+
+class LogBuffer(object):
+    """Ring buffer of log lines with on-disk spill of evicted lines"""
+
+    def __init__(self, max_lines=10000, chunk_size=1000):
+        self.max_lines = max(1, max_lines)
+        self.chunk_size = max(1, chunk_size)
+        self._lines = collections.deque()
+        self._spill = None
+        self._offsets = array("Q")  # file offset of every spilled line
+        self._spill_end = 0
+        self._chunk_start = 0
+        self._chunk = []
+
+    def __len__(self):
+        return len(self._offsets) + len(self._lines)
+
+    @property
+    def first_buffered(self):
+        """Index of oldest line kept in memory (lines before it are spilled)"""
+        return len(self._offsets)
+
+    def clear(self):
+        """Drop all lines"""
+        self._lines.clear()
+        if self._spill is not None:
+            self._spill.close()
+        self._spill = None
+        self._offsets = array("Q")
+        self._spill_end = 0
+        self._chunk_start = 0
+        self._chunk = []
+
+    def append(self, lines):
+        """Append lines, return number of lines evicted from memory"""
+        self._lines.extend(lines)
+        evicted = len(self._lines) - self.max_lines
+        if evicted > 0:
+            self._spill_lines([self._lines.popleft() for i in range(evicted)])
+            return evicted
+        return 0
+
+    def line(self, index):
+        """Return line with given index (reading it from spill file if needed)"""
+        first_buffered = self.first_buffered
+        if index >= first_buffered:
+            return self._lines[index - first_buffered]
+        if not self._chunk_start <= index < self._chunk_start + len(self._chunk):
+            self._load_chunk(index)
+        return self._chunk[index - self._chunk_start]
+
+    def lines(self, start=0, stop=None):
+        """Return list of lines in range [start, stop)"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        return [self.line(i) for i in range(start, stop)]
+
+    def _spill_lines(self, lines):
+        """Write evicted lines to spill file"""
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile()
+        encoded = [line.encode(errors="replace") + b"\n" for line in lines]
+        offset = self._spill_end
+        for data in encoded:
+            self._offsets.append(offset)
+            offset += len(data)
+        self._spill.seek(self._spill_end)
+        self._spill.write(b"".join(encoded))
+        self._spill_end = offset
+
+    def _load_chunk(self, index):
+        """Read chunk of spilled lines around given index"""
+        start = max(0, index - self.chunk_size // 2)
+        stop = min(len(self._offsets), start + self.chunk_size)
+        end_offset = self._offsets[stop] if stop < len(self._offsets) else self._spill_end
+        self._spill.seek(self._offsets[start])
+        data = self._spill.read(end_offset - self._offsets[start])
+        self._chunk_start = start
+        self._chunk = data.decode(errors="replace").split("\n")[:stop - start]
+
+
+# Journal priorities (syslog levels)
+PRIORITY_EMERG = 0
+PRIORITY_ALERT = 1
+PRIORITY_CRIT = 2
+PRIORITY_ERR = 3
+PRIORITY_WARNING = 4
+PRIORITY_NOTICE = 5
+PRIORITY_INFO = 6
+PRIORITY_DEBUG = 7
+
+# Messages with which OpenVPN starts new connection attempt in already running process
+RESTART_PREFIXES = ("SIGUSR1[", "SIGHUP[")
+
+# Syslog identifier of OpenVPN (unit journal contains messages of systemd too)
+OPENVPN_IDENTIFIER = "openvpn"
+
+
+class LogRecord(object):
+    """Compact journal record"""
+    __slots__ = ("timestamp", "priority", "pid", "identifier", "message")
+
+    def __init__(self, timestamp, priority, pid, identifier, message):
+        self.timestamp = timestamp  # microseconds since epoch
+        self.priority = priority
+        self.pid = pid
+        self.identifier = identifier
+        self.message = message
+
+    def format(self):
+        """Format record like `journalctl -o short`"""
+        return "{} {}[{}]: {}".format(time.strftime("%b %d %H:%M:%S", time.localtime(self.timestamp / 1e6)),
+                                      self.identifier, self.pid, self.message)
+
+
+class JournalParser(object):
+    """Streaming parser of `journalctl -o json` output"""
+
+    def __init__(self):
+        self.cursor = None
+        self._partial = b""
+
+    def reset(self):
+        self._partial = b""
+
+    def feed(self, data):
+        """Parse chunk of output, return list of LogRecords from complete lines in it"""
+        data, sep, self._partial = (self._partial + data).rpartition(b"\n")
+        if not sep:
+            return []
+        records = []
+        for line in data.split(b"\n"):
+            record = self.parse_line(line)
+            if record is not None:
+                records.append(record)
+        return records
+
+    def parse_line(self, line):
+        """Parse one JSON line to LogRecord (and remember its cursor), return None on invalid line"""
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict):
+            return None
+        self.cursor = entry.get("__CURSOR", self.cursor)
+        return LogRecord(_int_field(entry, "__REALTIME_TIMESTAMP", 0),
+                         _int_field(entry, "PRIORITY", PRIORITY_INFO),
+                         _int_field(entry, "_PID", 0),
+                         _str_field(entry, "SYSLOG_IDENTIFIER") or "openvpn",
+                         _str_field(entry, "MESSAGE").replace("\n", " "))
+
+
+def _int_field(entry, name, default):
+    try:
+        return int(entry[name])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+def _str_field(entry, name):
+    """Get string field from journal entry (binary fields are exported as arrays of bytes)"""
+    value = entry.get(name)
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        try:
+            return bytes(value).decode(errors="replace")
+        except (TypeError, ValueError):
+            return ""
+    return str(value)
+
+
+class LogIndex(object):
+    """Per-priority and connection attempt index of log records (with timestamps for attempt labels)
+
+    Records are referenced by their position in LogBuffer, so the index has
+    to be filled in the same order as the buffer.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def clear(self):
+        self.timestamps = array("q")
+        self.priorities = array("b")
+        self.by_priority = [array("L") for priority in range(PRIORITY_DEBUG + 1)]
+        self.attempts = array("L")  # indexes of records starting connection attempts
+        self._last_pid = None  # PID of last OpenVPN record
+
+    def add(self, record):
+        """Add record to index (as next record after already indexed ones)"""
+        index = len(self.timestamps)
+        priority = min(max(record.priority, 0), PRIORITY_DEBUG)
+        self.timestamps.append(record.timestamp)
+        self.priorities.append(priority)
+        self.by_priority[priority].append(index)
+        # New OpenVPN process or restart in running process starts new attempt
+        # (systemd "Starting/Stopped ..." messages of the unit don't)
+        if record.pid and record.identifier == OPENVPN_IDENTIFIER and \
+                (record.pid != self._last_pid or record.message.startswith(RESTART_PREFIXES)):
+            self.attempts.append(index)
+            self._last_pid = record.pid
+
+    def priority(self, index):
+        """Return priority of record with given index"""
+        return self.priorities[index]
+
+    def filter(self, max_priority):
+        """Return sorted indexes of records with priority `max_priority` or more severe"""
+        if max_priority >= PRIORITY_DEBUG:
+            return array("L", range(len(self)))
+        return array("L", heapq.merge(*self.by_priority[:max_priority + 1]))
@@ -1,14 +1,181 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8
 
-import socket
+import bisect
+import threading
+import time
+import uuid
+from array import array
 
-from PySide2 import QtCore, QtWidgets
+from PySide2 import QtCore, QtGui, QtWidgets
 
-from qopenvpn import stun
+from qopenvpn import extip
+from qopenvpn.logstore import (LogBuffer, LogIndex, LogRecord, JournalParser, PRIORITY_DEBUG, PRIORITY_ERR,
+                               PRIORITY_NOTICE, PRIORITY_WARNING)
 from qopenvpn.ui_qopenvpnlogviewer import Ui_QOpenVPNLogViewer
 
 
+def current_boot_id():
+    """Return ID of current boot (as used in journal cursors) or empty string"""
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return uuid.UUID(f.read().strip()).hex
+    except (OSError, ValueError):
+        return ""
+
+
+def cursor_boot_id(cursor):
+    """Return boot ID from journal cursor"""
+    for field in cursor.split(";"):
+        if field.startswith("b="):
+            return field[2:]
+    return ""
+
+
+class LogModel(QtCore.QAbstractListModel):
+    """Virtualized list model of journal records stored in LogBuffer and indexed by LogIndex
+
+    Without filter, model shows window of lines kept in memory by LogBuffer, older lines
+    can be prepended to it by fetch_older() (and they are dropped again when new lines arrive).
+    With priority filter, model shows all matching records found by LogIndex.
+    """
+    def __init__(self, max_lines=10000, parent=None):
+        super(LogModel, self).__init__(parent)
+        self.buffer = LogBuffer(max_lines)
+        self.index = LogIndex()
+        self.max_priority = PRIORITY_DEBUG
+        self._head = 0
+        self._rows = None  # indexes of records matching filter
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows) if self._rows is not None else len(self.buffer) - self._head
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return self.buffer.line(self.record_index(index.row()))
+        if role == QtCore.Qt.ForegroundRole:
+            priority = self.index.priority(self.record_index(index.row()))
+            if priority <= PRIORITY_ERR:
+                return QtGui.QBrush(QtCore.Qt.red)
+            if priority == PRIORITY_WARNING:
+                return QtGui.QBrush(QtCore.Qt.darkYellow)
+        return None
+
+    def record_index(self, row):
+        """Return index of record (in LogBuffer and LogIndex) shown in given row"""
+        return self._rows[row] if self._rows is not None else self._head + row
+
+    def clear(self):
+        self.beginResetModel()
+        self.buffer.clear()
+        self.index.clear()
+        self._head = 0
+        self._rows = None if self.max_priority >= PRIORITY_DEBUG else array("L")
+        self.endResetModel()
+
+    def append_records(self, records):
+        """Append LogRecords"""
+        if not records:
+            return
+        first_record = len(self.buffer)
+        for record in records:
+            self.index.add(record)
+
+        if self._rows is not None:
+            matching = [i for i, record in enumerate(records, first_record) if record.priority <= self.max_priority]
+            if matching:
+                first = len(self._rows)
+                self.beginInsertRows(QtCore.QModelIndex(), first, first + len(matching) - 1)
+                self.buffer.append([record.format() for record in records])
+                self._rows.extend(matching)
+                self.endInsertRows()
+            else:
+                self.buffer.append([record.format() for record in records])
+            return
+
+        first = self.rowCount()
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(records) - 1)
+        self.buffer.append([record.format() for record in records])
+        self.endInsertRows()
+
+        # Keep number of rows bounded by dropping rows evicted from memory
+        dropped = self.buffer.first_buffered - self._head
+        if dropped > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, dropped - 1)
+            self._head += dropped
+            self.endRemoveRows()
+
+    def set_filter(self, max_priority):
+        """Show only records with priority `max_priority` or more severe"""
+        self.beginResetModel()
+        self.max_priority = max_priority
+        if max_priority >= PRIORITY_DEBUG:
+            self._rows = None
+            self._head = self.buffer.first_buffered
+        else:
+            self._rows = self.index.filter(max_priority)
+        self.endResetModel()
+
+    def can_fetch_older(self):
+        return self._rows is None and self._head > 0
+
+    def fetch_older(self, count=None):
+        """Prepend older lines (read from disk), return number of prepended lines"""
+        if self._rows is not None:
+            return 0
+        count = min(self._head, self.buffer.chunk_size if count is None else count)
+        if count > 0:
+            self.beginInsertRows(QtCore.QModelIndex(), 0, count - 1)
+            self._head -= count
+            self.endInsertRows()
+        return count
+
+    def row_for_record(self, record_index):
+        """Return row of first shown record at or after given record (prepends older lines if needed)"""
+        if self._rows is not None:
+            return bisect.bisect_left(self._rows, record_index)
+        if record_index < self._head:
+            self.fetch_older(self._head - record_index)
+        return record_index - self._head
+
+
+class IPLookupSignals(QtCore.QObject):
+    """Signals of IPLookupTask (QRunnable is not QObject and can't have its own signals)"""
+    finished = QtCore.Signal(int, str, str)  # lookup id, ip, hostname
+
+
+class IPLookupTask(QtCore.QRunnable):
+    """Get external IP address and hostname in worker thread"""
+    def __init__(self, lookup_id, signals):
+        super(IPLookupTask, self).__init__()
+        self.lookup_id = lookup_id
+        self.signals = signals
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Don't report result of this lookup (running lookup can't be interrupted)"""
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        if self.is_cancelled():
+            return
+        ip, hostname = QOpenVPNLogViewer.getip(self.is_cancelled)
+        if self.is_cancelled():
+            return
+        try:
+            self.signals.finished.emit(self.lookup_id, ip, hostname)
+        except RuntimeError:
+            # Log viewer was already destroyed
+            pass
+
+
 class QOpenVPNLogViewer(QtWidgets.QDialog, Ui_QOpenVPNLogViewer):
     def __init__(self, parent=None, flags=QtCore.Qt.WindowCloseButtonHint):
         super(QOpenVPNLogViewer, self).__init__(parent, flags)
@@ -17,61 +184,215 @@ class QOpenVPNLogViewer(QtWidgets.QDialog, Ui_QOpenVPNLogViewer):
         self.refreshButton.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_BrowserReload))
         self.refreshButton.clicked.connect(self.refresh)
 
+        self.log_model = LogModel(QtCore.QSettings().value("log_max_lines", 10000, type=int), self)
+        self.logViewerList.setModel(self.log_model)
+        self.logViewerList.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        self.logViewerList.verticalScrollBar().valueChanged.connect(self.on_log_scrolled)
+        copy_action = QtWidgets.QAction(self.logViewerList)
+        copy_action.setShortcut(QtGui.QKeySequence.Copy)
+        copy_action.triggered.connect(self.copy_selected_lines)
+        self.logViewerList.addAction(copy_action)
+
+        self.priorityComboBox.addItem(self.tr("All messages"), PRIORITY_DEBUG)
+        self.priorityComboBox.addItem(self.tr("Notices, warnings and errors"), PRIORITY_NOTICE)
+        self.priorityComboBox.addItem(self.tr("Warnings and errors"), PRIORITY_WARNING)
+        self.priorityComboBox.addItem(self.tr("Errors"), PRIORITY_ERR)
+        self.priorityComboBox.currentIndexChanged.connect(self.on_priority_changed)
+        self.attemptComboBox.activated.connect(self.on_attempt_activated)
+
+        self.proc = None
+        self.journal_parser = JournalParser()
+        self.journal_unit = None
+        self.followCheckBox.setChecked(QtCore.QSettings().value("follow_log", False, type=bool))
+        self.followCheckBox.toggled.connect(self.set_follow)
+
+        self._ip_lookup_id = 0
+        self._ip_lookup_task = None
+        self._ip_lookup_signals = IPLookupSignals(self)
+        self._ip_lookup_signals.finished.connect(self.on_ip_lookup_finished)
+
         # force dialog to open centered on currently active screen
         self.setGeometry(QtWidgets.QStyle.alignedRect(QtCore.Qt.LeftToRight, QtCore.Qt.AlignCenter, self.size(),
                                                       QtWidgets.qApp.desktop().availableGeometry()))
         self.refresh()
 
-    def journalctl(self, disable_sudo=False):
-        """Run journalctl command and get OpenVPN logs"""
+    @staticmethod
+    def unit_name():
+        """Return name of systemd unit of selected VPN"""
+        settings = QtCore.QSettings()
+        return "{}@{}".format(settings.value("service_name"), settings.value("vpn_name"))
+
+    def journalctl_cmdline(self, disable_sudo=False):
+        """Return journalctl command line for OpenVPN logs of current boot"""
+        settings = QtCore.QSettings()
+        cmdline = []
+        if not disable_sudo and settings.value("use_sudo", type=bool):
+            cmdline.append(settings.value("sudo_command") or "sudo")
+        cmdline.extend(["journalctl", "-b", "-u", self.unit_name(), "--output=json"])
+        return cmdline
+
+    def has_valid_cursor(self):
+        """Can logs be loaded incrementally from last journal cursor?
+        (not if VPN unit was changed or system was rebooted meanwhile)"""
+        cursor = self.journal_parser.cursor
+        return bool(cursor) and self.journal_unit == self.unit_name() and cursor_boot_id(cursor) == current_boot_id()
+
+    def journalctl(self, disable_sudo=False, follow=False):
+        """Run journalctl command and stream OpenVPN logs into log viewer
+        (only new entries after last cursor if possible, continuously if `follow` is True)"""
+        self.stop_journalctl()
+        cmdline = self.journalctl_cmdline(disable_sudo)
+        if self.has_valid_cursor():
+            cmdline.append("--after-cursor={}".format(self.journal_parser.cursor))
+        else:
+            self.clear_journal()
+        if follow:
+            cmdline.extend(["--follow", "--lines=all"])
+        self.journal_unit = self.unit_name()
+        self.journal_parser.reset()
+
         self.proc = QtCore.QProcess(self)
         self.proc.setProcessEnvironment(QtCore.QProcessEnvironment.systemEnvironment())
-        self.proc.setProcessChannelMode(self.proc.MergedChannels)
+        self.proc.readyReadStandardOutput.connect(self.on_journal_ready_read)
         self.proc.finished.connect(self.update_journal)
-        if self.proc.state() == self.proc.NotRunning:
-            settings = QtCore.QSettings()
-            cmdline = []
-            if not disable_sudo and settings.value("use_sudo", type=bool):
-                cmdline.append(settings.value("sudo_command") or "sudo")
-            cmdline.extend([
-                "journalctl", "-b", "-u",
-                "{}@{}".format(settings.value("service_name"), settings.value("vpn_name"))
-            ])
-            self.proc.start(' '.join(cmdline))
-
-    # noinspection PyBroadException
-    @staticmethod
-    def getip():
-        """Get external IP address and hostname"""
-        try:
-            stunclient = stun.StunClient()
-            ip, port = stunclient.get_ip()
-        except:
-            ip = ""
-        try:
-            hostname = socket.gethostbyaddr(ip)[0]
-        except:
-            hostname = ""
-        return ip, hostname
+        self.proc.start(cmdline[0], cmdline[1:])
+
+    def stop_journalctl(self):
+        """Terminate running journalctl process"""
+        if self.proc is not None:
+            self.proc.readyReadStandardOutput.disconnect(self.on_journal_ready_read)
+            self.proc.finished.disconnect(self.update_journal)
+            self.proc.kill()
+            self.proc.waitForFinished(1000)
+            self.proc = None
+
+    def is_following(self):
+        return self.proc is not None and self.followCheckBox.isChecked()
+
+    def clear_journal(self):
+        """Drop all loaded records"""
+        self.log_model.clear()
+        self.journal_parser = JournalParser()
+        self.attemptComboBox.clear()
+
+    @QtCore.Slot(bool)
+    def set_follow(self, enabled):
+        """Switch between follow mode and one-shot refresh"""
+        QtCore.QSettings().setValue("follow_log", enabled)
+        if enabled:
+            self.journalctl(True, follow=True)
+        else:
+            self.stop_journalctl()
 
     @QtCore.Slot()
-    def refresh(self):
-        """Refresh logs"""
-        self.journalctl(True)
-        QtCore.QTimer.singleShot(0, self.refresh_timeout)
+    def on_journal_ready_read(self):
+        """Parse new chunk of journalctl output and append its records"""
+        self.append_records(self.journal_parser.feed(self.proc.readAllStandardOutput().data()))
 
     @QtCore.Slot(int, QtCore.QProcess.ExitStatus)
     def update_journal(self, exitcode, exitstatus):
-        if exitcode == 0 and exitstatus == QtCore.QProcess.NormalExit:
-            cmdout = self.proc.readAllStandardOutput().data().decode().strip()
-        else:
-            cmdout = self.proc.errorString()
-        self.logViewerEdit.setPlainText(cmdout)
-        self.logViewerEdit.verticalScrollBar().setValue(self.logViewerEdit.verticalScrollBar().maximum())
+        self.on_journal_ready_read()
+        if exitcode != 0 or exitstatus != QtCore.QProcess.NormalExit:
+            message = self.proc.readAllStandardError().data().decode(errors="replace").strip()
+            self.append_records([LogRecord(int(time.time() * 1e6), PRIORITY_ERR, 0, "journalctl",
+                                           message or self.proc.errorString())])
+        self.proc = None
+
+    def append_records(self, records):
+        """Append records to log viewer, keep it scrolled to bottom only if it already was"""
+        if not records:
+            return
+        scrollbar = self.logViewerList.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        attempts = len(self.log_model.index.attempts)
+        self.log_model.append_records(records)
+        self.add_attempts(attempts)
+        if at_bottom:
+            self.logViewerList.scrollToBottom()
+
+    def add_attempts(self, first):
+        """Add connection attempts found by index (starting from `first`) to attempt combo box"""
+        index = self.log_model.index
+        for record_index in index.attempts[first:]:
+            label = time.strftime("%b %d %H:%M:%S", time.localtime(index.timestamps[record_index] / 1e6))
+            self.attemptComboBox.addItem(label, record_index)
+
+    @QtCore.Slot(int)
+    def on_priority_changed(self, i):
+        self.log_model.set_filter(self.priorityComboBox.itemData(i))
+        self.logViewerList.scrollToBottom()
+
+    @QtCore.Slot(int)
+    def on_attempt_activated(self, i):
+        """Scroll log to the beginning of selected connection attempt"""
+        row = self.log_model.row_for_record(self.attemptComboBox.itemData(i))
+        self.logViewerList.scrollTo(self.log_model.index(row), QtWidgets.QAbstractItemView.PositionAtTop)
+
+    @QtCore.Slot(int)
+    def on_log_scrolled(self, value):
+        """Load older lines when user scrolls to the top of log"""
+        if value == self.logViewerList.verticalScrollBar().minimum() and self.log_model.can_fetch_older():
+            count = self.log_model.fetch_older()
+            self.logViewerList.scrollTo(self.log_model.index(count), QtWidgets.QAbstractItemView.PositionAtTop)
+
+    @QtCore.Slot()
+    def copy_selected_lines(self):
+        """Copy selected log lines to clipboard"""
+        rows = sorted(index.row() for index in self.logViewerList.selectionModel().selectedRows())
+        lines = [self.log_model.data(self.log_model.index(row)) for row in rows]
+        QtWidgets.QApplication.clipboard().setText("\n".join(lines))
+
+    @staticmethod
+    def getip(is_cancelled=None):
+        """Get external IP address and hostname (blocking, don't call it from GUI thread)"""
+        return extip.getip(is_cancelled)
+
+    @QtCore.Slot()
+    def refresh(self):
+        """Refresh logs (in follow mode they are refreshed continuously, so only IP address is updated)"""
+        if not self.is_following():
+            self.journalctl(True, follow=self.followCheckBox.isChecked())
+        QtCore.QTimer.singleShot(0, self.refresh_timeout)
 
     def refresh_timeout(self):
-        """Move scrollbar to bottom and refresh IP address
+        """Refresh IP address
         (must be called by single shot timer or else scrollbar sometimes doesn't move)"""
-        ip = self.getip()
-        self.ipAddressEdit.setText("{} ({})".format(ip[0], ip[1]) if ip[1] else ip[0])
+        self.lookup_ip()
+
+    def lookup_ip(self):
+        """Start looking up external IP address in background (cancels older lookup)"""
+        self.cancel_ip_lookup()
+        self._ip_lookup_id += 1
+
+        cached = extip.cache.get()
+        if cached is not None:
+            self.show_ip(*cached)
+            return
+
+        self._ip_lookup_task = IPLookupTask(self._ip_lookup_id, self._ip_lookup_signals)
+        self.ipAddressEdit.setText(self.tr("resolving\u2026"))
+        QtCore.QThreadPool.globalInstance().start(self._ip_lookup_task)
+
+    def cancel_ip_lookup(self):
+        """Cancel IP address lookup which is still queued or running"""
+        if self._ip_lookup_task is not None:
+            self._ip_lookup_task.cancel()
+            QtCore.QThreadPool.globalInstance().tryTake(self._ip_lookup_task)
+            self._ip_lookup_task = None
+
+    @QtCore.Slot(int, str, str)
+    def on_ip_lookup_finished(self, lookup_id, ip, hostname):
+        if lookup_id != self._ip_lookup_id:
+            # Result of older (cancelled) lookup
+            return
+        self._ip_lookup_task = None
+        self.show_ip(ip, hostname)
+
+    def show_ip(self, ip, hostname):
+        self.ipAddressEdit.setText("{} ({})".format(ip, hostname) if hostname else ip)
+
+    def done(self, result):
+        self.cancel_ip_lookup()
+        self.stop_journalctl()
+        super(QOpenVPNLogViewer, self).done(result)
 
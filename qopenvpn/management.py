@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Client for OpenVPN management interface.
+
+Gives real connection state of OpenVPN (systemd only knows whether the process
+is running) and byte counters. Enable the interface in OpenVPN profile, e.g.::
+
+    management /run/openvpn-client/<name>.sock unix
+    management 127.0.0.1 7505
+
+See https://openvpn.net/community-resources/management-interface/
+"""
+
+import os
+import shlex
+
+from PySide2 import QtCore, QtNetwork
+
+# Connection states reported by OpenVPN
+STATE_CONNECTING = "CONNECTING"
+STATE_WAIT = "WAIT"
+STATE_AUTH = "AUTH"
+STATE_GET_CONFIG = "GET_CONFIG"
+STATE_ASSIGN_IP = "ASSIGN_IP"
+STATE_ADD_ROUTES = "ADD_ROUTES"
+STATE_CONNECTED = "CONNECTED"
+STATE_RECONNECTING = "RECONNECTING"
+STATE_EXITING = "EXITING"
+STATE_RESOLVE = "RESOLVE"
+STATE_TCP_CONNECT = "TCP_CONNECT"
+
+
+def parse_management_option(config_path):
+    """Get management interface address from OpenVPN profile
+
+    Return ("unix", path) or ("tcp", host, port) tuple, or None if profile can't be read
+    or management interface is not enabled in it.
+    """
+    try:
+        with open(config_path) as f:
+            for line in f:
+                try:
+                    args = shlex.split(line, comments=True)
+                except ValueError:
+                    continue
+                if len(args) >= 3 and args[0] in ("management", "--management"):
+                    if args[2] == "unix":
+                        return ("unix", args[1])
+                    try:
+                        return ("tcp", args[1], int(args[2]))
+                    except ValueError:
+                        return None
+    except OSError:
+        return None
+    return None
+
+
+def parse_management_address(address):
+    """Parse management address from settings ("host:port" or path of Unix socket)"""
+    if not address:
+        return None
+    if address.startswith("/"):
+        return ("unix", address)
+    host, sep, port = address.rpartition(":")
+    try:
+        return ("tcp", host or "127.0.0.1", int(port))
+    except ValueError:
+        return None
+
+
+class ManagementParser(object):
+    """Incremental parser of management interface output
+
+    feed() returns list of (event, args) tuples, where event is one of
+    "STATE" (timestamp, state, description, local ip, remote ip), "BYTECOUNT" (rx, tx),
+    "ENTER_PASSWORD" (management interface password prompt, no args), "HOLD", "PASSWORD"
+    (credentials requested by OpenVPN, e.g. "Need 'Auth' username/password"), "INFO",
+    "SUCCESS" or "ERROR" (message).
+    """
+
+    def __init__(self):
+        self._partial = b""
+
+    def reset(self):
+        self._partial = b""
+
+    def feed(self, data):
+        """Parse chunk of data, return list of events from complete lines in it"""
+        data = self._partial + data
+        if data.startswith(b"ENTER PASSWORD:"):
+            # Password prompt is not terminated by newline
+            self._partial = data[len(b"ENTER PASSWORD:"):]
+            return [("ENTER_PASSWORD", ())] + self.feed(b"")
+        data, sep, self._partial = data.rpartition(b"\n")
+        if not sep:
+            return []
+        events = []
+        for line in data.split(b"\n"):
+            event = self.parse_line(line.decode(errors="replace").rstrip("\r"))
+            if event is not None:
+                events.append(event)
+        return events
+
+    def parse_line(self, line):
+        """Parse one line of output, return (event, args) tuple or None"""
+        if line.startswith(">"):
+            kind, sep, payload = line[1:].partition(":")
+            if kind == "STATE":
+                return self._parse_state(payload)
+            if kind == "BYTECOUNT":
+                try:
+                    rx, tx = payload.split(",")[:2]
+                    return ("BYTECOUNT", (int(rx), int(tx)))
+                except ValueError:
+                    return None
+            if kind in ("HOLD", "INFO"):
+                return (kind, (payload,))
+            if kind == "PASSWORD":
+                return ("PASSWORD", (payload,))
+            return None
+        if line.startswith("SUCCESS:"):
+            return ("SUCCESS", (line[8:].strip(),))
+        if line.startswith("ERROR:"):
+            return ("ERROR", (line[6:].strip(),))
+        # Line of response to `state` command has the same format as >STATE notification
+        return self._parse_state(line)
+
+    @staticmethod
+    def _parse_state(payload):
+        fields = payload.split(",")
+        if len(fields) < 2 or not fields[0].isdigit() or not fields[1].isupper():
+            return None
+        fields.extend([""] * (5 - len(fields)))
+        return ("STATE", (int(fields[0]), fields[1], fields[2], fields[3], fields[4]))
+
+
+class ManagementClient(QtCore.QObject):
+    """Non-blocking client for OpenVPN management interface (reconnects automatically)"""
+    stateChanged = QtCore.Signal(str, str)  # state, description
+    bytecountChanged = QtCore.Signal('qlonglong', 'qlonglong')  # bytes received, bytes sent (64-bit)
+    connectedChanged = QtCore.Signal(bool)  # connection to management interface
+    messageReceived = QtCore.Signal(str, str)  # event, message (INFO, ERROR, ...)
+
+    def __init__(self, address, password="", bytecount_interval=1, reconnect_interval=5, parent=None):
+        super(ManagementClient, self).__init__(parent)
+        self.address = address
+        self.password = password
+        self.bytecount_interval = bytecount_interval
+        self.state = ""
+        self.description = ""
+        self.bytes_in = self.bytes_out = 0
+        self._parser = ManagementParser()
+        self._password_sent = False
+        self._initialized = False
+
+        self._closed = False
+        if address[0] == "unix":
+            self.socket = QtNetwork.QLocalSocket(self)
+        else:
+            self.socket = QtNetwork.QTcpSocket(self)
+        self.socket.stateChanged.connect(self.on_socket_state_changed)
+        self.socket.connected.connect(self.on_connected)
+        self.socket.disconnected.connect(self.on_disconnected)
+        self.socket.readyRead.connect(self.on_ready_read)
+
+        self.reconnect_timer = QtCore.QTimer(self)
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.setInterval(reconnect_interval * 1000)
+        self.reconnect_timer.timeout.connect(self.connect_to_server)
+
+    def is_connected(self):
+        if isinstance(self.socket, QtNetwork.QLocalSocket):
+            return self.socket.state() == QtNetwork.QLocalSocket.ConnectedState
+        return self.socket.state() == QtNetwork.QAbstractSocket.ConnectedState
+
+    @QtCore.Slot()
+    def connect_to_server(self):
+        """Connect to management interface (asynchronously)"""
+        if self.is_connected():
+            return
+        self._closed = False
+        self._password_sent = False
+        self._initialized = False
+        self._parser.reset()
+        if self.address[0] == "unix":
+            self.socket.connectToServer(self.address[1])
+        else:
+            self.socket.connectToHost(self.address[1], self.address[2])
+
+    def close(self):
+        """Disconnect and stop reconnecting"""
+        self._closed = True
+        self.reconnect_timer.stop()
+        self.socket.abort()
+
+    def send_command(self, command):
+        self.socket.write(command.encode() + b"\n")
+
+    @QtCore.Slot()
+    def on_connected(self):
+        self.connectedChanged.emit(True)
+
+    def send_initial_commands(self):
+        """Enable state and byte count notifications (sent after greeting, OpenVPN asking
+        for password would take the first command as password)"""
+        self._initialized = True
+        self.send_command("state on")
+        self.send_command("state")
+        if self.bytecount_interval > 0:
+            self.send_command("bytecount {}".format(self.bytecount_interval))
+
+    @QtCore.Slot()
+    def on_disconnected(self):
+        self.connectedChanged.emit(False)
+
+    def on_socket_state_changed(self, state):
+        """Try to connect again later if connection failed or was closed by OpenVPN"""
+        # QLocalSocket.UnconnectedState == QAbstractSocket.UnconnectedState == 0
+        if int(state) == 0 and not self._closed:
+            self.reconnect_timer.start()
+
+    @QtCore.Slot()
+    def on_ready_read(self):
+        for event, args in self._parser.feed(self.socket.readAll().data()):
+            if event == "STATE":
+                timestamp, state, description = args[:3]
+                if (state, description) != (self.state, self.description):
+                    self.state, self.description = state, description
+                    self.stateChanged.emit(state, description)
+            elif event == "BYTECOUNT":
+                self.bytes_in, self.bytes_out = args
+                self.bytecountChanged.emit(*args)
+            elif event == "ENTER_PASSWORD":
+                # Password of management interface itself (sent only once, wrong one is not retried)
+                if not self._password_sent:
+                    self._password_sent = True
+                    self.send_command(self.password)
+            elif event == "HOLD":
+                # Profile uses management-hold, let OpenVPN continue
+                self.send_command("hold release")
+            else:
+                if event == "INFO" and not self._initialized:
+                    # Greeting is sent on connect (or after correct password), interface is ready
+                    self.send_initial_commands()
+                self.messageReceived.emit(event, args[0] if args else "")
+
+
+def management_address(settings, vpn_name):
+    """Get management interface address of VPN profile from settings
+    (management_address) or from OpenVPN profile itself"""
+    address = parse_management_address(settings.value("management_address", ""))
+    if address is None and settings.value("config_location"):
+        config_dir = os.path.dirname(settings.value("config_location"))
+        address = parse_management_option(os.path.join(config_dir, "{}.conf".format(vpn_name)))
+    return address
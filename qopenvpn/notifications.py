@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Coalescing of desktop notifications about VPN connections.
+
+Every VPN profile has one persistent notification which is updated in place
+(using replaces_id) instead of showing new bubble for every state change.
+Bursts of changes are debounced and when the tunnel flaps, the individual
+changes are collapsed to one summary (e.g. "reconnected 5 times in 2 min").
+Reconnects are counted both from notified "connected" events (management
+interface) and from systemd unit state changes (unit restarted by systemd or
+by the user), so flapping is noticed even without management interface.
+"""
+
+import collections
+import math
+import time
+
+from PySide2 import QtCore
+
+
+def notify_backend(app_name):
+    """Return initialized notify module (Qt event loop backend with its own session bus
+    connection, dbus-python if it can't connect)"""
+    from qopenvpn import notify_qt
+    try:
+        notify_qt.init(app_name)
+        return notify_qt
+    except notify_qt.UninittedError:
+        pass
+    from qopenvpn import notify
+    if not notify.is_initted():
+        # Qt uses GLib event dispatcher on Linux, so replies are delivered by Qt event loop
+        notify.init(app_name, mainloop='glib')
+    return notify
+
+
+class ProfileNotification(object):
+    """Notification state of one VPN profile"""
+    __slots__ = ("notification", "pending", "events", "last_shown", "timer", "unit_state")
+
+    def __init__(self):
+        self.notification = None
+        self.pending = None  # (event, summary, message, icon, urgency)
+        self.events = collections.deque()  # (time, event) in flap window
+        self.last_shown = None
+        self.timer = None
+        self.unit_state = None  # last ActiveState of systemd unit
+
+
+class NotificationManager(QtCore.QObject):
+    """Show per-profile desktop notifications with debouncing and flap suppression"""
+
+    def __init__(self, app_name, debounce=2, flap_window=120, flap_threshold=3, parent=None):
+        """Show at most one notification per `debounce` seconds for every profile,
+        summarize changes if profile connected `flap_threshold` times in `flap_window` seconds"""
+        super(NotificationManager, self).__init__(parent)
+        self.app_name = app_name
+        self.debounce = debounce
+        self.flap_window = flap_window
+        self.flap_threshold = flap_threshold
+        self.profiles = {}
+        self._notify = None  # notify backend module
+
+    def notify(self, profile, event, summary, message, icon="", urgency=1):
+        """Notify about `event` ("connected", "disconnected", ...) of VPN profile"""
+        state = self._state(profile)
+        now = time.monotonic()
+        self._record(state, event, now)
+        state.pending = (event, summary, message, icon, urgency)
+
+        # Show first notification of burst immediately, the rest after debounce interval
+        if state.timer.isActive():
+            return
+        if state.last_shown is None or now - state.last_shown >= self.debounce:
+            self.flush(profile)
+        else:
+            state.timer.start(int((self.debounce - (now - state.last_shown)) * 1000))
+
+    def unit_state_changed(self, profile, active_state):
+        """Count restarts of systemd unit of VPN profile as reconnects (without notifying)"""
+        state = self._state(profile)
+        if active_state == state.unit_state:
+            return
+        state.unit_state = active_state
+        if active_state in ("activating", "inactive", "failed"):
+            self._record(state, "unit_{}".format(active_state), time.monotonic())
+
+    def reconnects(self, profile):
+        """Return number of reconnects of VPN profile in flap window"""
+        state = self.profiles.get(profile)
+        if state is None:
+            return 0
+        # Management interface and unit state usually both report the same reconnect
+        connected = sum(1 for timestamp, e in state.events if e == "connected")
+        activated = sum(1 for timestamp, e in state.events if e == "unit_activating")
+        return max(connected, activated)
+
+    def _state(self, profile):
+        state = self.profiles.get(profile)
+        if state is None:
+            state = self.profiles[profile] = ProfileNotification()
+            state.timer = QtCore.QTimer(self)
+            state.timer.setSingleShot(True)
+            state.timer.timeout.connect(lambda profile=profile: self.flush(profile))
+        return state
+
+    def _record(self, state, event, now):
+        """Add event to flap window (and drop events older than it)"""
+        state.events.append((now, event))
+        while state.events and state.events[0][0] < now - self.flap_window:
+            state.events.popleft()
+
+    @QtCore.Slot()
+    def flush(self, profile):
+        """Show pending notification of VPN profile"""
+        state = self.profiles.get(profile)
+        if state is None or state.pending is None:
+            return
+        event, summary, message, icon, urgency = state.pending
+        state.pending = None
+        state.last_shown = time.monotonic()
+
+        reconnects = self.reconnects(profile)
+        if self.flap_threshold and reconnects >= self.flap_threshold:
+            minutes = max(1, int(math.ceil((state.last_shown - state.events[0][0]) / 60)))
+            message = "{}\nReconnected {} times in {} min".format(message, reconnects, minutes)
+
+        self._show(state, summary, message, icon, urgency)
+
+    def close(self, profile):
+        """Close notification of VPN profile"""
+        state = self.profiles.pop(profile, None)
+        if state is None:
+            return
+        state.timer.stop()
+        if state.notification is not None:
+            # noinspection PyBroadException
+            try:
+                state.notification.close_async()
+            except Exception:
+                pass
+
+    # noinspection PyBroadException
+    def _show(self, state, summary, message, icon, urgency):
+        """Show notification (update existing one of the profile)"""
+        # Initialize D-Bus notification daemon on first notification
+        try:
+            if self._notify is None or not self._notify.is_initted():
+                # Backend has to be initialized again after its session bus connection was lost
+                self._notify = notify_backend(self.app_name)
+                for profile_state in self.profiles.values():
+                    profile_state.notification = None
+            notify = self._notify
+            if state.notification is None:
+                state.notification = notify.Notification(summary, message, icon)
+            else:
+                state.notification.update(summary, message, icon)
+            state.notification.set_urgency(urgency)
+            # Never wait for notification daemon in GUI thread
+            state.notification.show_async()
+        except Exception:
+            # Notifications are not essential, ignore missing or broken notification daemon
+            pass
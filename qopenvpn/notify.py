@@ -33,6 +33,15 @@ There are a few differences from pynotify you should be aware of:
 
 Several pynotify functions, especially getters and setters, are only supported
 for compatibility. You are encouraged to use more direct, Pythonic alternatives.
+
+Asynchronous calls
+------------------
+
+When D-Bus is integrated with a mainloop, ``Notification.show_async()``,
+``Notification.close_async()``, ``get_server_caps_async()`` and
+``get_server_info_async()`` never block on the notifications server, results are
+delivered to callbacks from the mainloop. Server capabilities and information are
+cached until the notifications server is restarted (its name owner changes).
 """
 
 import dbus
@@ -52,6 +61,14 @@ initted = False
 appname = ""
 _have_mainloop = False
 
+# Timeout of asynchronous calls (in seconds)
+ASYNC_TIMEOUT = 5
+
+# Cached results of GetCapabilities and GetServerInformation
+_server_caps = None
+_server_info = None
+_name_owner_watch = None
+
 
 class UninittedError(RuntimeError):
     pass
@@ -82,7 +99,7 @@ def init(app_name, mainloop=None):
     If you only want to display notifications, without receiving information
     back from them, you can safely omit mainloop.
     """
-    global appname, initted, dbus_iface, _have_mainloop
+    global appname, initted, dbus_iface, _have_mainloop, _name_owner_watch
 
     if mainloop == 'glib':
         from dbus.mainloop.glib import DBusGMainLoop
@@ -95,18 +112,25 @@ def init(app_name, mainloop=None):
         mainloop = DBusQtMainLoop(set_as_default=True)
 
     bus = dbus.SessionBus(mainloop=mainloop)
+    have_mainloop = bool(mainloop or dbus.get_default_main_loop())
 
+    # With mainloop, don't block on activation and introspection of the server
+    # (calls are queued until its name owner is known)
     dbus_obj = bus.get_object('org.freedesktop.Notifications',
-                              '/org/freedesktop/Notifications')
+                              '/org/freedesktop/Notifications',
+                              introspect=not have_mainloop,
+                              follow_name_owner_changes=have_mainloop)
     dbus_iface = dbus.Interface(dbus_obj,
                                 dbus_interface='org.freedesktop.Notifications')
     appname = app_name
     initted = True
 
-    if mainloop or dbus.get_default_main_loop():
+    if have_mainloop:
         _have_mainloop = True
         dbus_iface.connect_to_signal('ActionInvoked', _action_callback)
         dbus_iface.connect_to_signal('NotificationClosed', _closed_callback)
+        _name_owner_watch = bus.watch_name_owner('org.freedesktop.Notifications',
+                                                 _name_owner_changed)
 
     return True
 
@@ -125,24 +149,83 @@ def get_app_name():
 
 def uninit():
     """Undo what init() does."""
-    global initted, dbus_iface, _have_mainloop
+    global initted, dbus_iface, _have_mainloop, _name_owner_watch
     initted = False
     _have_mainloop = False
     dbus_iface = UninittedDbusObj()
+    if _name_owner_watch is not None:
+        _name_owner_watch.cancel()
+        _name_owner_watch = None
+    _clear_server_cache()
+
+
+def no_op(*args):
+    """No-op function for callbacks.
+    """
+    pass
 
 
 # Retrieve basic server information --------------------------------------------
 
 def get_server_caps():
-    """Get a list of server capabilities.
+    """Get a list of server capabilities (cached).
     """
-    return [str(x) for x in dbus_iface.GetCapabilities()]
+    global _server_caps
+    if _server_caps is None:
+        _server_caps = _make_caps(dbus_iface.GetCapabilities())
+    return list(_server_caps)
 
 
 def get_server_info():
-    """Get basic information about the server.
+    """Get basic information about the server (cached).
+    """
+    global _server_info
+    if _server_info is None:
+        _server_info = _make_info(dbus_iface.GetServerInformation())
+    return dict(_server_info)
+
+
+def get_server_caps_async(callback, error_callback=no_op):
+    """Get a list of server capabilities without blocking, pass it to
+    callback (immediately if it is cached).
     """
-    res = dbus_iface.GetServerInformation()
+    if _server_caps is not None:
+        callback(list(_server_caps))
+        return
+
+    def reply_handler(caps):
+        global _server_caps
+        _server_caps = _make_caps(caps)
+        callback(list(_server_caps))
+
+    dbus_iface.GetCapabilities(reply_handler=reply_handler,
+                               error_handler=error_callback,
+                               timeout=ASYNC_TIMEOUT)
+
+
+def get_server_info_async(callback, error_callback=no_op):
+    """Get basic information about the server without blocking, pass it to
+    callback (immediately if it is cached).
+    """
+    if _server_info is not None:
+        callback(dict(_server_info))
+        return
+
+    def reply_handler(*res):
+        global _server_info
+        _server_info = _make_info(res)
+        callback(dict(_server_info))
+
+    dbus_iface.GetServerInformation(reply_handler=reply_handler,
+                                    error_handler=error_callback,
+                                    timeout=ASYNC_TIMEOUT)
+
+
+def _make_caps(caps):
+    return [str(x) for x in caps]
+
+
+def _make_info(res):
     return {'name': str(res[0]),
             'vendor': str(res[1]),
             'version': str(res[2]),
@@ -150,6 +233,20 @@ def get_server_info():
             }
 
 
+def _clear_server_cache():
+    global _server_caps, _server_info
+    _server_caps = None
+    _server_info = None
+
+
+def _name_owner_changed(new_owner):
+    """Notifications server was started, stopped or replaced.
+    """
+    _clear_server_cache()
+    # Notifications shown by previous server are gone
+    notifications_registry.clear()
+
+
 # Action callbacks -------------------------------------------------------------
 
 notifications_registry = {}
@@ -157,21 +254,16 @@ notifications_registry = {}
 
 def _action_callback(nid, action):
     nid, action = int(nid), str(action)
-    n = notifications_registry[nid]
-    n._action_callback(action)
+    n = notifications_registry.get(nid)
+    if n is not None:
+        n._action_callback(action)
 
 
 def _closed_callback(nid, reason):
     nid, reason = int(nid), int(reason)
-    n = notifications_registry[nid]
-    n._closed_callback(n)
-    del notifications_registry[nid]
-
-
-def no_op(*args):
-    """No-op function for callbacks.
-    """
-    pass
+    n = notifications_registry.pop(nid, None)
+    if n is not None:
+        n._closed_callback(n)
 
 
 # Controlling notifications ----------------------------------------------------
@@ -181,6 +273,9 @@ class Notification(object):
     id = 0
     timeout = -1  # -1 = server default settings
     _closed_callback = no_op
+    _pending = False  # asynchronous Notify call is in progress
+    _show_queued = False  # show again when pending call returns
+    _close_queued = False  # close when pending call returns
 
     def __init__(self, summary, message='', icon=''):
         self.summary = summary
@@ -209,6 +304,43 @@ class Notification(object):
             notifications_registry[self.id] = self
         return True
 
+    def show_async(self, callback=no_op, error_callback=no_op):
+        """Ask the server to show the notification without waiting for it.
+
+        Requires D-Bus integrated with a mainloop. callback gets the Notification
+        object when the server has shown it, error_callback gets the exception.
+        If the notification is still being shown by previous call, it is shown
+        again (with current summary, body and icon) after that call returns.
+        """
+        if self._pending:
+            self._show_queued = True
+            return
+
+        def reply_handler(nid):
+            self._pending = False
+            self.id = int(nid)
+            notifications_registry[self.id] = self
+            if self._close_queued:
+                self._close_queued = self._show_queued = False
+                self.close_async()
+            elif self._show_queued:
+                self._show_queued = False
+                self.show_async(callback, error_callback)
+            else:
+                callback(self)
+
+        def error_handler(exception):
+            self._pending = self._show_queued = self._close_queued = False
+            error_callback(exception)
+
+        self._pending = True
+        dbus_iface.Notify(appname, self.id, self.icon, self.summary,
+                          self.message, self._make_actions_array(),
+                          self.hints, self.timeout,
+                          reply_handler=reply_handler,
+                          error_handler=error_handler,
+                          timeout=ASYNC_TIMEOUT)
+
     def update(self, summary, message="", icon=None):
         """Replace the summary and body of the notification, and optionally its
         icon. You should call show() again after this to display the updated
@@ -225,6 +357,17 @@ class Notification(object):
         if self.id != 0:
             dbus_iface.CloseNotification(self.id)
 
+    def close_async(self, error_callback=no_op):
+        """Ask the server to close this notification without waiting for it.
+        """
+        if self._pending:
+            self._close_queued = True
+        elif self.id != 0:
+            dbus_iface.CloseNotification(self.id,
+                                         reply_handler=no_op,
+                                         error_handler=error_callback,
+                                         timeout=ASYNC_TIMEOUT)
+
     def set_hint(self, key, value):
         """n.set_hint(key, value) <--> n.hints[key] = value
         
@@ -0,0 +1,433 @@
+"""Qt event loop backend of notify module.
+
+Provides the same API as ``qopenvpn.notify`` (``init``, ``Notification.show/update/close``,
+asynchronous variants, action and closed callbacks), but talks to the notifications
+server over session bus connection of its own (``qopenvpn.dbuswire``) read by Qt event
+loop, so neither dbus-python nor GLib main loop is needed. All calls made by ``*_async``
+functions are asynchronous and their results are delivered by Qt event loop.
+
+init() raises UninittedError if session bus is not available.
+"""
+
+from PySide2 import QtCore
+
+from qopenvpn import dbuswire
+
+# Constants
+EXPIRES_DEFAULT = -1
+EXPIRES_NEVER = 0
+
+URGENCY_LOW = 0
+URGENCY_NORMAL = 1
+URGENCY_CRITICAL = 2
+urgency_levels = [URGENCY_LOW, URGENCY_NORMAL, URGENCY_CRITICAL]
+
+SERVICE = 'org.freedesktop.Notifications'
+PATH = '/org/freedesktop/Notifications'
+INTERFACE = 'org.freedesktop.Notifications'
+NOTIFY_SIGNATURE = 'susssasa{sv}i'
+
+# Timeout of asynchronous calls (in milliseconds)
+ASYNC_TIMEOUT = 5000
+
+initted = False
+appname = ""
+_bus = None
+_receiver = None
+
+# Cached results of GetCapabilities and GetServerInformation
+_server_caps = None
+_server_info = None
+
+
+class UninittedError(RuntimeError):
+    pass
+
+
+def no_op(*args):
+    """No-op function for callbacks.
+    """
+    pass
+
+
+class _BusReceiver(QtCore.QObject):
+    """Reader of session bus connection driven by Qt event loop"""
+
+    def __init__(self, bus, parent=None):
+        super(_BusReceiver, self).__init__(parent)
+        self.bus = bus
+        self.pending = {}  # serial -> (reply_handler, error_handler) of calls in progress
+        self.notifier = QtCore.QSocketNotifier(bus.fileno(), QtCore.QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self.on_readable)
+        for rule in ("type='signal',sender='{}',path='{}',interface='{}'".format(SERVICE, PATH, INTERFACE),
+                     "type='signal',sender='{}',member='NameOwnerChanged',arg0='{}'".format(
+                         dbuswire.BUS_NAME, SERVICE)):
+            bus.call(dbuswire.BUS_NAME, dbuswire.BUS_PATH, dbuswire.BUS_INTERFACE, "AddMatch", "s", (rule,))
+        # Messages received during AddMatch calls
+        QtCore.QTimer.singleShot(0, self.on_readable)
+
+    def call(self, method, signature, args, reply_handler, error_handler):
+        serial = self.bus.send(dbuswire.method_call(SERVICE, PATH, INTERFACE, method, signature, args))
+        self.pending[serial] = (reply_handler, error_handler)
+        QtCore.QTimer.singleShot(ASYNC_TIMEOUT, lambda: self.on_timeout(serial))
+
+    def on_timeout(self, serial):
+        handlers = self.pending.pop(serial, None)
+        if handlers is not None:
+            handlers[1](RuntimeError("Timed out waiting for reply of notifications server"))
+
+    @QtCore.Slot()
+    def on_readable(self):
+        try:
+            messages = self.bus.read_messages()
+        except (OSError, ValueError):
+            # Session bus is gone, init() has to be called again
+            self.notifier.setEnabled(False)
+            pending, self.pending = self.pending, {}
+            uninit()
+            for reply_handler, error_handler in pending.values():
+                error_handler(RuntimeError("Connection to session bus was closed"))
+            return
+        for message in messages:
+            self.dispatch(message)
+
+    def dispatch(self, message):
+        if message.type in (dbuswire.METHOD_RETURN, dbuswire.ERROR):
+            handlers = self.pending.pop(message.reply_serial, None)
+            if handlers is None:
+                return
+            if message.type == dbuswire.ERROR:
+                handlers[1](dbuswire.DBusError(message.error_name, message.body[0] if message.body else ""))
+            else:
+                handlers[0](*message.body)
+        elif message.type == dbuswire.SIGNAL:
+            if message.interface == INTERFACE and message.member == 'ActionInvoked':
+                n = notifications_registry.get(int(message.body[0]))
+                if n is not None:
+                    n._action_callback(str(message.body[1]))
+            elif message.interface == INTERFACE and message.member == 'NotificationClosed':
+                n = notifications_registry.pop(int(message.body[0]), None)
+                if n is not None:
+                    n._closed_callback(n)
+            elif message.member == 'NameOwnerChanged' and message.body[:1] == (SERVICE,):
+                # Notifications server was started, stopped or replaced, notifications
+                # shown by previous server are gone
+                _clear_server_cache()
+                notifications_registry.clear()
+
+
+def init(app_name, mainloop=None):
+    """Connect to session bus (`mainloop` is ignored, Qt event loop is always used).
+    """
+    global appname, initted, _bus, _receiver
+
+    try:
+        bus = dbuswire.Connection()
+    except OSError as e:
+        raise UninittedError("Can't connect to D-Bus session bus: {}".format(e))
+    try:
+        receiver = _BusReceiver(bus)
+    except (OSError, ValueError, dbuswire.DBusError) as e:
+        bus.close()
+        raise UninittedError("Can't subscribe to notifications server signals: {}".format(e))
+    _bus = bus
+    _receiver = receiver
+    appname = app_name
+    initted = True
+    return True
+
+
+def is_initted():
+    """Has init() been called? Only exists for compatibility with pynotify.
+    """
+    return initted
+
+
+def get_app_name():
+    """Return appname. Only exists for compatibility with pynotify.
+    """
+    return appname
+
+
+def uninit():
+    """Undo what init() does."""
+    global initted, _bus, _receiver
+    initted = False
+    if _receiver is not None:
+        _receiver.notifier.setEnabled(False)
+        _receiver.deleteLater()
+        _receiver = None
+    if _bus is not None:
+        _bus.close()
+        _bus = None
+    _clear_server_cache()
+
+
+# Calls ------------------------------------------------------------------------
+
+def _check_initted():
+    if not initted:
+        raise UninittedError("You must call notify.init() before using the notification features.")
+
+
+def _call(method, signature="", *args):
+    """Call method and wait for reply, return its arguments"""
+    _check_initted()
+    try:
+        reply = _bus.call(SERVICE, PATH, INTERFACE, method, signature, args)
+    finally:
+        # Signals and replies of asynchronous calls may have been received while waiting
+        QtCore.QTimer.singleShot(0, _receiver.on_readable)
+    return reply
+
+
+def _call_async(method, signature, args, reply_handler, error_handler):
+    """Call method without waiting, pass arguments of reply to reply_handler
+    (or exception to error_handler)"""
+    _check_initted()
+    _receiver.call(method, signature, args, reply_handler, error_handler)
+
+
+# Retrieve basic server information --------------------------------------------
+
+def get_server_caps():
+    """Get a list of server capabilities (cached).
+    """
+    global _server_caps
+    if _server_caps is None:
+        _server_caps = _make_caps(_call('GetCapabilities')[0])
+    return list(_server_caps)
+
+
+def get_server_info():
+    """Get basic information about the server (cached).
+    """
+    global _server_info
+    if _server_info is None:
+        _server_info = _make_info(_call('GetServerInformation'))
+    return dict(_server_info)
+
+
+def get_server_caps_async(callback, error_callback=no_op):
+    """Get a list of server capabilities without blocking, pass it to
+    callback (immediately if it is cached).
+    """
+    if _server_caps is not None:
+        callback(list(_server_caps))
+        return
+
+    def reply_handler(caps):
+        global _server_caps
+        _server_caps = _make_caps(caps)
+        callback(list(_server_caps))
+
+    _call_async('GetCapabilities', "", (), reply_handler, error_callback)
+
+
+def get_server_info_async(callback, error_callback=no_op):
+    """Get basic information about the server without blocking, pass it to
+    callback (immediately if it is cached).
+    """
+    if _server_info is not None:
+        callback(dict(_server_info))
+        return
+
+    def reply_handler(*res):
+        global _server_info
+        _server_info = _make_info(res)
+        callback(dict(_server_info))
+
+    _call_async('GetServerInformation', "", (), reply_handler, error_callback)
+
+
+def _make_caps(caps):
+    return [str(x) for x in caps]
+
+
+def _make_info(res):
+    return {'name': str(res[0]),
+            'vendor': str(res[1]),
+            'version': str(res[2]),
+            'spec-version': str(res[3]),
+            }
+
+
+def _clear_server_cache():
+    global _server_caps, _server_info
+    _server_caps = None
+    _server_info = None
+
+
+# Controlling notifications ----------------------------------------------------
+
+notifications_registry = {}
+
+
+class Notification(object):
+    id = 0
+    timeout = -1  # -1 = server default settings
+    _closed_callback = no_op
+    _pending = False  # asynchronous Notify call is in progress
+    _show_queued = False  # show again when pending call returns
+    _close_queued = False  # close when pending call returns
+
+    def __init__(self, summary, message='', icon=''):
+        self.summary = summary
+        self.message = message
+        self.icon = icon
+        self.hints = {}
+        self.actions = {}
+        self.data = {}  # Any data the user wants to attach
+
+    def _notify_args(self):
+        return (appname, self.id, self.icon or '', self.summary, self.message or '', self._make_actions_array(),
+                self.hints, self.timeout)
+
+    def show(self):
+        """Ask the server to show the notification (and wait for it).
+        """
+        self.id = int(_call('Notify', NOTIFY_SIGNATURE, *self._notify_args())[0])
+        notifications_registry[self.id] = self
+        return True
+
+    def show_async(self, callback=no_op, error_callback=no_op):
+        """Ask the server to show the notification without waiting for it.
+
+        callback gets the Notification object when the server has shown it,
+        error_callback gets the exception. If the notification is still being
+        shown by previous call, it is shown again after that call returns.
+        """
+        if self._pending:
+            self._show_queued = True
+            return
+
+        def reply_handler(nid):
+            self._pending = False
+            self.id = int(nid)
+            notifications_registry[self.id] = self
+            if self._close_queued:
+                self._close_queued = self._show_queued = False
+                self.close_async()
+            elif self._show_queued:
+                self._show_queued = False
+                self.show_async(callback, error_callback)
+            else:
+                callback(self)
+
+        def error_handler(exception):
+            self._pending = self._show_queued = self._close_queued = False
+            error_callback(exception)
+
+        self._pending = True
+        _call_async('Notify', NOTIFY_SIGNATURE, self._notify_args(), reply_handler, error_handler)
+
+    def update(self, summary, message="", icon=None):
+        """Replace the summary and body of the notification, and optionally its
+        icon. You should call show() again after this to display the updated
+        notification.
+        """
+        self.summary = summary
+        self.message = message
+        if icon is not None:
+            self.icon = icon
+
+    def close(self):
+        """Ask the server to close this notification.
+        """
+        if self.id != 0:
+            _call('CloseNotification', 'u', self.id)
+
+    def close_async(self, error_callback=no_op):
+        """Ask the server to close this notification without waiting for it.
+        """
+        if self._pending:
+            self._close_queued = True
+        elif self.id != 0:
+            _call_async('CloseNotification', 'u', (self.id,), no_op, error_callback)
+
+    def set_hint(self, key, value):
+        """n.set_hint(key, value) <--> n.hints[key] = value
+        """
+        self.hints[key] = value
+
+    set_hint_string = set_hint_int32 = set_hint_double = set_hint
+
+    def set_hint_byte(self, key, value):
+        """Set a hint with a D-Bus byte value.
+        """
+        self.hints[key] = dbuswire.Variant('y', value)
+
+    def set_urgency(self, level):
+        """Set the urgency level to one of URGENCY_LOW, URGENCY_NORMAL or
+        URGENCY_CRITICAL.
+        """
+        if level not in urgency_levels:
+            raise ValueError("Unknown urgency level specified", level)
+        self.set_hint_byte("urgency", level)
+
+    def set_category(self, category):
+        """Set the 'category' hint for this notification.
+        """
+        self.hints['category'] = category
+
+    def set_timeout(self, timeout):
+        """Set the display duration in milliseconds, or one of the special
+        values EXPIRES_DEFAULT or EXPIRES_NEVER.
+        """
+        if not isinstance(timeout, int):
+            raise TypeError("timeout value was not int", timeout)
+        self.timeout = timeout
+
+    def get_timeout(self):
+        """Return the timeout value for this notification.
+        """
+        return self.timeout
+
+    def add_action(self, action, label, callback, user_data=None):
+        """Add an action to the notification (if the server supports it).
+
+        callback gets the Notification object, the action key and
+        (if specified) the user_data.
+        """
+        self.actions[action] = (label, callback, user_data)
+
+    def _make_actions_array(self):
+        """Make the actions array to send over DBus.
+        """
+        arr = []
+        for action, (label, callback, user_data) in self.actions.items():
+            arr.append(action)
+            arr.append(label)
+        return arr
+
+    def _action_callback(self, action):
+        """Called when the user selects an action on the notification, to
+        dispatch it to the relevant user-specified callback.
+        """
+        try:
+            label, callback, user_data = self.actions[action]
+        except KeyError:
+            return
+
+        if user_data is None:
+            callback(self, action)
+        else:
+            callback(self, action, user_data)
+
+    def connect(self, event, callback):
+        """Set the callback for the notification closing; the only valid value
+        for event is 'closed'.
+        """
+        if event != 'closed':
+            raise ValueError("'closed' is the only valid value for event", event)
+        self._closed_callback = callback
+
+    def set_data(self, key, value):
+        """n.set_data(key, value) <--> n.data[key] = value
+        """
+        self.data[key] = value
+
+    def get_data(self, key):
+        """n.get_data(key) <--> n.data[key]
+        """
+        return self.data[key]
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Installed OpenVPN version and index of available VPN profiles.
+
+Detected version is cached in settings (keyed by path and mtime of openvpn binary),
+so `openvpn --version` is run again only after OpenVPN is upgraded. List of profiles
+is kept in memory and updated by QFileSystemWatcher when configuration directory changes.
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+from PySide2 import QtCore
+
+
+def openvpn_version(settings):
+    """Return (major, minor) version of installed OpenVPN (cached in settings)"""
+    path = shutil.which("openvpn") or ""
+    try:
+        mtime = os.stat(path).st_mtime_ns if path else 0
+    except OSError:
+        mtime = 0
+    key = "{}:{}".format(path, mtime)
+
+    cached = settings.value("openvpn_version_cache", "")
+    if cached:
+        cached_key, sep, version = cached.rpartition("|")
+        if cached_key == key:
+            major, minor = version.split(".")
+            return int(major), int(minor)
+
+    major, minor = detect_openvpn_version(path or "openvpn")
+    settings.setValue("openvpn_version_cache", "{}|{}.{}".format(key, major, minor))
+    return major, minor
+
+
+def detect_openvpn_version(executable="openvpn"):
+    """Run `openvpn --version` and return (major, minor) version"""
+    try:
+        output = subprocess.run([executable, "--version"], stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT).stdout
+    except OSError:
+        print("An installation of OpenVPN could not be found on your machine!", file=sys.stderr)
+        output = b""
+
+    # Take second tuple of version output (i.e. `2.4.0`)
+    # and extract its major and minor components (i.e. 2 and 4)
+    output = output.decode(errors="replace")
+    version_string = output.split()[1] if len(output.split()) > 1 else ""
+    version_components = version_string.split(".")
+    try:
+        return int(version_components[0]), int(version_components[1])
+    except (IndexError, ValueError):
+        print("Couldn't determine the installed OpenVPN version, assuming v0.0", file=sys.stderr)
+        return 0, 0
+
+
+def configure_paths(settings):
+    """Set config_location and service_name according to installed OpenVPN version
+    (settings are written only if they change)"""
+    # Checks for the new location of OpenVPN configuration files introduced in OpenVPN 2.4
+    # See https://github.com/OpenVPN/openvpn/blob/master/Changes.rst#user-visible-changes
+    # "The configuration files are picked up from the /etc/openvpn/server/ and
+    # /etc/openvpn/client/ directories (depending on unit file)."
+    # Remove this unaesthetic version check when openvpn 2.4 is widely accepcted
+    major, minor = openvpn_version(settings)
+
+    # Matches version 2.4.x or greater
+    if (major, minor) >= (2, 4):
+        config_location, service_name = "/etc/openvpn/client/*.conf", "openvpn-client"
+    else:
+        config_location, service_name = "/etc/openvpn/*.conf", "openvpn"
+
+    if settings.value("config_location") != config_location:
+        settings.setValue("config_location", config_location)
+    if settings.value("service_name") != service_name:
+        settings.setValue("service_name", service_name)
+    return config_location
+
+
+class ProfileIndex(QtCore.QObject):
+    """In-memory list of VPN profiles updated when configuration directory changes"""
+    profilesChanged = QtCore.Signal()
+
+    def __init__(self, parent=None):
+        super(ProfileIndex, self).__init__(parent)
+        self.config_location = configure_paths(QtCore.QSettings())
+        self._profiles = []
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.rescan)
+        config_dir = os.path.dirname(self.config_location)
+        if os.path.isdir(config_dir):
+            self.watcher.addPath(config_dir)
+        self.rescan()
+
+    def profiles(self):
+        """Return sorted list of profile names"""
+        return list(self._profiles)
+
+    @QtCore.Slot()
+    def rescan(self):
+        """Re-read profiles from configuration directory"""
+        profiles = sorted(os.path.splitext(os.path.basename(f))[0] for f in glob.glob(self.config_location))
+        if profiles != self._profiles:
+            self._profiles = profiles
+            self.profilesChanged.emit()
@@ -1,18 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8
 
-import glob
-import os
-import subprocess
-import sys
-
 from PySide2 import QtCore, QtWidgets
 
+from qopenvpn import profiles
 from qopenvpn.ui_qopenvpnsettings import Ui_QOpenVPNSettings
 
 
 class QOpenVPNSettings(QtWidgets.QDialog, Ui_QOpenVPNSettings):
-    def __init__(self, parent=None, flags=QtCore.Qt.WindowCloseButtonHint):
+    def __init__(self, parent=None, flags=QtCore.Qt.WindowCloseButtonHint, profile_index=None):
         super(QOpenVPNSettings, self).__init__(parent, flags)
         self.setupUi(self)
 
@@ -35,50 +31,18 @@ class QOpenVPNSettings(QtWidgets.QDialog, Ui_QOpenVPNSettings):
         self.autoconnectCheckBox.setChecked(settings.value("auto_connect", False) == 'true')
         self.warningCheckBox.setChecked(settings.value("show_warning", False) == 'true')
         self.showlogCheckBox.setChecked(settings.value("show_log", False) == 'true')
+        self.leakCheckBox.setChecked(settings.value("leak_monitor", False) == 'true')
+        self.helperCheckBox.setChecked(settings.value("use_helper", False) == 'true')
 
-        # Checks for the new location of OpenVPN configuration files introduced in OpenVPN 2.4
-        # See https://github.com/OpenVPN/openvpn/blob/master/Changes.rst#user-visible-changes
-        # "The configuration files are picked up from the /etc/openvpn/server/ and
-        # /etc/openvpn/client/ directories (depending on unit file)."
-        # Remove this unaesthetic version check when openvpn 2.4 is widely accepcted
-        try:
-            output = subprocess.run(["openvpn", "--version"], stdout=subprocess.PIPE,
-                                    stderr=subprocess.STDOUT).stdout
-        except OSError:
-            print("An installation of OpenVPN could not be found on your machine!", file=sys.stderr)
-            output = ""
-
-        # Take second tuple of version output (i.e. `2.4.0`)
-        # and extract its major and minor components (i.e. 2 and 4)
-        # noinspection PyUnresolvedReferences
-        output = output.decode()
-        version_string = output.split()[1] if output else ""
-        version_components = version_string.split(".")
-        if len(version_components) >= 2:
-            major, minor = version_components[0:2]
-            major = int(major)
-            minor = int(minor)
-        else:
-            print("Couldn't determine the installed OpenVPN version, assuming v0.0", file=sys.stderr)
-            major = minor = 0
-
-        # Matches version 2.4.x or greater
-        if major >= 2 and minor >= 4:
-            settings.setValue("config_location", "/etc/openvpn/client/*.conf")
-            settings.setValue("service_name", "openvpn-client")
-        else:
-            settings.setValue("config_location", "/etc/openvpn/*.conf")
-            settings.setValue("service_name", "openvpn")
-
-        # Fill VPN combo box with .conf files from /etc/openvpn{,/client}
-        for f in sorted(glob.glob(settings.value("config_location"))):
-            vpn_name = os.path.splitext(os.path.basename(f))[0]
-            self.vpnNameComboBox.addItem(vpn_name)
-
-        i = self.vpnNameComboBox.findText(settings.value("vpn_name"))
-        if i > -1:
-            self.vpnNameComboBox.setCurrentIndex(i)
-            self.initialVPN = self.vpnNameComboBox.currentText()
+        # Version of OpenVPN and list of profiles are detected once and kept up to date by the index
+        if profile_index is None:
+            profile_index = profiles.ProfileIndex(self)
+        self.profile_index = profile_index
+        self.fill_profiles(settings.value("vpn_name"), settings.value("vpn_profiles", [], type=list) or [])
+        self.initialVPN = self.vpnNameComboBox.currentText()
+        # Profiles added or removed while dialog is open show up right away
+        profile_index.profilesChanged.connect(self.update_profiles)
+        self.finished.connect(lambda result: profile_index.profilesChanged.disconnect(self.update_profiles))
 
         self.sudoCommandComboBox.addItems(['kdesu', 'kdesudo', 'gksu', 'sudo'])
         self.sudoCommandComboBox.setCurrentText(settings.value("sudo_command"))
@@ -87,14 +51,42 @@ class QOpenVPNSettings(QtWidgets.QDialog, Ui_QOpenVPNSettings):
         self.setGeometry(QtWidgets.QStyle.alignedRect(QtCore.Qt.LeftToRight, QtCore.Qt.AlignCenter, self.size(),
                                                       QtWidgets.qApp.desktop().availableGeometry()))
 
+    def fill_profiles(self, vpn_name, vpn_profiles):
+        """Fill VPN combo box and list of additional profiles with .conf files from /etc/openvpn{,/client}"""
+        self.vpnNameComboBox.clear()
+        self.profilesListWidget.clear()
+        for name in self.profile_index.profiles():
+            self.vpnNameComboBox.addItem(name)
+            item = QtWidgets.QListWidgetItem(name, self.profilesListWidget)
+            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.Checked if name in vpn_profiles else QtCore.Qt.Unchecked)
+        i = self.vpnNameComboBox.findText(vpn_name)
+        if i > -1:
+            self.vpnNameComboBox.setCurrentIndex(i)
+
+    @QtCore.Slot()
+    def update_profiles(self):
+        """Refill profiles (keeping current selection) when profile index changes"""
+        vpn_profiles = [self.profilesListWidget.item(i).text() for i in range(self.profilesListWidget.count())
+                        if self.profilesListWidget.item(i).checkState() == QtCore.Qt.Checked]
+        self.fill_profiles(self.vpnNameComboBox.currentText(), vpn_profiles)
+
     def accept(self):
         settings = QtCore.QSettings()
         vpnName = self.vpnNameComboBox.currentText()
         settings.setValue("vpn_name", vpnName)
+        vpn_profiles = []
+        for i in range(self.profilesListWidget.count()):
+            item = self.profilesListWidget.item(i)
+            if item.checkState() == QtCore.Qt.Checked and item.text() != vpnName:
+                vpn_profiles.append(item.text())
+        settings.setValue("vpn_profiles", vpn_profiles)
         settings.setValue("auto_connect", self.autoconnectCheckBox.isChecked())
         settings.setValue("show_log", self.showlogCheckBox.isChecked())
         settings.setValue("show_warning", self.warningCheckBox.isChecked())
+        settings.setValue("leak_monitor", self.leakCheckBox.isChecked())
         settings.setValue("sudo_command", self.sudoCommandComboBox.currentText())
+        settings.setValue("use_helper", self.helperCheckBox.isChecked())
         if vpnName != self.initialVPN:
             self.parent.vpn_changed = True
         super(QOpenVPNSettings, self).accept()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tunnel throughput and latency statistics.
+
+Samples are taken in regular intervals, so their times are implicit and only
+values are stored in fixed-size array-backed ring buffers (24 hours of 1 Hz
+RX/TX samples take less than 700 kB).
+"""
+
+import math
+import socket
+from array import array
+
+from PySide2 import QtCore, QtGui, QtWidgets
+
+
+class RingBuffer(object):
+    """Fixed-size ring buffer of numbers backed by array"""
+
+    def __init__(self, capacity, typecode="f"):
+        self.capacity = max(1, capacity)
+        self._data = array(typecode, [0] * self.capacity)
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def append(self, value):
+        """Append value (overwrites the oldest one if buffer is full)"""
+        end = (self._start + self._len) % self.capacity
+        self._data[end] = value
+        if self._len < self.capacity:
+            self._len += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def clear(self):
+        self._start = 0
+        self._len = 0
+
+    def last(self, count=None):
+        """Return list of last `count` values (all values by default), oldest first"""
+        count = self._len if count is None else min(count, self._len)
+        first = (self._start + self._len - count) % self.capacity
+        if first + count <= self.capacity:
+            return self._data[first:first + count].tolist()
+        return self._data[first:].tolist() + self._data[:first + count - self.capacity].tolist()
+
+    def latest(self, default=None):
+        """Return newest value"""
+        if not self._len:
+            return default
+        return self._data[(self._start + self._len - 1) % self.capacity]
+
+
+def format_rate(rate):
+    """Format transfer rate in bytes per second"""
+    for unit in ("B/s", "kB/s", "MB/s"):
+        if rate < 1000:
+            return "{:.0f} {}".format(rate, unit) if unit == "B/s" else "{:.1f} {}".format(rate, unit)
+        rate /= 1000
+    return "{:.1f} GB/s".format(rate)
+
+
+class LatencyProbeSignals(QtCore.QObject):
+    """Signals of LatencyProbeTask"""
+    finished = QtCore.Signal(float)  # round-trip time in seconds (NaN on failure)
+
+
+class LatencyProbeTask(QtCore.QRunnable):
+    """Measure round-trip time of STUN Binding Request in worker thread"""
+    def __init__(self, signals, server=None, timeout=2):
+        super(LatencyProbeTask, self).__init__()
+        self.signals = signals
+        self.server = server
+        self.timeout = timeout
+
+    # noinspection PyBroadException
+    def run(self):
+        # STUN client is imported only when it is needed (it is not needed at startup)
+        from qopenvpn import stun
+        host, port = self.server or stun.STUN_SERVERS[0]
+        try:
+            # Resolve name before measuring, so DNS lookup is not part of round-trip time
+            address = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+            client = stun.StunClient(timeout=self.timeout)
+            client.get_ip(address[0], address[1])
+            # Round-trip time of the last (re)transmitted request
+            rtt = client.server_stats[(address[0], address[1])].rtt_last
+        except Exception:
+            rtt = float("nan")
+        try:
+            self.signals.finished.emit(rtt)
+        except RuntimeError:
+            pass
+
+
+class StatisticsCollector(QtCore.QObject):
+    """Collect per-second RX/TX rates from byte counters and periodic latency samples"""
+    sampleAdded = QtCore.Signal()
+    latencyAdded = QtCore.Signal()
+
+    def __init__(self, history=86400, sample_interval=1, latency_interval=10, parent=None):
+        """Keep `history` seconds of samples"""
+        super(StatisticsCollector, self).__init__(parent)
+        self.sample_interval = sample_interval
+        self.latency_interval = latency_interval
+        self.rx_rates = RingBuffer(history // sample_interval)
+        self.tx_rates = RingBuffer(history // sample_interval)
+        self.latencies = RingBuffer(history // max(1, latency_interval))
+        self._bytes = None
+        self._last_bytes = None
+        self._latency_server = None  # first of default STUN servers
+
+        self.sample_timer = QtCore.QTimer(self)
+        self.sample_timer.setInterval(sample_interval * 1000)
+        self.sample_timer.timeout.connect(self.add_sample)
+
+        self._latency_signals = LatencyProbeSignals(self)
+        self._latency_signals.finished.connect(self.add_latency)
+        self.latency_timer = QtCore.QTimer(self)
+        self.latency_timer.setInterval(latency_interval * 1000)
+        self.latency_timer.timeout.connect(self.probe_latency)
+
+    def start(self):
+        if not self.sample_timer.isActive():
+            self._last_bytes = None
+            self.sample_timer.start()
+            if self.latency_interval > 0:
+                self.latency_timer.start()
+
+    def stop(self):
+        self.sample_timer.stop()
+        self.latency_timer.stop()
+
+    def is_running(self):
+        return self.sample_timer.isActive()
+
+    @QtCore.Slot('qlonglong', 'qlonglong')
+    def set_bytecount(self, bytes_in, bytes_out):
+        """Update total byte counters (e.g. from OpenVPN management interface)"""
+        self._bytes = (bytes_in, bytes_out)
+
+    @QtCore.Slot()
+    def add_sample(self):
+        """Compute rates from byte counters since last sample"""
+        if self._bytes is None:
+            return
+        if self._last_bytes is None or self._bytes[0] < self._last_bytes[0] or \
+                self._bytes[1] < self._last_bytes[1]:
+            # First sample or counters were reset by reconnection
+            rx_rate = tx_rate = 0
+        else:
+            rx_rate = (self._bytes[0] - self._last_bytes[0]) / self.sample_interval
+            tx_rate = (self._bytes[1] - self._last_bytes[1]) / self.sample_interval
+        self._last_bytes = self._bytes
+        self.rx_rates.append(rx_rate)
+        self.tx_rates.append(tx_rate)
+        self.sampleAdded.emit()
+
+    @QtCore.Slot()
+    def probe_latency(self):
+        QtCore.QThreadPool.globalInstance().start(LatencyProbeTask(self._latency_signals, self._latency_server))
+
+    @QtCore.Slot(float)
+    def add_latency(self, rtt):
+        self.latencies.append(rtt)
+        self.latencyAdded.emit()
+
+    def current_rates(self):
+        """Return newest (rx, tx) rates or None"""
+        if not len(self.rx_rates):
+            return None
+        return self.rx_rates.latest(), self.tx_rates.latest()
+
+
+class PlotWidget(QtWidgets.QWidget):
+    """Simple line plot of last samples from RingBuffer(s)
+
+    Plot is cached in pixmap and on new sample only scrolled and extended by
+    newest segment, it is fully redrawn only on resize or when scale changes.
+    """
+    def __init__(self, title, buffers, colors, formatter, parent=None):
+        super(PlotWidget, self).__init__(parent)
+        self.title = title
+        self.buffers = buffers
+        self.colors = colors
+        self.formatter = formatter
+        self.span = 300  # number of samples shown
+        self._scale = 0
+        self._pixmap = None
+        self._scroll_remainder = 0.0
+        self.setMinimumSize(300, 120)
+
+    def set_span(self, span):
+        self.span = max(2, span)
+        self._pixmap = None
+        self.update()
+
+    def _step(self):
+        return self.width() / (self.span - 1)
+
+    def _y(self, value):
+        if self._scale <= 0 or value != value:
+            return None
+        return self.height() - 1 - value / self._scale * (self.height() - 20)
+
+    def _required_scale(self, values):
+        finite = [v for v in values if v == v]
+        peak = max(finite) if finite else 0
+        if peak <= 0:
+            return 1
+        # Round scale up to 1, 2 or 5 times power of ten
+        magnitude = 10 ** math.floor(math.log10(peak))
+        for factor in (1, 2, 5, 10):
+            if peak <= factor * magnitude:
+                return factor * magnitude
+
+    def add_sample(self):
+        """Scroll cached plot and draw only newest segment (full redraw if scale must change)"""
+        if self._pixmap is None or self._pixmap.size() != self.size():
+            self._pixmap = None
+        else:
+            last = [buffer.last(2) for buffer in self.buffers]
+            scale = max(self._required_scale(values) for values in last)
+            if scale > self._scale:
+                self._pixmap = None
+            else:
+                # Scroll by whole pixels, carry the fraction over to the next sample
+                step = self._step()
+                self._scroll_remainder += step
+                dx = int(self._scroll_remainder)
+                self._scroll_remainder -= dx
+                self._pixmap.scroll(-dx, 0, self._pixmap.rect())
+                painter = QtGui.QPainter(self._pixmap)
+                painter.fillRect(self.width() - dx, 0, dx, self.height(), self.palette().base())
+                painter.setRenderHint(QtGui.QPainter.Antialiasing)
+                for values, color in zip(last, self.colors):
+                    if len(values) == 2:
+                        self._draw_line(painter, color, values, self.width() - 1 - step)
+                painter.end()
+        self.update()
+
+    def _draw_line(self, painter, color, values, x0):
+        painter.setPen(QtGui.QPen(QtGui.QColor(color), 1.5))
+        step = self._step()
+        previous = None
+        for i, value in enumerate(values):
+            y = self._y(value)
+            point = QtCore.QPointF(x0 + i * step, y) if y is not None else None
+            if previous is not None and point is not None:
+                painter.drawLine(previous, point)
+            previous = point
+
+    def _redraw(self):
+        """Redraw whole plot into cached pixmap"""
+        series = [buffer.last(self.span) for buffer in self.buffers]
+        self._scale = max([self._required_scale(values) for values in series] or [1])
+        self._scroll_remainder = 0.0
+        self._pixmap = QtGui.QPixmap(self.size())
+        self._pixmap.fill(self.palette().base().color())
+        painter = QtGui.QPainter(self._pixmap)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        for values, color in zip(series, self.colors):
+            self._draw_line(painter, color, values, self.width() - 1 - (len(values) - 1) * self._step())
+        painter.end()
+
+    def resizeEvent(self, event):
+        self._pixmap = None
+        super(PlotWidget, self).resizeEvent(event)
+
+    def paintEvent(self, event):
+        if self._pixmap is None:
+            self._redraw()
+        painter = QtGui.QPainter(self)
+        painter.drawPixmap(0, 0, self._pixmap)
+        painter.setPen(self.palette().text().color())
+        painter.drawText(5, 15, "{} (max {})".format(self.title, self.formatter(self._scale)))
+        painter.end()
+
+
+class QOpenVPNStatistics(QtWidgets.QDialog):
+    """Window with live throughput and latency plots"""
+    SPANS = ((5, "5 minutes"), (15, "15 minutes"), (60, "1 hour"), (360, "6 hours"), (1440, "24 hours"))
+
+    def __init__(self, collector, parent=None, flags=QtCore.Qt.WindowCloseButtonHint, connect_times=None):
+        super(QOpenVPNStatistics, self).__init__(parent, flags)
+        self.collector = collector
+        self.connect_times = connect_times
+        self.setWindowTitle(self.tr("QOpenVPN Statistics"))
+        self.resize(700, 500)
+
+        self.throughputPlot = PlotWidget(self.tr("RX (blue) / TX (red)"),
+                                         [collector.rx_rates, collector.tx_rates],
+                                         ["#1f77b4", "#d62728"], format_rate, self)
+        self.latencyPlot = PlotWidget(self.tr("Latency"), [collector.latencies], ["#2ca02c"],
+                                      lambda value: "{:.0f} ms".format(value * 1000), self)
+        self.rateLabel = QtWidgets.QLabel(self)
+        self.spanComboBox = QtWidgets.QComboBox(self)
+        for minutes, label in self.SPANS:
+            self.spanComboBox.addItem(self.tr(label), minutes)
+        self.spanComboBox.currentIndexChanged.connect(self.on_span_changed)
+        buttonBox = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close, self)
+        buttonBox.rejected.connect(self.reject)
+        self.connectTimesLabel = QtWidgets.QLabel(self)
+        self.exportButton = QtWidgets.QPushButton(self.tr("Export connect times..."), self)
+        self.exportButton.clicked.connect(self.export_connect_times)
+        connectTimesLayout = QtWidgets.QHBoxLayout()
+        connectTimesLayout.addWidget(self.connectTimesLabel, 1)
+        connectTimesLayout.addWidget(self.exportButton)
+
+        bottomLayout = QtWidgets.QHBoxLayout()
+        bottomLayout.addWidget(self.rateLabel)
+        bottomLayout.addStretch()
+        bottomLayout.addWidget(QtWidgets.QLabel(self.tr("Show last:"), self))
+        bottomLayout.addWidget(self.spanComboBox)
+        bottomLayout.addWidget(buttonBox)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.throughputPlot, 2)
+        layout.addWidget(self.latencyPlot, 1)
+        if connect_times is not None:
+            layout.addLayout(connectTimesLayout)
+            connect_times.connectTimeMeasured.connect(self.update_connect_times)
+            self.update_connect_times()
+        else:
+            self.connectTimesLabel.hide()
+            self.exportButton.hide()
+        layout.addLayout(bottomLayout)
+
+        collector.sampleAdded.connect(self.on_sample_added)
+        collector.latencyAdded.connect(self.latencyPlot.add_sample)
+        self.on_span_changed(0)
+        self.update_rates()
+
+    @QtCore.Slot(int)
+    def on_span_changed(self, i):
+        minutes = self.spanComboBox.itemData(i)
+        self.throughputPlot.set_span(minutes * 60 // self.collector.sample_interval)
+        self.latencyPlot.set_span(minutes * 60 // max(1, self.collector.latency_interval))
+
+    @QtCore.Slot()
+    def on_sample_added(self):
+        self.throughputPlot.add_sample()
+        self.update_rates()
+
+    def update_rates(self):
+        rates = self.collector.current_rates()
+        if rates is None:
+            self.rateLabel.setText(self.tr("No data (management interface is not available)"))
+            return
+        latency = self.collector.latencies.latest()
+        text = "↓ {}  ↑ {}".format(format_rate(rates[0]), format_rate(rates[1]))
+        if latency is not None and latency == latency:
+            text += "  ⌚ {:.0f} ms".format(latency * 1000)
+        self.rateLabel.setText(text)
+
+    @QtCore.Slot()
+    def update_connect_times(self):
+        lines = []
+        for profile in sorted(self.connect_times.histograms):
+            summary = self.connect_times.summary(profile)
+            if summary is not None:
+                lines.append(self.tr("{}: connects in {:.1f} s, p95 {:.1f} s ({} connections)").format(
+                    profile, summary[1], summary[2], summary[0]))
+        self.connectTimesLabel.setText("\n".join(lines) or self.tr("No connect times measured yet"))
+
+    @QtCore.Slot()
+    def export_connect_times(self):
+        path, selected_filter = QtWidgets.QFileDialog.getSaveFileName(
+            self, self.tr("Export connect times"), "connect_times.json", self.tr("JSON files (*.json)"))
+        if not path:
+            return
+        try:
+            self.connect_times.export(path)
+        except OSError as e:
+            QtWidgets.QMessageBox.warning(self, self.tr("Error"),
+                                          self.tr("Couldn't export connect times: {}").format(e))
+
+    def done(self, result):
+        self.collector.sampleAdded.disconnect(self.on_sample_added)
+        self.collector.latencyAdded.disconnect(self.latencyPlot.add_sample)
+        if self.connect_times is not None:
+            self.connect_times.connectTimeMeasured.disconnect(self.update_connect_times)
+        super(QOpenVPNStatistics, self).done(result)
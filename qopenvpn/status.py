@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Event-driven status of OpenVPN systemd units.
+
+Instead of forking ``systemctl is-active`` periodically, subscribe to systemd's
+``PropertiesChanged`` D-Bus signals and report every ``ActiveState``/``SubState``
+transition of the watched units as soon as it happens. State of several units
+can be also queried by one D-Bus call.
+
+D-Bus signals are dispatched by the GLib main loop, which is the event dispatcher
+used by Qt on Linux, so no extra thread is needed.
+"""
+
+import dbus
+from PySide2 import QtCore
+
+SYSTEMD_BUS_NAME = "org.freedesktop.systemd1"
+SYSTEMD_OBJECT_PATH = "/org/freedesktop/systemd1"
+SYSTEMD_MANAGER_IFACE = "org.freedesktop.systemd1.Manager"
+SYSTEMD_UNIT_IFACE = "org.freedesktop.systemd1.Unit"
+PROPERTIES_IFACE = "org.freedesktop.DBus.Properties"
+
+# ActiveState values for which `systemctl is-active` exits with 0
+ACTIVE_STATES = ("active", "reloading")
+
+
+class WatchedUnit(object):
+    """State of one watched unit"""
+    __slots__ = ("name", "path", "match", "active_state", "sub_state")
+
+    def __init__(self, name, path, match=None):
+        self.name = name
+        self.path = path
+        self.match = match
+        self.active_state = ""
+        self.sub_state = ""
+
+    def is_active(self):
+        """Is unit active (same meaning as `systemctl is-active`)?"""
+        return self.active_state in ACTIVE_STATES
+
+
+class SystemdUnitMonitor(QtCore.QObject):
+    """Watch ActiveState/SubState of systemd units via D-Bus signals"""
+    stateChanged = QtCore.Signal(str, str, str)  # unit, ActiveState, SubState
+
+    def __init__(self, bus=None, bus_name=SYSTEMD_BUS_NAME, parent=None):
+        """Use system bus by default, pass another bus connection (e.g. private session bus
+        with stand-in systemd service) in `bus`"""
+        super(SystemdUnitMonitor, self).__init__(parent)
+        self._bus = bus
+        self._bus_name = bus_name
+        self._manager = None
+        self.units = {}  # unit name -> WatchedUnit
+        self._paths = {}  # object path -> WatchedUnit
+
+    # noinspection PyBroadException
+    def start(self):
+        """Connect to systemd manager, return False if D-Bus is not available"""
+        try:
+            if self._bus is None:
+                from dbus.mainloop.glib import DBusGMainLoop
+                self._bus = dbus.SystemBus(mainloop=DBusGMainLoop())
+            manager_obj = self._bus.get_object(self._bus_name, SYSTEMD_OBJECT_PATH)
+            self._manager = dbus.Interface(manager_obj, dbus_interface=SYSTEMD_MANAGER_IFACE)
+        except Exception:
+            self._manager = None
+            return False
+
+        # systemd sends most of its signals only if there is at least one subscriber
+        try:
+            self._manager.Subscribe()
+        except dbus.exceptions.DBusException:
+            pass
+        return True
+
+    def is_running(self):
+        """Is monitor connected to systemd?"""
+        return self._manager is not None
+
+    def watch(self, units):
+        """Start watching given units (stops watching other units), return False on failure"""
+        if not self.is_running():
+            return False
+        self.unwatch()
+        try:
+            for name in units:
+                # LoadUnit (unlike GetUnit) works even for currently inactive units
+                unit = WatchedUnit(name, str(self._manager.LoadUnit(name)))
+                unit.match = self._bus.add_signal_receiver(self._on_properties_changed,
+                                                           signal_name="PropertiesChanged",
+                                                           dbus_interface=PROPERTIES_IFACE,
+                                                           bus_name=self._bus_name,
+                                                           path=unit.path,
+                                                           path_keyword="path")
+                self.units[name] = unit
+                self._paths[unit.path] = unit
+            states = self.query_states(units)
+            if states is None:
+                raise dbus.exceptions.DBusException("Couldn't get state of units")
+            for name, active_state, sub_state in states:
+                self.units[name].active_state = active_state
+                self.units[name].sub_state = sub_state
+        except dbus.exceptions.DBusException:
+            self.unwatch()
+            return False
+        return True
+
+    def unwatch(self):
+        """Stop watching all units"""
+        for unit in self.units.values():
+            if unit.match is not None:
+                unit.match.remove()
+        self.units = {}
+        self._paths = {}
+
+    def is_active(self, name):
+        """Is watched unit active (same meaning as `systemctl is-active`)?"""
+        return name in self.units and self.units[name].is_active()
+
+    def query_states(self, units):
+        """Get list of (unit, ActiveState, SubState) of all given units by one D-Bus call
+        (return None on failure)"""
+        states = {}
+        try:
+            try:
+                for info in self._manager.ListUnitsByNames(list(units)):
+                    states[str(info[0])] = (str(info[3]), str(info[4]))
+            except dbus.exceptions.DBusException as e:
+                # ListUnitsByNames is not available in systemd < 230, fall back to ListUnits
+                # (which lists only loaded units, units not listed there are inactive)
+                if e.get_dbus_name() != "org.freedesktop.DBus.Error.UnknownMethod":
+                    raise
+                for info in self._manager.ListUnits():
+                    if str(info[0]) in units:
+                        states[str(info[0])] = (str(info[3]), str(info[4]))
+        except dbus.exceptions.DBusException:
+            return None
+        return [(name,) + states.get(name, ("inactive", "dead")) for name in units]
+
+    def _get_property(self, unit, name):
+        """Get property of watched unit"""
+        unit_obj = self._bus.get_object(self._bus_name, unit.path)
+        return str(unit_obj.Get(SYSTEMD_UNIT_IFACE, name, dbus_interface=PROPERTIES_IFACE))
+
+    def _on_properties_changed(self, interface, changed, invalidated, path=None):
+        """Handle PropertiesChanged signal of watched unit"""
+        unit = self._paths.get(str(path))
+        if interface != SYSTEMD_UNIT_IFACE or unit is None:
+            return
+        if "ActiveState" not in changed and "SubState" not in changed and \
+                "ActiveState" not in invalidated and "SubState" not in invalidated:
+            return
+
+        try:
+            active_state = str(changed["ActiveState"]) if "ActiveState" in changed \
+                else self._get_property(unit, "ActiveState")
+            sub_state = str(changed["SubState"]) if "SubState" in changed \
+                else self._get_property(unit, "SubState")
+        except dbus.exceptions.DBusException:
+            return
+
+        if (active_state, sub_state) != (unit.active_state, unit.sub_state):
+            unit.active_state, unit.sub_state = active_state, sub_state
+            self.stateChanged.emit(unit.name, active_state, sub_state)
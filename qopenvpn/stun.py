@@ -1,18 +1,42 @@
 #!/usr/bin/env python
 """Simple STUN client for getting external IP address.
 Based on stun.py from https://github.com/myers/html5_udp_to_server,
-but heavily simplified (dropped Twisted dependency, only supports old RFC 3489)
+but heavily simplified (dropped Twisted dependency). Speaks RFC 5389
+(XOR-MAPPED-ADDRESS, FINGERPRINT) over IPv4 and falls back to
+MAPPED-ADDRESS of old RFC 3489 servers.
 """
 
-import math
+import collections
 import os
+import selectors
 import socket
 import struct
+import time
+import zlib
 
 BINDING_REQUEST = 0x0001
 BINDING_RESPONSE = 0x0101
 MAPPED_ADDRESS = 0x0001
+XOR_MAPPED_ADDRESS = 0x0020
+FINGERPRINT = 0x8028
 FAMILY_IPV4 = 0x01
+MAGIC_COOKIE = 0x2112A442
+FINGERPRINT_XOR = 0x5354554E
+
+# Retransmission parameters (RFC 5389 section 7.2.1): initial RTO in seconds (doubled after
+# every retransmission), max. number of requests sent (Rc) and wait after the last one (Rm * RTO)
+RTO = 0.5
+RC = 7
+RM = 16
+
+# Precompiled structures of message header and attributes
+_HEADER = struct.Struct(">HH")  # message type, message length (followed by cookie and transaction ID)
+_ATTRIBUTE = struct.Struct(">HH")  # attribute type, value length
+_ADDRESS = struct.Struct(">xBHI")  # family, port, IPv4 address
+_UINT32 = struct.Struct(">I")
+# Response with just one IPv4 address attribute (the usual one), decoded by one unpack
+_SIMPLE_RESPONSE = struct.Struct(">HH16sHHxBHI")
+_COOKIE_BYTES = _UINT32.pack(MAGIC_COOKIE)
 
 STUN_SERVERS = [
     ("stun.iptel.org", 3478),
@@ -22,98 +46,277 @@ STUN_SERVERS = [
 ]
 
 
+def encode_binding_request(transaction_id, fingerprint=False):
+    """Encode Binding Request
+
+    `transaction_id` is 16 bytes following message length in header, i.e. magic cookie
+    and 12-byte transaction ID for RFC 5389 (or 16-byte transaction ID for RFC 3489).
+    """
+    if not fingerprint:
+        return _HEADER.pack(BINDING_REQUEST, 0) + transaction_id
+    # CRC-32 is computed over message with length already including FINGERPRINT attribute
+    message = _HEADER.pack(BINDING_REQUEST, 8) + transaction_id
+    crc = (zlib.crc32(message) ^ FINGERPRINT_XOR) & 0xFFFFFFFF
+    return message + _ATTRIBUTE.pack(FINGERPRINT, 4) + _UINT32.pack(crc)
+
+
+def decode_binding_response(data, transaction_id):
+    """Decode Binding Response to (address, port) tuple (("", 0) if it has no mapped address)
+
+    XOR-MAPPED-ADDRESS is preferred to MAPPED-ADDRESS, FINGERPRINT is verified if present.
+    Only IPv4 addresses are decoded (requests are sent over IPv4). Raise ValueError on
+    invalid or truncated response.
+    """
+    if len(data) == _SIMPLE_RESPONSE.size:
+        message_type, length, header_tail, attr_type, attr_length, family, port, address = \
+            _SIMPLE_RESPONSE.unpack(data)
+        if message_type == BINDING_RESPONSE and length == 12 and header_tail == transaction_id and \
+                attr_length == 8 and family == FAMILY_IPV4:
+            if attr_type == XOR_MAPPED_ADDRESS and header_tail[:4] == _COOKIE_BYTES:
+                return socket.inet_ntoa(_UINT32.pack(address ^ MAGIC_COOKIE)), port ^ (MAGIC_COOKIE >> 16)
+            if attr_type == MAPPED_ADDRESS:
+                return socket.inet_ntoa(data[28:32]), port
+        # Anything else is handled (and reported) by general decoding below
+
+    if len(data) < 20:
+        raise ValueError("Response is too short!")
+    message_type, length = _HEADER.unpack_from(data)
+    if message_type != BINDING_RESPONSE:
+        raise ValueError("Invalid response type!")
+    if data[4:20] != transaction_id:
+        raise ValueError("Invalid response transaction ID!")
+    end = 20 + length
+    if end > len(data):
+        raise ValueError("Response is truncated!")
+
+    # Only value offsets of address attributes are remembered while walking,
+    # just the preferred one is decoded at the end
+    mapped = xor_mapped = 0
+    offset = 20
+    while offset + 4 <= end:
+        attr_type, attr_length = _ATTRIBUTE.unpack_from(data, offset)
+        offset += 4
+        if offset + attr_length > end:
+            raise ValueError("Attribute is truncated!")
+        if attr_type == XOR_MAPPED_ADDRESS:
+            xor_mapped = offset
+        elif attr_type == MAPPED_ADDRESS:
+            if not mapped:
+                mapped = offset
+        elif attr_type == FINGERPRINT:
+            if attr_length != 4 or _UINT32.unpack_from(data, offset)[0] != \
+                    (zlib.crc32(data[:offset - 4]) ^ FINGERPRINT_XOR) & 0xFFFFFFFF:
+                raise ValueError("Invalid response fingerprint!")
+        # Attributes are padded to multiple of 4 bytes
+        offset += (attr_length + 3) & ~3
+
+    # XOR-MAPPED-ADDRESS is defined only for RFC 5389 requests (with magic cookie)
+    if xor_mapped and data[4:8] == _COOKIE_BYTES:
+        offset, key = xor_mapped, MAGIC_COOKIE
+    elif mapped:
+        offset, key = mapped, 0
+    else:
+        return ("", 0)
+    if offset + 8 > end:
+        raise ValueError("Address attribute is too short!")
+    family, port, address = _ADDRESS.unpack_from(data, offset)
+    if family != FAMILY_IPV4:
+        raise ValueError("Unsupported address family!")
+    return socket.inet_ntoa(_UINT32.pack(address ^ key)), port ^ (key >> 16)
+
+
+class StunServerStats(object):
+    """Round-trip time statistics of one STUN server"""
+    __slots__ = ("sent", "received", "timeouts", "errors", "rtt_last", "rtt_min", "rtt_max", "rtt_sum")
+
+    def __init__(self):
+        self.sent = self.received = self.timeouts = self.errors = 0
+        self.rtt_last = self.rtt_min = self.rtt_max = None
+        self.rtt_sum = 0.0
+
+    def add_rtt(self, rtt):
+        """Record round-trip time (in seconds) of received response"""
+        self.received += 1
+        self.rtt_last = rtt
+        self.rtt_sum += rtt
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+        self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+
+    @property
+    def rtt_avg(self):
+        return self.rtt_sum / self.received if self.received else None
+
+    def __repr__(self):
+        return "<StunServerStats sent={} received={} timeouts={} errors={} rtt_avg={}>".format(
+            self.sent, self.received, self.timeouts, self.errors, self.rtt_avg)
+
+
+class StunTransaction(object):
+    """Binding transaction with one server, retransmitted with exponential backoff until
+    response is received, Rc requests were sent or `timeout` expired"""
+    __slots__ = ("server", "address", "transaction_id", "request", "initial_rto", "rto", "requests",
+                 "sent", "next_send", "deadline")
+
+    def __init__(self, server, address, transaction_id, request, timeout, rto=RTO):
+        self.server = server
+        self.address = address
+        self.transaction_id = transaction_id
+        self.request = request
+        self.initial_rto = self.rto = rto
+        self.requests = 0
+        self.sent = self.next_send = time.monotonic()
+        self.deadline = self.sent + timeout
+
+    def send(self, sock, now):
+        """Send (or retransmit) request and schedule next retransmission"""
+        sock.sendto(self.request, self.address)
+        self.requests += 1
+        self.sent = now
+        if self.requests < RC:
+            self.next_send = now + self.rto
+            self.rto *= 2
+        else:
+            self.next_send = float("inf")
+            self.deadline = min(self.deadline, now + RM * self.initial_rto)
+
+
 class StunClient(object):
     """Simple STUN client for getting external IP address"""
 
-    def __init__(self, timeout=5, attempts=3):
+    def __init__(self, timeout=5, attempts=3, race=False, quorum=1, servers=None, rfc3489=False, rto=RTO):
+        """In race mode, all servers (`servers` or STUN_SERVERS) are queried at once
+        and the first address reported by `quorum` servers wins (send old RFC 3489
+        requests if `rfc3489` is True). Requests are retransmitted after `rto` seconds
+        (doubled every time) until `timeout` seconds per server expire."""
+        self._rfc3489 = rfc3489
+        self._rto = rto
         self._timeout = timeout
         self._attempts = attempts
+        self._race = race
+        self._quorum = quorum
+        self._servers = servers if servers is not None else STUN_SERVERS
         self._transaction_id = b""
+        self.server_stats = {}
 
-    def get_ip(self, stun_host="", stun_port=3478, source_address="", source_port=54320):
-        """Get external IP address and port"""
+    def get_ip(self, stun_host="", stun_port=3478, source_address="", source_port=0):
+        """Get external IP address and port (source port is chosen by OS if `source_port` is 0)"""
         if stun_host:
-            stun_servers = [(stun_host, stun_port)]
-        else:
-            stun_servers = STUN_SERVERS
+            return self._query([(stun_host, stun_port)], 1, 1, source_address, source_port)
+        if self._race:
+            return self.get_ip_race(self._servers, self._quorum, source_address, source_port)
 
-        # If no stun_host is specified, try more servers from STUN_SERVERS list
+        # If no stun_host is specified, try servers from STUN_SERVERS list one after another
         # (max. number of attempted servers is specified by self._attempts)
-        ext_address = ""
-        ext_port = 0
-        attempt = 0
-        for stun_host, stun_port in stun_servers:
-            attempt += 1
-            if attempt > self._attempts:
-                break
-
-            try:
-                # Create socket, send request and receive response
-                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                sock.settimeout(self._timeout)
+        return self._query(self._servers[:self._attempts], 1, 1, source_address, source_port)
+
+    def get_ip_race(self, stun_servers=None, quorum=1, source_address="", source_port=0):
+        """Send Binding Requests to all STUN servers at once from one socket and return
+        first external IP address and port confirmed by `quorum` servers"""
+        if stun_servers is None:
+            stun_servers = self._servers
+        return self._query(stun_servers, quorum, len(stun_servers), source_address, source_port)
+
+    def _query(self, stun_servers, quorum, concurrency, source_address, source_port):
+        """Run Binding transactions with up to `concurrency` servers at a time from one socket
+        and return first external IP address and port confirmed by `quorum` servers"""
+        queued = collections.deque(stun_servers)
+        active = {}  # Transaction ID -> StunTransaction (responses are matched by Transaction ID)
+        votes = {}
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            if source_port:
                 sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                sock.bind((source_address, source_port))
-                sock.sendto(self._generate_request(), (stun_host, stun_port))
-                data, addr = sock.recvfrom(2048)
-                sock.close()
+            sock.bind((source_address, source_port))
+
+            with selectors.DefaultSelector() as selector:
+                selector.register(sock, selectors.EVENT_READ)
+                while queued or active:
+                    while queued and len(active) < concurrency:
+                        transaction = self._start_transaction(queued.popleft())
+                        if transaction is not None:
+                            active[transaction.transaction_id] = transaction
+
+                    # Retransmit requests and give up on transactions which timed out
+                    now = time.monotonic()
+                    for transaction in list(active.values()):
+                        stats = self.server_stats[transaction.server]
+                        if now >= transaction.deadline:
+                            del active[transaction.transaction_id]
+                            stats.timeouts += 1
+                        elif now >= transaction.next_send:
+                            try:
+                                transaction.send(sock, now)
+                            except OSError:
+                                del active[transaction.transaction_id]
+                                stats.errors += 1
+                                continue
+                            stats.sent += 1
+                    if not active:
+                        continue
 
-                # Parse response
-                ext_address, ext_port = self._parse_response(data)
-                if ext_address:
-                    break
-            except:
-                continue
+                    wakeup = min(min(t.next_send, t.deadline) for t in active.values())
+                    if not selector.select(max(wakeup - time.monotonic(), 0)):
+                        continue
+                    try:
+                        data, addr = sock.recvfrom(2048)
+                    except OSError:
+                        continue
 
-        if not ext_address:
-            raise RuntimeError("Couldn't get external IP address from STUN server!")
+                    transaction = active.pop(data[4:20], None)
+                    if transaction is None:
+                        continue
+                    stats = self.server_stats[transaction.server]
+                    try:
+                        ext_address, ext_port = self._parse_response(data, transaction.transaction_id)
+                    except (ValueError, struct.error):
+                        stats.errors += 1
+                        continue
+                    # Round-trip time is measured from the last (re)transmission
+                    stats.add_rtt(time.monotonic() - transaction.sent)
+                    if not ext_address:
+                        continue
 
-        return (ext_address, ext_port)
+                    votes.setdefault(ext_address, []).append(ext_port)
+                    if len(votes[ext_address]) >= quorum:
+                        return (ext_address, votes[ext_address][0])
+        finally:
+            sock.close()
+
+        raise RuntimeError("Couldn't get external IP address from STUN server!")
+
+    def _start_transaction(self, server):
+        """Resolve server address and create new transaction (None if server can't be resolved)"""
+        stats = self.server_stats.setdefault(server, StunServerStats())
+        try:
+            server_address = socket.getaddrinfo(server[0], server[1], socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+        except OSError:
+            stats.errors += 1
+            return None
+        transaction_id = self._generate_id()
+        self._transaction_id = transaction_id
+        return StunTransaction(server, server_address, transaction_id, self._generate_request(transaction_id),
+                               self._timeout, self._rto)
 
     def _generate_id(self):
-        """Generate random Transaction ID"""
-        return os.urandom(16)
-
-    def _generate_request(self):
-        """Generate Binding Request"""
-        self._transaction_id = self._generate_id()
-        request = [struct.pack(">H", BINDING_REQUEST),  # Message Type
-                   struct.pack(">H", 0),  # Message Length
-                   self._transaction_id]
-        return b"".join(request)
-
-    def _parse_response(self, data):
+        """Generate random Transaction ID (including magic cookie, i.e. 16 bytes after message length)"""
+        if self._rfc3489:
+            return os.urandom(16)
+        return _COOKIE_BYTES + os.urandom(12)
+
+    def _generate_request(self, transaction_id=None):
+        """Generate Binding Request (with new random Transaction ID if none is given)"""
+        if transaction_id is None:
+            transaction_id = self._generate_id()
+            self._transaction_id = transaction_id
+        return encode_binding_request(transaction_id)
+
+    def _parse_response(self, data, transaction_id=None):
         """Parse server response to get mapped address"""
-        ip_address, port = '', ''
-        packet_type, length = struct.unpack(">2H", data[:4])
-        if packet_type != BINDING_RESPONSE:
-            raise ValueError("Invalid response type!")
-        if data[4:20] != self._transaction_id:
-            raise ValueError("Invalid response transaction ID!")
-
-        # Walk through all response attributes to find MAPPED_ADDRESS
-        for attr_id, value_length, value, start_offset in self._parse_attributes(data[20:length + 20]):
-            if attr_id == MAPPED_ADDRESS:
-                ip_address, port = self._parse_mapped_address(value)
-                break
-
-        return ip_address, port
-
-    def _parse_attributes(self, data):
-        """Generator which walks through response attributes"""
-        ptr = 0
-        while ptr < len(data):
-            attr_type, length = struct.unpack(">2H", data[ptr:ptr + 4])
-            yield attr_type, length, data[ptr + 4:ptr + 4 + length], ptr + 20
-            attr_length = 4 + 4 * int(math.ceil(length / 4.0))
-            ptr += attr_length
-
-    def _parse_mapped_address(self, value):
-        """Get IP address and port from MAPPED_ADDRESS attribute"""
-        family, recv_port = struct.unpack(">xBH", value[:4])
-        if family != FAMILY_IPV4:
-            raise ValueError("IPv6 is not supported!")
-        ip_address = socket.inet_ntoa(value[4:])
-        return (ip_address, recv_port)
+        if transaction_id is None:
+            transaction_id = self._transaction_id
+        return decode_binding_response(data, transaction_id)
 
 
 if __name__ == "__main__":
@@ -15,10 +15,30 @@ class Ui_QOpenVPNLogViewer(object):
         QOpenVPNLogViewer.resize(1000, 560)
         self.gridLayout = QtWidgets.QGridLayout(QOpenVPNLogViewer)
         self.gridLayout.setObjectName("gridLayout")
-        self.logViewerEdit = QtWidgets.QPlainTextEdit(QOpenVPNLogViewer)
-        self.logViewerEdit.setTextInteractionFlags(QtCore.Qt.TextSelectableByKeyboard|QtCore.Qt.TextSelectableByMouse)
-        self.logViewerEdit.setObjectName("logViewerEdit")
-        self.gridLayout.addWidget(self.logViewerEdit, 0, 0, 1, 3)
+        self.logViewerList = QtWidgets.QListView(QOpenVPNLogViewer)
+        self.logViewerList.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.logViewerList.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.logViewerList.setUniformItemSizes(True)
+        self.logViewerList.setObjectName("logViewerList")
+        self.gridLayout.addWidget(self.logViewerList, 0, 0, 1, 3)
+        self.filterLayout = QtWidgets.QHBoxLayout()
+        self.filterLayout.setObjectName("filterLayout")
+        self.priorityLabel = QtWidgets.QLabel(QOpenVPNLogViewer)
+        self.priorityLabel.setObjectName("priorityLabel")
+        self.filterLayout.addWidget(self.priorityLabel)
+        self.priorityComboBox = QtWidgets.QComboBox(QOpenVPNLogViewer)
+        self.priorityComboBox.setObjectName("priorityComboBox")
+        self.filterLayout.addWidget(self.priorityComboBox)
+        self.attemptLabel = QtWidgets.QLabel(QOpenVPNLogViewer)
+        self.attemptLabel.setObjectName("attemptLabel")
+        self.filterLayout.addWidget(self.attemptLabel)
+        self.attemptComboBox = QtWidgets.QComboBox(QOpenVPNLogViewer)
+        self.attemptComboBox.setSizeAdjustPolicy(QtWidgets.QComboBox.AdjustToContents)
+        self.attemptComboBox.setObjectName("attemptComboBox")
+        self.filterLayout.addWidget(self.attemptComboBox)
+        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.filterLayout.addItem(spacerItem)
+        self.gridLayout.addLayout(self.filterLayout, 1, 0, 1, 3)
         self.horizontalLayout = QtWidgets.QHBoxLayout()
         self.horizontalLayout.setObjectName("horizontalLayout")
         self.label = QtWidgets.QLabel(QOpenVPNLogViewer)
@@ -28,17 +48,20 @@ class Ui_QOpenVPNLogViewer(object):
         self.ipAddressEdit.setReadOnly(True)
         self.ipAddressEdit.setObjectName("ipAddressEdit")
         self.horizontalLayout.addWidget(self.ipAddressEdit)
-        self.gridLayout.addLayout(self.horizontalLayout, 1, 0, 1, 2)
+        self.gridLayout.addLayout(self.horizontalLayout, 2, 0, 1, 2)
+        self.followCheckBox = QtWidgets.QCheckBox(QOpenVPNLogViewer)
+        self.followCheckBox.setObjectName("followCheckBox")
+        self.gridLayout.addWidget(self.followCheckBox, 2, 2, 1, 1)
         self.refreshButton = QtWidgets.QPushButton(QOpenVPNLogViewer)
         self.refreshButton.setObjectName("refreshButton")
-        self.gridLayout.addWidget(self.refreshButton, 2, 0, 1, 1)
-        spacerItem = QtWidgets.QSpacerItem(453, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
-        self.gridLayout.addItem(spacerItem, 2, 1, 1, 1)
+        self.gridLayout.addWidget(self.refreshButton, 3, 0, 1, 1)
+        spacerItem1 = QtWidgets.QSpacerItem(453, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.gridLayout.addItem(spacerItem1, 3, 1, 1, 1)
         self.buttonBox = QtWidgets.QDialogButtonBox(QOpenVPNLogViewer)
         self.buttonBox.setOrientation(QtCore.Qt.Horizontal)
         self.buttonBox.setStandardButtons(QtWidgets.QDialogButtonBox.Close)
         self.buttonBox.setObjectName("buttonBox")
-        self.gridLayout.addWidget(self.buttonBox, 2, 2, 1, 1)
+        self.gridLayout.addWidget(self.buttonBox, 3, 2, 1, 1)
 
         self.retranslateUi(QOpenVPNLogViewer)
         self.buttonBox.accepted.connect(QOpenVPNLogViewer.accept)
@@ -48,6 +71,9 @@ class Ui_QOpenVPNLogViewer(object):
     def retranslateUi(self, QOpenVPNLogViewer):
         _translate = QtCore.QCoreApplication.translate
         QOpenVPNLogViewer.setWindowTitle(_translate("QOpenVPNLogViewer", "QOpenVPN Log Viewer"))
+        self.priorityLabel.setText(_translate("QOpenVPNLogViewer", "Show:"))
+        self.attemptLabel.setText(_translate("QOpenVPNLogViewer", "Jump to connection attempt:"))
         self.label.setText(_translate("QOpenVPNLogViewer", "IP address:"))
+        self.followCheckBox.setText(_translate("QOpenVPNLogViewer", "Follow"))
         self.refreshButton.setText(_translate("QOpenVPNLogViewer", "Refresh"))
 
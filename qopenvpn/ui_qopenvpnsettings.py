@@ -23,6 +23,13 @@ class Ui_QOpenVPNSettings(object):
         self.vpnNameComboBox.setCursor(QtCore.Qt.PointingHandCursor)
         self.vpnNameComboBox.setMaxVisibleItems(6)
         topLayout.addWidget(self.vpnNameComboBox)
+        self.label_3 = QtWidgets.QLabel(QOpenVPNSettings)
+        self.label_3.setObjectName("label_3")
+        topLayout.addWidget(self.label_3)
+        self.profilesListWidget = QtWidgets.QListWidget(QOpenVPNSettings)
+        self.profilesListWidget.setObjectName("profilesListWidget")
+        self.profilesListWidget.setMaximumHeight(90)
+        topLayout.addWidget(self.profilesListWidget)
         self.autoconnectCheckBox = QtWidgets.QCheckBox(QOpenVPNSettings)
         self.autoconnectCheckBox.setObjectName("autoconnectCheckBox")
         self.autoconnectCheckBox.setCursor(QtCore.Qt.PointingHandCursor)
@@ -36,6 +43,10 @@ class Ui_QOpenVPNSettings(object):
         self.warningCheckBox.setObjectName("warningCheckBox")
         self.warningCheckBox.setCursor(QtCore.Qt.PointingHandCursor)
         topLayout.addWidget(self.warningCheckBox)
+        self.leakCheckBox = QtWidgets.QCheckBox(QOpenVPNSettings)
+        self.leakCheckBox.setObjectName("leakCheckBox")
+        self.leakCheckBox.setCursor(QtCore.Qt.PointingHandCursor)
+        topLayout.addWidget(self.leakCheckBox)
         groupbox1 = QtWidgets.QGroupBox()
         groupbox1.setLayout(topLayout)
         self.label_2 = QtWidgets.QLabel(QOpenVPNSettings)
@@ -46,6 +57,10 @@ class Ui_QOpenVPNSettings(object):
         bottomLayout = QtWidgets.QVBoxLayout(QOpenVPNSettings)
         bottomLayout.addWidget(self.label_2)
         bottomLayout.addWidget(self.sudoCommandComboBox)
+        self.helperCheckBox = QtWidgets.QCheckBox(QOpenVPNSettings)
+        self.helperCheckBox.setObjectName("helperCheckBox")
+        self.helperCheckBox.setCursor(QtCore.Qt.PointingHandCursor)
+        bottomLayout.addWidget(self.helperCheckBox)
         bottomLayout.addItem(QtWidgets.QSpacerItem(1, 10))
         groupbox2 = QtWidgets.QGroupBox(QOpenVPNSettings)
         groupbox2.setLayout(bottomLayout)
@@ -63,19 +78,25 @@ class Ui_QOpenVPNSettings(object):
         self.buttonBox.accepted.connect(QOpenVPNSettings.accept)
         self.buttonBox.rejected.connect(QOpenVPNSettings.reject)
         QtCore.QMetaObject.connectSlotsByName(QOpenVPNSettings)
-        QOpenVPNSettings.setTabOrder(self.vpnNameComboBox, self.autoconnectCheckBox)
+        QOpenVPNSettings.setTabOrder(self.vpnNameComboBox, self.profilesListWidget)
+        QOpenVPNSettings.setTabOrder(self.profilesListWidget, self.autoconnectCheckBox)
         QOpenVPNSettings.setTabOrder(self.autoconnectCheckBox, self.showlogCheckBox)
         QOpenVPNSettings.setTabOrder(self.showlogCheckBox, self.warningCheckBox)
-        QOpenVPNSettings.setTabOrder(self.warningCheckBox, self.sudoCommandComboBox)
-        QOpenVPNSettings.setTabOrder(self.sudoCommandComboBox, self.buttonBox)
+        QOpenVPNSettings.setTabOrder(self.warningCheckBox, self.leakCheckBox)
+        QOpenVPNSettings.setTabOrder(self.leakCheckBox, self.sudoCommandComboBox)
+        QOpenVPNSettings.setTabOrder(self.sudoCommandComboBox, self.helperCheckBox)
+        QOpenVPNSettings.setTabOrder(self.helperCheckBox, self.buttonBox)
 
     def retranslateUi(self, QOpenVPNSettings):
         _translate = QtCore.QCoreApplication.translate
         QOpenVPNSettings.setWindowTitle(_translate("QOpenVPNSettings", "QOpenVPN Settings"))
         self.label.setText(_translate("QOpenVPNSettings", "OpenVPN profile:"))
         self.label.setStyleSheet('font-weight: bold;')
+        self.label_3.setText(_translate("QOpenVPNSettings", "Also manage profiles:"))
         self.label_2.setText(_translate("QOpenVPNSettings", "<i>sudo</i> command:"))
         self.label_2.setStyleSheet('font-weight: bold;')
         self.autoconnectCheckBox.setText(_translate("QOpenVPNSettings", "Auto-connect when started"))
         self.warningCheckBox.setText(_translate("QOpenVPNSettings", "Warn if disconnected"))
+        self.leakCheckBox.setText(_translate("QOpenVPNSettings", "Warn if traffic leaks outside of VPN"))
         self.showlogCheckBox.setText(_translate("QOpenVPNSettings", "View logs when connecting"))
+        self.helperCheckBox.setText(_translate("QOpenVPNSettings", "Ask for password only once per session"))
@@ -28,7 +28,10 @@ setup(
         ("share/applications", ["qopenvpn.desktop"]),
         ("share/pixmaps", ["qopenvpn.png"]),
     ],
-    entry_points={"gui_scripts": ["qopenvpn=qopenvpn.__main__:main"],},
+    entry_points={
+        "gui_scripts": ["qopenvpn=qopenvpn.__main__:main"],
+        "console_scripts": ["qopenvpn-cli=qopenvpn.cli:main"],
+    },
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Environment :: X11 Applications :: Qt",
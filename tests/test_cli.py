@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tests of qopenvpn.cli (settings parsing and commands with stand-in systemctl)."""
+
+import json
+
+from qopenvpn import cli
+
+
+def test_parse_qsettings_value():
+    assert cli.parse_qsettings_value("true") == "true"
+    assert cli.parse_qsettings_value("work, home") == ["work", "home"]
+    assert cli.parse_qsettings_value('"a, b", c') == ["a, b", "c"]
+    assert cli.parse_qsettings_value(r'"line\none"') == "line\none"
+    assert cli.parse_qsettings_value(r'back\\slash') == "back\\slash"
+    assert cli.parse_qsettings_value("@Invalid()") is None
+    assert cli.parse_qsettings_value("") == ""
+
+
+def test_read_settings(tmp_path):
+    path = tmp_path / "QOpenVPN.conf"
+    path.write_text('[General]\nvpn_name=work\nvpn_profiles=work, home\nsudo_command=kdesu\n'
+                    'management_address="/run/openvpn-client/work.sock"\nCamelCase=1\n\n[Other]\nvpn_name=x\n')
+    assert cli.read_settings(str(path)) == {
+        "vpn_name": "work",
+        "vpn_profiles": ["work", "home"],
+        "sudo_command": "kdesu",
+        "management_address": "/run/openvpn-client/work.sock",
+        "CamelCase": "1",
+    }
+
+
+def test_read_settings_missing_or_invalid(tmp_path):
+    assert cli.read_settings(str(tmp_path / "missing.conf")) == {}
+    path = tmp_path / "QOpenVPN.conf"
+    path.write_text("no section\n")
+    assert cli.read_settings(str(path)) == {}
+
+
+def test_settings_path(monkeypatch):
+    monkeypatch.setenv("XDG_CONFIG_HOME", "/config")
+    assert cli.settings_path() == "/config/QOpenVPN/QOpenVPN.conf"
+
+
+def test_profiles():
+    assert cli.profiles({}) == []
+    assert cli.profiles({"vpn_profiles": "home"}) == ["home"]
+    assert cli.profiles({"vpn_name": "work", "vpn_profiles": ["home", "work", ""]}) == ["work", "home"]
+
+
+def test_unit_name():
+    assert cli.unit_name({}, "work") == "openvpn-client@work"
+    assert cli.unit_name({"service_name": "openvpn"}, "work") == "openvpn@work"
+
+
+def test_run_reports_missing_command():
+    exitcode, output = cli.run(["/nonexistent/systemctl"])
+    assert exitcode == -1
+    assert output
+
+
+def test_status(monkeypatch, tmp_path, capsys):
+    calls = []
+
+    def run(cmdline, timeout=None):
+        calls.append(cmdline)
+        return 3, "inactive\nactive\n"
+
+    monkeypatch.setattr(cli, "run", run)
+    path = tmp_path / "QOpenVPN.conf"
+    path.write_text("[General]\nvpn_name=work\nvpn_profiles=home\n")
+    assert cli.main(["--settings", str(path), "status"]) == 0
+    assert calls == [["systemctl", "is-active", "openvpn-client@work", "openvpn-client@home"]]
+    result = json.loads(capsys.readouterr().out)
+    assert result == {
+        "profiles": [
+            {"name": "work", "unit": "openvpn-client@work", "state": "inactive", "active": False},
+            {"name": "home", "unit": "openvpn-client@home", "state": "active", "active": True},
+        ],
+        "active": True,
+    }
+
+
+def test_start_uses_sudo_command(monkeypatch, tmp_path, capsys):
+    calls = []
+    monkeypatch.setattr(cli, "run", lambda cmdline, timeout=None: calls.append(cmdline) or (1, "Failed\n"))
+    path = tmp_path / "QOpenVPN.conf"
+    path.write_text("[General]\nvpn_name=work\nsudo_command=pkexec\n")
+    assert cli.main(["--settings", str(path), "start"]) == 1
+    assert calls == [["pkexec", "systemctl", "start", "openvpn-client@work"]]
+    assert json.loads(capsys.readouterr().out) == {"profile": "work", "unit": "openvpn-client@work",
+                                                   "command": "start", "exitcode": 1, "output": "Failed"}
+
+
+def test_errors_are_printed_as_json(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(cli, "run", lambda cmdline, timeout=None: (0, ""))
+    path = tmp_path / "QOpenVPN.conf"
+    path.write_text("[General]\n")
+    for command in ("status", "start", "stop", "logs"):
+        assert cli.main(["--settings", str(path), command]) == cli.ERROR_EXITCODE
+        assert json.loads(capsys.readouterr().out) == {
+            "error": "No VPN profile is configured (set it in QOpenVPN settings)"}
+
+
+def test_logs_reports_missing_journalctl(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    path = tmp_path / "QOpenVPN.conf"
+    path.write_text("[General]\nvpn_name=work\n")
+    assert cli.main(["--settings", str(path), "logs"]) == cli.ERROR_EXITCODE
+    assert "error" in json.loads(capsys.readouterr().out)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tests of connect time model in qopenvpn.connecttime (needs PySide2)."""
+
+import json
+import types
+
+import pytest
+
+QtCore = pytest.importorskip("PySide2.QtCore")
+
+from qopenvpn import connecttime  # noqa: E402
+from qopenvpn.connecttime import ConnectTimeHistogram, ConnectTimeTracker  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake clock of connecttime module (advanced by setting clock.now)"""
+    fake = types.SimpleNamespace(now=1000.0, strftime=connecttime.time.strftime,
+                                 localtime=connecttime.time.localtime)
+    fake.monotonic = fake.time = lambda: fake.now
+    monkeypatch.setattr(connecttime, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def tracker(tmp_path, clock):
+    QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    return ConnectTimeTracker(str(tmp_path / "connect_times.json"), watch_journal=False)
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = ConnectTimeHistogram()
+    assert histogram.percentile(50) is None
+    for seconds in (0.4, 0.5, 2.5, 3, 200):
+        histogram.add(seconds)
+    assert len(histogram) == 5
+    data = histogram.as_dict()
+    assert data["buckets"]["<=0.5"] == 2
+    assert data["buckets"]["<=3"] == 2
+    assert data["buckets"][">120"] == 1
+    assert data["p50"] == 2.5
+    assert data["p95"] == 200
+    assert data["mean"] == 41.28
+
+
+def test_histogram_keeps_last_samples():
+    histogram = ConnectTimeHistogram(max_samples=3, max_attempts=2)
+    for seconds in (1, 2, 3, 4):
+        histogram.add(seconds)
+    assert len(histogram) == 4
+    assert list(histogram.samples) == [2, 3, 4]
+
+
+def test_histogram_round_trip():
+    histogram = ConnectTimeHistogram()
+    for seconds in (1.2345, 7, 50):
+        histogram.add(seconds)
+    loaded = ConnectTimeHistogram()
+    loaded.load_dict(json.loads(json.dumps(histogram.as_dict())))
+    assert loaded.counts == histogram.counts
+    assert list(loaded.samples) == [1.234, 7, 50]
+
+
+def test_histogram_ignores_incompatible_buckets():
+    histogram = ConnectTimeHistogram()
+    histogram.load_dict({"buckets": {"<=1": 5}, "samples": [1]})
+    assert len(histogram) == 0
+    assert list(histogram.samples) == [1]
+
+
+def test_attempt_is_timed_from_activation(tracker, clock):
+    measured = []
+    tracker.connectTimeMeasured.connect(lambda profile, seconds: measured.append((profile, seconds)))
+    tracker.start_requested("work", "openvpn-client@work")
+    clock.now += 20  # password prompt
+    tracker.unit_activating("work")
+    clock.now += 1
+    tracker.unit_active("work")
+    clock.now += 2
+    tracker.tunnel_ready("work")
+    assert measured == [("work", 3)]
+    # Phases of attempt are timed from start request (including password prompt)
+    attempt, = tracker.histogram("work").attempts
+    assert (attempt["activating"], attempt["unit_active"], attempt["ready"]) == (20, 21, 23)
+    assert tracker.summary("work") == (1, 3, 3)
+
+
+def test_attempt_without_activation_is_dropped(tracker, clock):
+    tracker.start_requested("work", "openvpn-client@work")
+    clock.now += 5
+    tracker.tunnel_ready("work")
+    assert tracker.summary("work") is None
+
+
+def test_cancelled_attempt_is_not_measured(tracker, clock):
+    tracker.start_requested("work", "openvpn-client@work")
+    tracker.unit_activating("work")
+    tracker.cancel("work")
+    tracker.tunnel_ready("work")
+    assert tracker.summary("work") is None
+
+
+def test_histograms_are_saved_and_loaded(tracker, clock, tmp_path):
+    tracker.start_requested("work", "openvpn-client@work")
+    tracker.unit_activating("work")
+    clock.now += 4
+    tracker.tunnel_ready("work")
+    loaded = ConnectTimeTracker(tracker.path, watch_journal=False)
+    assert loaded.summary("work") == (1, 4, 4)
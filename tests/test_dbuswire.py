@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tests of qopenvpn.dbuswire (D-Bus wire protocol used by notify_qt backend).
+
+Bus tests run private dbus-daemon with fake org.freedesktop.Notifications
+service and are skipped if dbus-daemon is not installed.
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+from qopenvpn import dbuswire
+
+SERVICE = "org.freedesktop.Notifications"
+PATH = "/org/freedesktop/Notifications"
+
+
+def test_split_signature():
+    assert dbuswire.split_signature("susssasa{sv}i") == ["s", "u", "s", "s", "s", "as", "a{sv}", "i"]
+    assert dbuswire.split_signature("a(yv)(ii)") == ["a(yv)", "(ii)"]
+    with pytest.raises(ValueError):
+        dbuswire.split_signature("a{sv")
+    with pytest.raises(ValueError):
+        dbuswire.split_signature("h")
+
+
+def test_marshal_alignment():
+    # byte, padding to 4, uint32, string (length, data, NUL)
+    assert dbuswire.marshal("yus", (1, 2, "ab")) == b"\x01\0\0\0\x02\0\0\0\x02\0\0\0ab\0"
+    # Array length excludes padding to 8-byte alignment of first struct
+    assert dbuswire.marshal("a(y)", ([(5,)],)) == b"\x01\0\0\0\0\0\0\0\x05"
+    assert dbuswire.marshal("a(y)", ([],)) == b"\0\0\0\0\0\0\0\0"
+
+
+def test_marshal_round_trip():
+    values = ("app", 7, "", "Summary", "Body", ["default", "Open"],
+              {"urgency": dbuswire.Variant("y", 2), "transient": True, "x": 1.5}, -1)
+    data = dbuswire.marshal("susssasa{sv}i", values)
+    assert dbuswire.unmarshal("susssasa{sv}i", data) == values[:6] + (
+        {"urgency": 2, "transient": True, "x": 1.5}, -1)
+
+
+def test_unmarshal_big_endian():
+    assert dbuswire.unmarshal("qs", b"\x01\x02\0\0\0\0\0\x01a\0", ">") == (0x0102, "a")
+
+
+def test_unmarshal_truncated():
+    data = dbuswire.marshal("us", (1, "text"))
+    for size in range(len(data)):
+        with pytest.raises(ValueError):
+            dbuswire.unmarshal("us", data[:size])
+
+
+def test_guess_signature():
+    assert dbuswire.guess_signature(True) == "b"
+    assert dbuswire.guess_signature(1) == "i"
+    assert dbuswire.guess_signature(["a"]) == "as"
+    with pytest.raises(TypeError):
+        dbuswire.guess_signature(None)
+
+
+def test_message_round_trip():
+    message = dbuswire.method_call(SERVICE, PATH, SERVICE, "CloseNotification", "u", (3,))
+    data = message.encode(42)
+    assert dbuswire.message_size(data) == len(data)
+    assert dbuswire.message_size(data[:15]) is None
+
+    decoded = dbuswire.Message.decode(data)
+    assert decoded.type == dbuswire.METHOD_CALL
+    assert decoded.serial == 42
+    assert (decoded.destination, decoded.path, decoded.interface, decoded.member) == (SERVICE, PATH, SERVICE,
+                                                                                       "CloseNotification")
+    assert decoded.signature == "u"
+    assert decoded.body == (3,)
+
+
+def test_message_invalid_byte_order():
+    with pytest.raises(ValueError):
+        dbuswire.message_size(b"x" * 16)
+
+
+def test_session_bus_addresses(monkeypatch):
+    monkeypatch.setenv("DBUS_SESSION_BUS_ADDRESS",
+                       "tcp:host=localhost;unix:abstract=/tmp/dbus-a%2cb,guid=1;unix:path=/run/user/1000/bus")
+    assert dbuswire.session_bus_addresses() == ["\0/tmp/dbus-a,b", "/run/user/1000/bus"]
+
+
+@pytest.fixture
+def bus_address(tmp_path):
+    if not shutil.which("dbus-daemon"):
+        pytest.skip("dbus-daemon is not installed")
+    path = str(tmp_path / "bus")
+    daemon = subprocess.Popen(["dbus-daemon", "--session", "--nofork", "--print-address=1",
+                               "--address=unix:path={}".format(path)], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL)
+    daemon.stdout.readline()
+    yield path
+    daemon.terminate()
+    daemon.wait()
+
+
+class FakeNotificationServer(threading.Thread):
+    """Fake notifications server, replies to Notify with notification ID 7 and invokes default action"""
+
+    def __init__(self, address):
+        super(FakeNotificationServer, self).__init__(daemon=True)
+        self.bus = dbuswire.Connection(address, timeout=None)
+        self.bus.call(dbuswire.BUS_NAME, dbuswire.BUS_PATH, dbuswire.BUS_INTERFACE, "RequestName", "su",
+                      (SERVICE, 4))
+        self.calls = []
+
+    def run(self):
+        try:
+            while True:
+                for message in self.bus.read_messages(block=True):
+                    if message.type == dbuswire.METHOD_CALL and message.interface == SERVICE:
+                        self.handle(message)
+        except OSError:
+            pass
+
+    def handle(self, message):
+        self.calls.append((message.member, message.body))
+        signature, body = {"Notify": ("u", (7,)), "GetServerInformation": ("ssss", ("fake", "test", "1", "1.2"))
+                           }.get(message.member, ("", ()))
+        self.bus.send(dbuswire.Message(dbuswire.METHOD_RETURN, signature=signature, body=body,
+                                       reply_serial=message.serial, destination=message.sender))
+        if message.member == "Notify":
+            self.bus.send(dbuswire.Message(dbuswire.SIGNAL, PATH, SERVICE, "ActionInvoked", "us", (7, "default")))
+
+
+def test_call_fake_notification_server(bus_address):
+    server = FakeNotificationServer(bus_address)
+    server.start()
+    client = dbuswire.Connection(bus_address)
+    client.call(dbuswire.BUS_NAME, dbuswire.BUS_PATH, dbuswire.BUS_INTERFACE, "AddMatch", "s",
+                ("type='signal',interface='{}'".format(SERVICE),))
+
+    reply = client.call(SERVICE, PATH, SERVICE, "Notify", "susssasa{sv}i",
+                        ("QOpenVPN", 0, "", "Connected", "to vpn", ["default", "Open"],
+                         {"urgency": dbuswire.Variant("y", 2)}, -1))
+    assert reply == (7,)
+    assert server.calls == [("Notify", ("QOpenVPN", 0, "", "Connected", "to vpn", ["default", "Open"],
+                                        {"urgency": 2}, -1))]
+    assert client.call(SERVICE, PATH, SERVICE, "GetServerInformation") == ("fake", "test", "1", "1.2")
+
+    # Signal sent after reply to Notify was kept for later reading
+    messages = client.read_messages()
+    while not any(m.member == "ActionInvoked" for m in messages):
+        messages.extend(client.read_messages(block=True))
+    signal = [m for m in messages if m.member == "ActionInvoked"][0]
+    assert signal.type == dbuswire.SIGNAL
+    assert signal.body == (7, "default")
+
+    with pytest.raises(dbuswire.DBusError) as error:
+        client.call("org.example.Missing", "/", "org.example.Missing", "Method")
+    assert error.value.name == "org.freedesktop.DBus.Error.ServiceUnknown"
+    client.close()
+    server.bus.close()
+
+
+def test_connection_fails_without_bus(tmp_path, monkeypatch):
+    monkeypatch.delenv("DBUS_SESSION_BUS_ADDRESS", raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    with pytest.raises(OSError):
+        dbuswire.Connection()
+    with pytest.raises(OSError):
+        dbuswire.Connection(os.path.join(str(tmp_path), "missing"))
+
+
+def test_notify_qt_backend(bus_address, monkeypatch):
+    QtCore = pytest.importorskip("PySide2.QtCore")
+    from qopenvpn import notify_qt
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    server = FakeNotificationServer(bus_address)
+    server.start()
+    monkeypatch.setenv("DBUS_SESSION_BUS_ADDRESS", "unix:path={}".format(bus_address))
+    notify_qt.init("QOpenVPN")
+    try:
+        actions = []
+        shown = []
+        notification = notify_qt.Notification("Connected", "to vpn")
+        notification.set_urgency(notify_qt.URGENCY_CRITICAL)
+        notification.add_action("default", "Open", lambda n, action: actions.append(action))
+        notification.show_async(shown.append)
+        for i in range(100):
+            if actions:
+                break
+            app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+        assert shown == [notification]
+        assert notification.id == 7
+        assert actions == ["default"]
+        assert server.calls[0][1][6] == {"urgency": 2}
+        assert notify_qt.get_server_info()["name"] == "fake"
+    finally:
+        notify_qt.uninit()
+        server.bus.close()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tests of qopenvpn.executor (run with pytest, needs PySide2)."""
+
+import time
+
+import pytest
+
+QtCore = pytest.importorskip("PySide2.QtCore")
+
+from qopenvpn.executor import CommandExecutor  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def wait_until(app, condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for commands"
+        app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+
+
+def unit_command(action):
+    """Stand-in for `systemctl <action> unit` which takes a while"""
+    return ["sh", "-c", "sleep 0.2; echo {}".format(action)]
+
+
+def test_start_stop_start_runs_in_order(app):
+    executor = CommandExecutor(parent=None)
+    results = []
+    for action in ("start", "stop", "start"):
+        executor.run(unit_command(action), lambda code, status, output, action=action:
+                     results.append((action, output.strip())), queue="unit")
+    wait_until(app, lambda: len(results) == 3)
+
+    assert results == [("start", "start"), ("stop", "stop"), ("start", "start")]
+    assert executor.stats["sh -c"].count == 3
+    assert executor.stats["sh -c"].merged == 0
+    assert not executor.is_busy()
+
+
+def test_identical_command_is_merged(app):
+    executor = CommandExecutor(parent=None)
+    results = []
+    for i in range(3):
+        executor.run(unit_command("stop"), lambda code, status, output, i=i: results.append(i), queue="unit")
+    wait_until(app, lambda: len(results) == 3)
+
+    # First command was already running, the other two just got its result
+    assert results == [0, 1, 2]
+    assert executor.stats["sh -c"].count == 1
+    assert executor.stats["sh -c"].merged == 2
+
+
+def test_kill_all_drops_queued_commands(app):
+    executor = CommandExecutor(parent=None)
+    results = []
+    for action in ("start", "stop"):
+        executor.run(unit_command(action), lambda code, status, output: results.append(output), queue="unit")
+    executor.kill_all()
+    assert not executor.is_busy()
+    app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+    assert results == []
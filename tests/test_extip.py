@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tests of qopenvpn.extip (external IP address cache)."""
+
+import types
+
+import pytest
+
+from qopenvpn import extip
+from qopenvpn.extip import ExternalIPCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock of extip module (advanced by setting clock.now)"""
+    fake = types.SimpleNamespace(now=1000.0)
+    fake.monotonic = lambda: fake.now
+    monkeypatch.setattr(extip, "time", fake)
+    return fake
+
+
+def test_cache_expires_after_ttl(clock):
+    cache = ExternalIPCache(ttl=300, negative_ttl=30)
+    assert cache.get() is None
+    cache.put("203.0.113.7", "host.example")
+    clock.now += 299
+    assert cache.get() == ("203.0.113.7", "host.example")
+    clock.now += 1
+    assert cache.get() is None
+
+
+def test_failure_uses_negative_ttl(clock):
+    cache = ExternalIPCache(ttl=300, negative_ttl=30)
+    cache.put("", "")
+    assert cache.get() == ("", "")
+    clock.now += 30
+    assert cache.get() is None
+
+
+def test_zero_ttl_disables_caching(clock):
+    cache = ExternalIPCache(ttl=0, negative_ttl=0)
+    cache.put("203.0.113.7", "")
+    cache.put("", "")
+    assert cache.get() is None
+
+
+def test_invalidate_drops_entry_and_stale_results(clock):
+    cache = ExternalIPCache()
+    generation = cache.generation
+    cache.put("203.0.113.7", "")
+    cache.invalidate()
+    assert cache.get() is None
+    assert cache.generation == generation + 1
+    # Lookup started before invalidation must not store its (old) result
+    cache.put("198.51.100.1", "", generation)
+    assert cache.get() is None
+    cache.put("198.51.100.2", "", cache.generation)
+    assert cache.get() == ("198.51.100.2", "")
+
+
+def test_configure_keeps_expiration_of_cached_entry(clock):
+    cache = ExternalIPCache(ttl=300)
+    cache.put("203.0.113.7", "")
+    cache.configure(ttl=10)
+    clock.now += 100
+    assert cache.get() == ("203.0.113.7", "")
+    cache.put("203.0.113.8", "")
+    clock.now += 10
+    assert cache.get() is None
+
+
+def test_getip_uses_cache(clock, monkeypatch):
+    lookups = []
+    monkeypatch.setattr(extip, "cache", ExternalIPCache())
+    monkeypatch.setattr(extip, "lookup", lambda is_cancelled=None: lookups.append(1) or ("203.0.113.7", "h"))
+    assert extip.getip() == ("203.0.113.7", "h")
+    assert extip.getip() == ("203.0.113.7", "h")
+    assert len(lookups) == 1
+    assert extip.getip(use_cache=False) == ("203.0.113.7", "h")
+    assert len(lookups) == 2
+
+
+def test_getip_does_not_cache_cancelled_lookup(clock, monkeypatch):
+    monkeypatch.setattr(extip, "cache", ExternalIPCache())
+    monkeypatch.setattr(extip, "lookup", lambda is_cancelled=None: ("203.0.113.7", ""))
+    extip.getip(is_cancelled=lambda: True)
+    assert extip.cache.get() is None
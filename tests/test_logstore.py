@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tests of qopenvpn.logstore (log buffer, journal parser and index)."""
+
+import json
+
+from qopenvpn import logstore
+from qopenvpn.logstore import JournalParser, LogBuffer, LogIndex, LogRecord
+
+
+def journal_line(message, pid=100, priority=6, identifier="openvpn", timestamp=1000000, **fields):
+    entry = {"MESSAGE": message, "_PID": str(pid), "PRIORITY": str(priority), "SYSLOG_IDENTIFIER": identifier,
+             "__REALTIME_TIMESTAMP": str(timestamp)}
+    entry.update(fields)
+    return json.dumps(entry).encode() + b"\n"
+
+
+def test_buffer_keeps_lines_in_memory_up_to_limit():
+    buf = LogBuffer(max_lines=3)
+    assert buf.append(["a", "b"]) == 0
+    assert buf.append(["c", "d", "e"]) == 2
+    assert len(buf) == 5
+    assert buf.first_buffered == 2
+    assert buf.lines() == ["a", "b", "c", "d", "e"]
+
+
+def test_buffer_reads_spilled_lines_in_chunks():
+    buf = LogBuffer(max_lines=10, chunk_size=7)
+    buf.append(["line {}".format(i) for i in range(100)])
+    assert len(buf) == 100
+    assert buf.first_buffered == 90
+    # Random access across chunk boundaries and back
+    for index in (0, 50, 3, 89, 44, 90, 99):
+        assert buf.line(index) == "line {}".format(index)
+    assert buf.lines(85, 95) == ["line {}".format(i) for i in range(85, 95)]
+    assert buf.lines(98, 1000) == ["line 98", "line 99"]
+
+
+def test_buffer_spills_non_ascii_lines():
+    buf = LogBuffer(max_lines=1)
+    buf.append(["žluťoučký", "kůň"])
+    assert buf.lines() == ["žluťoučký", "kůň"]
+
+
+def test_buffer_clear():
+    buf = LogBuffer(max_lines=2)
+    buf.append(["a", "b", "c"])
+    buf.clear()
+    assert len(buf) == 0
+    buf.append(["d", "e", "f"])
+    assert buf.lines() == ["d", "e", "f"]
+
+
+def test_parser_joins_partial_lines():
+    parser = JournalParser()
+    data = journal_line("first") + journal_line("second")
+    assert parser.feed(data[:30]) == []
+    records = parser.feed(data[30:])
+    assert [record.message for record in records] == ["first", "second"]
+
+
+def test_parser_fields():
+    parser = JournalParser()
+    record, = parser.feed(journal_line("Initialization Sequence Completed", pid=4321, priority=5,
+                                       timestamp=1700000000123456, __CURSOR="s=1"))
+    assert (record.timestamp, record.priority, record.pid, record.identifier) == (1700000000123456, 5, 4321,
+                                                                                 "openvpn")
+    assert record.message == "Initialization Sequence Completed"
+    assert parser.cursor == "s=1"
+
+
+def test_parser_binary_message_and_defaults():
+    parser = JournalParser()
+    line = json.dumps({"MESSAGE": list(b"multi\nline \xff")}).encode() + b"\n"
+    record, = parser.feed(line)
+    assert record.message == "multi line �"
+    assert (record.timestamp, record.priority, record.pid, record.identifier) == (0, logstore.PRIORITY_INFO, 0,
+                                                                                 "openvpn")
+
+
+def test_parser_skips_invalid_lines_and_keeps_cursor():
+    parser = JournalParser()
+    records = parser.feed(journal_line("a", __CURSOR="s=1") + b"not json\n[1, 2]\n" +
+                          journal_line("b", PRIORITY="bad"))
+    assert [(record.message, record.priority) for record in records] == [("a", 6), ("b", logstore.PRIORITY_INFO)]
+    assert parser.cursor == "s=1"
+
+
+def test_record_format():
+    record = LogRecord(0, 6, 42, "openvpn", "hello")
+    assert record.format().endswith(" openvpn[42]: hello")
+
+
+def test_index_filter_by_priority():
+    index = LogIndex()
+    for priority in (6, 3, 7, 4, 0, 6):
+        index.add(LogRecord(0, priority, 1, "openvpn", ""))
+    assert len(index) == 6
+    assert list(index.filter(logstore.PRIORITY_WARNING)) == [1, 3, 4]
+    assert list(index.filter(logstore.PRIORITY_ERR)) == [1, 4]
+    assert list(index.filter(logstore.PRIORITY_DEBUG)) == [0, 1, 2, 3, 4, 5]
+    assert index.priority(2) == 7
+
+
+def test_index_clamps_priority():
+    index = LogIndex()
+    index.add(LogRecord(0, 12, 1, "openvpn", ""))
+    index.add(LogRecord(0, -1, 1, "openvpn", ""))
+    assert list(index.priorities) == [logstore.PRIORITY_DEBUG, logstore.PRIORITY_EMERG]
+
+
+def test_index_attempts():
+    index = LogIndex()
+    for pid, identifier, message in [
+            (1, "systemd", "Starting OpenVPN tunnel for vpn..."),
+            (100, "openvpn", "OpenVPN 2.6.3 x86_64"),
+            (100, "openvpn", "Initialization Sequence Completed"),
+            (1, "systemd", "Stopping OpenVPN tunnel for vpn..."),
+            (100, "openvpn", "SIGUSR1[soft,ping-restart] received, process restarting"),
+            (100, "openvpn", "Restart pause, 5 second(s)"),
+            (1, "systemd", "Started OpenVPN tunnel for vpn."),
+            (0, "openvpn", "record without pid"),
+            (200, "openvpn", "OpenVPN 2.6.3 x86_64")]:
+        index.add(LogRecord(0, 6, pid, identifier, message))
+    assert list(index.attempts) == [1, 4, 8]
+
+
+def test_index_clear():
+    index = LogIndex()
+    index.add(LogRecord(0, 6, 100, "openvpn", ""))
+    index.clear()
+    assert len(index) == 0
+    assert list(index.attempts) == []
+    index.add(LogRecord(0, 6, 100, "openvpn", ""))
+    assert list(index.attempts) == [0]
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tests of OpenVPN management interface protocol parsing in qopenvpn.management (needs PySide2)."""
+
+import pytest
+
+pytest.importorskip("PySide2.QtNetwork")
+
+from qopenvpn import management  # noqa: E402
+from qopenvpn.management import ManagementParser  # noqa: E402
+
+
+def test_state_notification_and_response():
+    parser = ManagementParser()
+    events = parser.feed(b">STATE:1700000000,CONNECTED,SUCCESS,10.8.0.2,198.51.100.1,1194,,\r\n"
+                         b"1700000001,RECONNECTING,ping-restart,,,,,\r\nEND\r\n")
+    assert events == [
+        ("STATE", (1700000000, "CONNECTED", "SUCCESS", "10.8.0.2", "198.51.100.1")),
+        ("STATE", (1700000001, "RECONNECTING", "ping-restart", "", "")),
+    ]
+
+
+def test_short_state_is_padded():
+    assert ManagementParser().parse_line("1700000000,WAIT") == ("STATE", (1700000000, "WAIT", "", "", ""))
+
+
+def test_bytecount_is_64_bit():
+    parser = ManagementParser()
+    assert parser.feed(b">BYTECOUNT:5000000000,12\n") == [("BYTECOUNT", (5000000000, 12))]
+    assert parser.feed(b">BYTECOUNT:x,12\n") == []
+
+
+def test_messages():
+    parser = ManagementParser()
+    events = parser.feed(b">INFO:OpenVPN Management Interface Version 5 -- type 'help' for more info\n"
+                         b">HOLD:Waiting for hold release:0\n"
+                         b">PASSWORD:Need 'Auth' username/password\n"
+                         b"SUCCESS: pid=4321\nERROR: unknown command\n")
+    assert events == [
+        ("INFO", ("OpenVPN Management Interface Version 5 -- type 'help' for more info",)),
+        ("HOLD", ("Waiting for hold release:0",)),
+        ("PASSWORD", ("Need 'Auth' username/password",)),
+        ("SUCCESS", ("pid=4321",)),
+        ("ERROR", ("unknown command",)),
+    ]
+
+
+def test_unknown_lines_are_ignored():
+    parser = ManagementParser()
+    assert parser.feed(b">FATAL:x\nEND\nhello, world\n\n") == []
+
+
+def test_partial_lines():
+    parser = ManagementParser()
+    assert parser.feed(b">BYTECOUNT:1,") == []
+    assert parser.feed(b"2\n>BYTE") == [("BYTECOUNT", (1, 2))]
+    assert parser.feed(b"COUNT:3,4\n") == [("BYTECOUNT", (3, 4))]
+    parser.reset()
+    assert parser.feed(b"COUNT:5,6\n") == []
+
+
+def test_password_prompt_without_newline():
+    parser = ManagementParser()
+    assert parser.feed(b"ENTER PASSWORD:") == [("ENTER_PASSWORD", ())]
+    assert parser.feed(b"SUCCESS: password is correct\r\n>INFO:ready\r\n") == [
+        ("SUCCESS", ("password is correct",)), ("INFO", ("ready",))]
+    assert ManagementParser().feed(b"ENTER PASSWORD:>INFO:x\n") == [("ENTER_PASSWORD", ()), ("INFO", ("x",))]
+
+
+def test_parse_management_address():
+    assert management.parse_management_address("") is None
+    assert management.parse_management_address("/run/openvpn/vpn.sock") == ("unix", "/run/openvpn/vpn.sock")
+    assert management.parse_management_address("127.0.0.1:7505") == ("tcp", "127.0.0.1", 7505)
+    assert management.parse_management_address(":7505") == ("tcp", "127.0.0.1", 7505)
+    assert management.parse_management_address("localhost:port") is None
+
+
+def test_parse_management_option(tmp_path):
+    config = tmp_path / "vpn.conf"
+    config.write_text("client\n# management 127.0.0.1 1\nmanagement 127.0.0.1 7505 pw-file\n")
+    assert management.parse_management_option(str(config)) == ("tcp", "127.0.0.1", 7505)
+    config.write_text('--management "/run/openvpn client/vpn.sock" unix\n')
+    assert management.parse_management_option(str(config)) == ("unix", "/run/openvpn client/vpn.sock")
+    config.write_text("remote vpn.example.com 1194\nmanagement 127.0.0.1 port\n")
+    assert management.parse_management_option(str(config)) is None
+    assert management.parse_management_option(str(tmp_path / "missing.conf")) is None
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tests of flap counting in qopenvpn.notifications (needs PySide2)."""
+
+import types
+
+import pytest
+
+QtCore = pytest.importorskip("PySide2.QtCore")
+
+from qopenvpn import notifications  # noqa: E402
+from qopenvpn.notifications import NotificationManager  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock of notifications module (advanced by setting clock.now)"""
+    fake = types.SimpleNamespace(now=1000.0)
+    fake.monotonic = lambda: fake.now
+    monkeypatch.setattr(notifications, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def manager(clock):
+    QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    return NotificationManager("QOpenVPN", flap_window=120)
+
+
+def test_unit_restarts_are_counted(manager, clock):
+    for i in range(3):
+        for active_state in ("activating", "activating", "active", "inactive"):
+            manager.unit_state_changed("work", active_state)
+        clock.now += 10
+    assert manager.reconnects("work") == 3
+    clock.now += 105
+    manager.unit_state_changed("work", "activating")
+    assert manager.reconnects("work") == 2
+
+
+def test_same_reconnect_is_not_counted_twice(manager, clock):
+    manager._show = lambda *args: None
+    for i in range(2):
+        manager.unit_state_changed("work", "activating")
+        manager.notify("work", "connected", "QOpenVPN", "Connected to work")
+        manager.unit_state_changed("work", "inactive")
+    manager.notify("work", "connected", "QOpenVPN", "Connected to work")
+    assert manager.reconnects("work") == 3
+    assert manager.reconnects("home") == 0
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tests of ring buffer and formatting in qopenvpn.statistics (needs PySide2)."""
+
+import math
+
+import pytest
+
+pytest.importorskip("PySide2.QtWidgets")
+
+from qopenvpn.statistics import RingBuffer, format_rate  # noqa: E402
+
+
+def test_ring_buffer_fills_up():
+    buf = RingBuffer(4)
+    assert len(buf) == 0
+    assert buf.last() == []
+    assert buf.latest() is None
+    assert buf.latest(0) == 0
+    for value in (1, 2, 3):
+        buf.append(value)
+    assert len(buf) == 3
+    assert buf.last() == [1, 2, 3]
+    assert buf.latest() == 3
+
+
+def test_ring_buffer_overwrites_oldest_values():
+    buf = RingBuffer(4, "l")
+    for value in range(10):
+        buf.append(value)
+    assert len(buf) == 4
+    # Values wrap around end of the array
+    assert buf.last() == [6, 7, 8, 9]
+    assert buf.last(3) == [7, 8, 9]
+    assert buf.last(100) == [6, 7, 8, 9]
+    assert buf.latest() == 9
+
+
+def test_ring_buffer_last_across_wrap():
+    buf = RingBuffer(5, "l")
+    for value in range(7):
+        buf.append(value)
+    # Oldest value is at index 2 of the array, newest at index 1
+    assert buf.last(4) == [3, 4, 5, 6]
+    assert buf.last(1) == [6]
+    assert buf.last(0) == []
+
+
+def test_ring_buffer_clear_and_float_values():
+    buf = RingBuffer(3)
+    buf.append(0.5)
+    buf.append(float("nan"))
+    assert buf.last()[0] == 0.5
+    assert math.isnan(buf.latest())
+    buf.clear()
+    assert len(buf) == 0
+    buf.append(1.0)
+    assert buf.last() == [1.0]
+
+
+def test_ring_buffer_minimum_capacity():
+    buf = RingBuffer(0)
+    buf.append(1)
+    buf.append(2)
+    assert buf.last() == [2]
+
+
+def test_format_rate():
+    assert format_rate(0) == "0 B/s"
+    assert format_rate(999) == "999 B/s"
+    assert format_rate(1000) == "1.0 kB/s"
+    assert format_rate(1536000) == "1.5 MB/s"
+    assert format_rate(2.5e9) == "2.5 GB/s"
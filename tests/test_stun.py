@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8
+
+"""Tests of STUN codec in qopenvpn.stun."""
+
+import socket
+import struct
+import zlib
+
+import pytest
+
+from qopenvpn import stun
+
+TRANSACTION_ID = struct.pack(">I", stun.MAGIC_COOKIE) + bytes(range(12))
+LEGACY_TRANSACTION_ID = bytes(range(16))
+
+
+def attribute(attr_type, value):
+    return struct.pack(">HH", attr_type, len(value)) + value + b"\0" * (-len(value) % 4)
+
+
+def address(attr_type, ip, port, transaction_id=TRANSACTION_ID, family=stun.FAMILY_IPV4):
+    packed = socket.inet_aton(ip)
+    if attr_type == stun.XOR_MAPPED_ADDRESS:
+        port ^= stun.MAGIC_COOKIE >> 16
+        packed = bytes(a ^ b for a, b in zip(packed, transaction_id))
+    return attribute(attr_type, struct.pack(">xBH", family, port) + packed)
+
+
+def response(attributes, transaction_id=TRANSACTION_ID, fingerprint=False):
+    body = b"".join(attributes)
+    if fingerprint:
+        header = struct.pack(">HH", stun.BINDING_RESPONSE, len(body) + 8) + transaction_id
+        crc = (zlib.crc32(header + body) ^ stun.FINGERPRINT_XOR) & 0xFFFFFFFF
+        body += attribute(stun.FINGERPRINT, struct.pack(">I", crc))
+    return struct.pack(">HH", stun.BINDING_RESPONSE, len(body)) + transaction_id + body
+
+
+def test_encode_binding_request():
+    request = stun.encode_binding_request(TRANSACTION_ID)
+    assert request == b"\x00\x01\x00\x00" + TRANSACTION_ID
+
+
+def test_encode_binding_request_fingerprint():
+    request = stun.encode_binding_request(TRANSACTION_ID, fingerprint=True)
+    assert len(request) == 28
+    assert request[2:4] == b"\x00\x08"
+    assert request[20:24] == b"\x80\x28\x00\x04"
+    crc, = struct.unpack(">I", request[24:])
+    assert crc == (zlib.crc32(request[:20]) ^ stun.FINGERPRINT_XOR) & 0xFFFFFFFF
+
+
+def test_decode_mapped_address():
+    data = response([address(stun.MAPPED_ADDRESS, "203.0.113.7", 40000)])
+    assert stun.decode_binding_response(data, TRANSACTION_ID) == ("203.0.113.7", 40000)
+
+
+def test_decode_xor_mapped_address():
+    data = response([address(stun.XOR_MAPPED_ADDRESS, "203.0.113.7", 40000)])
+    assert stun.decode_binding_response(data, TRANSACTION_ID) == ("203.0.113.7", 40000)
+
+
+def test_xor_mapped_address_is_preferred():
+    # MAPPED-ADDRESS may have been rewritten by NAT, XOR-MAPPED-ADDRESS is preferred in any order
+    attributes = [address(stun.MAPPED_ADDRESS, "192.0.2.1", 1), address(stun.XOR_MAPPED_ADDRESS, "203.0.113.7", 40000)]
+    assert stun.decode_binding_response(response(attributes), TRANSACTION_ID) == ("203.0.113.7", 40000)
+    attributes.reverse()
+    assert stun.decode_binding_response(response(attributes), TRANSACTION_ID) == ("203.0.113.7", 40000)
+
+
+def test_first_mapped_address_is_used():
+    attributes = [address(stun.MAPPED_ADDRESS, "203.0.113.7", 40000), address(stun.MAPPED_ADDRESS, "192.0.2.1", 1)]
+    assert stun.decode_binding_response(response(attributes), TRANSACTION_ID) == ("203.0.113.7", 40000)
+
+
+def test_xor_mapped_address_ignored_without_magic_cookie():
+    # RFC 3489 server (request without magic cookie) can't send XOR-MAPPED-ADDRESS
+    attributes = [address(stun.XOR_MAPPED_ADDRESS, "192.0.2.1", 1, LEGACY_TRANSACTION_ID),
+                  address(stun.MAPPED_ADDRESS, "203.0.113.7", 40000)]
+    data = response(attributes, LEGACY_TRANSACTION_ID)
+    assert stun.decode_binding_response(data, LEGACY_TRANSACTION_ID) == ("203.0.113.7", 40000)
+    data = response(attributes[:1], LEGACY_TRANSACTION_ID)
+    assert stun.decode_binding_response(data, LEGACY_TRANSACTION_ID) == ("", 0)
+
+
+def test_unknown_attributes_are_skipped():
+    attributes = [attribute(0x8022, b"server"), address(stun.XOR_MAPPED_ADDRESS, "203.0.113.7", 40000),
+                  attribute(0x802b, b"\x00\x01\x0d\x96\xc0\x00\x02\x01")]
+    assert stun.decode_binding_response(response(attributes), TRANSACTION_ID) == ("203.0.113.7", 40000)
+
+
+def test_no_address():
+    data = response([attribute(0x8022, b"server")])
+    assert stun.decode_binding_response(data, TRANSACTION_ID) == ("", 0)
+
+
+def test_fingerprint():
+    data = response([address(stun.XOR_MAPPED_ADDRESS, "203.0.113.7", 40000)], fingerprint=True)
+    assert stun.decode_binding_response(data, TRANSACTION_ID) == ("203.0.113.7", 40000)
+    corrupted = data[:-1] + bytes([data[-1] ^ 1])
+    with pytest.raises(ValueError):
+        stun.decode_binding_response(corrupted, TRANSACTION_ID)
+
+
+def test_wrong_type_or_transaction_id():
+    data = response([address(stun.XOR_MAPPED_ADDRESS, "203.0.113.7", 40000)])
+    with pytest.raises(ValueError):
+        stun.decode_binding_response(data, LEGACY_TRANSACTION_ID)
+    with pytest.raises(ValueError):
+        stun.decode_binding_response(b"\x01\x11" + data[2:], TRANSACTION_ID)
+
+
+def test_truncated_response():
+    for attributes in ([address(stun.XOR_MAPPED_ADDRESS, "203.0.113.7", 40000)],
+                       [address(stun.MAPPED_ADDRESS, "203.0.113.7", 40000), attribute(0x8022, b"server")]):
+        data = response(attributes, fingerprint=True)
+        for size in range(len(data)):
+            with pytest.raises(ValueError):
+                stun.decode_binding_response(data[:size], TRANSACTION_ID)
+
+
+def test_truncated_attributes():
+    # Message length covers only part of attribute
+    data = response([address(stun.MAPPED_ADDRESS, "203.0.113.7", 40000)])
+    with pytest.raises(ValueError):
+        stun.decode_binding_response(data[:2] + b"\x00\x08" + data[4:], TRANSACTION_ID)
+    # Address attribute shorter than IPv4 address
+    data = response([attribute(stun.MAPPED_ADDRESS, b"\x00\x01\x9c\x40")])
+    with pytest.raises(ValueError):
+        stun.decode_binding_response(data, TRANSACTION_ID)
+
+
+def test_ipv6_address_is_rejected():
+    value = struct.pack(">xBH", 0x02, 40000) + socket.inet_pton(socket.AF_INET6, "2001:db8::7")
+    data = response([attribute(stun.XOR_MAPPED_ADDRESS, value)])
+    with pytest.raises(ValueError):
+        stun.decode_binding_response(data, TRANSACTION_ID)